@@ -0,0 +1,258 @@
+"""
+This module speeds up the shortest paths of the city graph with ALT (A*,
+landmarks and triangle inequality). Some nodes are chosen as landmarks (the
+metro interchanges and nodes spread on the periphery of the city) and the
+travel time from every landmark to every node is computed once. For any two
+nodes v and t, |d(L, t) - d(L, v)| is a lower bound of the travel time from
+v to t, which guides the A* search towards the destination.
+The city graph is undirected, so the times from and to a landmark are the
+same and a single float32 array per landmark is stored.
+"""
+
+# Library used to initialize classes
+from dataclasses import dataclass
+# Library used to access different data types
+from typing import Callable, Dict, List
+# Library used to access, read or write files
+import os.path
+# Library used to detect that the times of the graph changed
+import hashlib
+# Library used to store the distances as compact arrays
+import numpy as np
+# Library used to manipulate graphs
+import networkx as nx
+# Library used to access the city graph functions
+import city
+
+# Number of landmarks used if no other number is given
+LANDMARKS: int = 16
+# Part of the landmarks placed on the metro interchanges
+INTERCHANGES: float = 0.25
+# Relative error of the float32 times
+ROUNDING: float = 1e-5
+
+
+@dataclass
+class Landmarks:
+    """
+    Class: Contains the landmarks of a city graph and the travel time from
+           every landmark to every node.
+    """
+    landmarks: List[city.NodeID]    # Nodes chosen as landmarks
+    nodes: List[city.NodeID]        # Nodes in the order of the columns
+    distances: np.ndarray           # float32 (landmarks x nodes), seconds
+    version: int                    # Version of the graph when computed
+    signature: tuple                # Number of nodes and edges of the graph
+    times: str = ''                 # Hash of the times of the edges
+
+    def __post_init__(self) -> None:
+        self.index: Dict[city.NodeID, int] = {n: i for i, n
+                                              in enumerate(self.nodes)}
+
+    def valid(self, g: city.CityGraph) -> bool:
+        """
+        Function: Tells if the distances can still be used with a graph: if
+                  the graph was updated, the bounds could be wrong.
+        Parameters: g -> City graph
+        Return: True if the graph did not change since the preprocessing.
+        """
+        return g.graph.get('version', 0) == self.version and \
+            signature(g) == self.signature
+
+    def heuristic(self, target: city.NodeID) -> Callable:
+        """
+        Function: Gives the lower bound of the travel time from a node to a
+                  target, computed with all the landmarks only for the nodes
+                  that the search visits (once for every node).
+        Parameters: target -> destination node of the search
+        Return: A heuristic function for networkx A* searches.
+        """
+        if target not in self.index:
+            return lambda u, v: 0.0
+        distances = self.distances
+        column = distances[:, self.index[target]]
+        index = self.index
+        bounds: Dict[city.NodeID, float] = {}
+
+        def h(u: city.NodeID, v: city.NodeID) -> float:
+            bound = bounds.get(u)
+            if bound is None:
+                i = index.get(u)
+                # The bounds are lowered a little so that the rounding of
+                # the float32 times never makes them larger than the real
+                # time
+                if i is None:
+                    bound = 0.0
+                else:
+                    bound = float(np.abs(distances[:, i] - column).max())
+                    bound *= 1 - ROUNDING
+                bounds[u] = bound
+            return bound
+        return h
+
+    def nbytes(self) -> int:
+        """
+        Function: Gives the memory used by the distances.
+        Parameters: None
+        Return: The size of the distance arrays in bytes.
+        """
+        return self.distances.nbytes
+
+
+def signature(g: city.CityGraph) -> tuple:
+    """
+    Function: Summarises a graph to detect that stored landmarks belong to
+              another graph. The src and dst nodes of a search are ignored.
+    Parameters: g -> City graph
+    Return: The number of nodes and edges of the graph.
+    """
+    extra = [n for n in ('src', 'dst') if n in g]
+    return (g.number_of_nodes() - len(extra),
+            g.number_of_edges() - sum(g.degree(n) for n in extra))
+
+
+def times_hash(g: city.CityGraph) -> str:
+    """
+    Function: Summarises the times of the edges of a graph, to detect that
+              stored landmarks were computed with other times. The edges of
+              the src and dst nodes of a search are ignored.
+    Parameters: g -> City graph
+    Return: The hash of the times (hexadecimal).
+    """
+    times = np.fromiter((time for u, v, time in g.edges(data='time')
+                         if u not in ('src', 'dst') and
+                         v not in ('src', 'dst')), dtype=np.float64)
+    return hashlib.blake2b(times.tobytes(), digest_size=16).hexdigest()
+
+
+def interchanges(g: city.CityGraph, count: int) -> List[city.NodeID]:
+    """
+    Function: Finds the stations with more transfers to other lines.
+    Parameters: g -> City graph
+                count -> maximum number of stations
+    Return: The list of stations, the ones with more transfers first.
+    """
+    transfers = []
+    for node, data in g.nodes(data=True):
+        if data.get('type') == 'station':
+            links = sum(1 for v in g[node]
+                        if g.edges[node, v]['attributes'].type == 'Link')
+            if links > 0:
+                transfers.append((-links, str(node), node))
+    transfers.sort()
+    return [node for links, name, node in transfers[:count]]
+
+
+def select_landmarks(g: city.CityGraph, count: int = LANDMARKS) -> Dict:
+    """
+    Function: Chooses the landmarks: some metro interchanges and the rest
+              spread on the periphery, choosing every time the node that is
+              farthest (in travel time) from the landmarks already chosen.
+    Parameters: g -> City graph
+                count -> number of landmarks
+    Return: The travel times from every landmark, in the order chosen.
+    """
+    distances: Dict[city.NodeID, Dict] = {}
+    chosen = interchanges(g, int(count * INTERCHANGES))
+    if len(chosen) == 0:
+        # The first landmark is the node farthest from any node
+        start = next(iter(g.nodes))
+        times = nx.single_source_dijkstra_path_length(g, start,
+                                                      weight='time')
+        chosen = [max(times, key=times.get)]
+    for landmark in chosen:
+        distances[landmark] = nx.single_source_dijkstra_path_length(
+            g, landmark, weight='time')
+    nearest: Dict[city.NodeID, float] = {}
+    for times in distances.values():
+        for node, time in times.items():
+            nearest[node] = min(nearest.get(node, time), time)
+    while len(distances) < count:
+        landmark = max(nearest, key=nearest.get)
+        if nearest[landmark] == 0:
+            break
+        times = nx.single_source_dijkstra_path_length(g, landmark,
+                                                      weight='time')
+        distances[landmark] = times
+        for node, time in times.items():
+            nearest[node] = min(nearest[node], time)
+    return distances
+
+
+def preprocess(g: city.CityGraph, count: int = LANDMARKS) -> Landmarks:
+    """
+    Function: Chooses the landmarks of a graph and stores the travel times
+              from every landmark as float32 arrays.
+    Parameters: g -> City graph
+                count -> number of landmarks
+    Return: The landmarks.
+    """
+    distances = select_landmarks(g, count)
+    nodes = [n for n in g.nodes if n not in ('src', 'dst')]
+    table = np.full((len(distances), len(nodes)), np.inf, dtype=np.float32)
+    for i, times in enumerate(distances.values()):
+        table[i] = [times.get(node, np.inf) for node in nodes]
+    # A node that cannot be reached from a landmark is not connected to the
+    # nodes that can, so any bound is right: 0 is used
+    table[~np.isfinite(table)] = 0
+    return Landmarks(list(distances), nodes, table,
+                     g.graph.get('version', 0), signature(g), times_hash(g))
+
+
+def save(landmarks: Landmarks, filename: str) -> None:
+    """
+    Function: Saves the landmarks into a numpy file. The nodes are stored as
+              text, with a mark of the ones that are numbers.
+    Parameters: landmarks -> the landmarks
+                filename -> the .npz file
+    Return: None.
+    """
+    np.savez(filename, distances=landmarks.distances,
+             nodes=np.array([str(n) for n in landmarks.nodes]),
+             numeric=np.array([not isinstance(n, str)
+                               for n in landmarks.nodes]),
+             landmarks=np.array([landmarks.nodes.index(n)
+                                 for n in landmarks.landmarks]),
+             version=landmarks.version,
+             signature=np.array(landmarks.signature),
+             times=landmarks.times)
+
+
+def load(filename: str) -> Landmarks:
+    """
+    Function: Reads the landmarks saved with save.
+    Parameters: filename -> the .npz file
+    Return: The landmarks.
+    """
+    with np.load(filename) as data:
+        nodes = [int(n) if numeric else str(n)
+                 for n, numeric in zip(data['nodes'].tolist(),
+                                       data['numeric'].tolist())]
+        # The files saved before the hash of the times was kept have none
+        times = str(data['times']) if 'times' in data.files else ''
+        return Landmarks([nodes[i] for i in data['landmarks'].tolist()],
+                         nodes, data['distances'], int(data['version']),
+                         tuple(data['signature'].tolist()), times)
+
+
+def get_landmarks(g: city.CityGraph, filename: str,
+                  count: int = LANDMARKS) -> Landmarks:
+    """
+    Function: Reads the landmarks of a graph from a file or computes them
+              and saves them if the file does not exist or belongs to
+              another graph (or to the same one with other times).
+    Parameters: g -> City graph
+                filename -> the .npz file
+                count -> number of landmarks
+    Return: The landmarks.
+    """
+    if os.path.exists(filename):
+        landmarks = load(filename)
+        if landmarks.signature == signature(g) and \
+                landmarks.times == times_hash(g) and \
+                len(landmarks.landmarks) == count:
+            landmarks.version = g.graph.get('version', 0)
+            return landmarks
+    landmarks = preprocess(g, count)
+    save(landmarks, filename)
+    return landmarks
@@ -0,0 +1,130 @@
+"""
+This module completes the restaurant names and types while the user is
+typing them (the inline queries of the bot). The normalized names and types
+are kept in a sorted array of keys, one for every word where the text can
+start to be typed ("restaurant sushi 21", "sushi 21" and "21"), so the
+restaurants whose text starts with the query are found with a binary
+search. The last word of the query can have a typo: the beginnings of all
+the words are also kept in a SymSpell dictionary of deletes (every text
+with one letter removed), so the words at one typo from the query are found
+with a few dictionary lookups instead of comparing it with every word.
+"""
+
+# Library used to access different data types
+from typing import Dict, List, Sequence, Set, Tuple
+# Library used to find the keys that start with the query
+import bisect
+# Library used to choose the best restaurants
+import heapq
+# Library used to normalize the text like the ranked search
+from ranking import normalize, edit_distance, deletes
+# Library used to keep the completers of the last lists completed
+import caches
+
+# Fields completed, in order of preference
+FIELDS: Tuple[str, ...] = ('name', 'restaurant_type')
+# Typos allowed in the last word of the query, from this length on
+TYPO_LENGTH: int = 4
+# Beginnings of the words longer than this are not kept in the dictionary
+# of deletes (the words with a typo are found by their first letters)
+MAX_PREFIX: int = 10
+# Restaurants given by default
+K: int = 10
+
+
+class Completer:
+    """
+    Class: Contains the sorted keys (text, field, restaurant) of a list of
+           restaurants and the dictionary of deletes of the beginnings of
+           their words.
+    """
+
+    def __init__(self, restaurants: Sequence) -> None:
+        self.size = len(restaurants)
+        keys: List[Tuple[str, int, int]] = []
+        words: Set[str] = set()
+        for position, r in enumerate(restaurants):
+            for field, name in enumerate(FIELDS):
+                split = normalize(getattr(r, name)).split()
+                words.update(split)
+                for i in range(len(split)):
+                    keys.append((' '.join(split[i:]), field, position))
+        keys.sort()
+        self.keys = keys
+        # Beginning of a word with a letter removed -> beginnings of words
+        self.dictionary: Dict[str, Set[str]] = {}
+        for word in words:
+            for length in range(TYPO_LENGTH - 1,
+                                min(len(word), MAX_PREFIX) + 1):
+                prefix = word[:length]
+                for text in deletes(prefix) | {prefix}:
+                    self.dictionary.setdefault(text, set()).add(prefix)
+
+    def corrections(self, word: str) -> List[str]:
+        """
+        Function: Finds the beginnings of words at one typo from a word of
+                  the query.
+        Parameters: word -> the normalized word
+        Return: The sorted beginnings of words, without the word itself.
+        """
+        if len(word) < TYPO_LENGTH:
+            return []
+        word = word[:MAX_PREFIX + 1]
+        found: Set[str] = set()
+        for text in deletes(word) | {word}:
+            for prefix in self.dictionary.get(text, ()):
+                if prefix != word and edit_distance(word, prefix, 1) <= 1:
+                    found.add(prefix)
+        return sorted(found)
+
+    def starting(self, prefix: str) -> List[Tuple[str, int, int]]:
+        """
+        Function: Gives the keys that start with a text.
+        Parameters: prefix -> the text
+        Return: The keys.
+        """
+        start = bisect.bisect_left(self.keys, (prefix,))
+        end = bisect.bisect_left(self.keys, (prefix + '\uffff',))
+        return self.keys[start:end]
+
+    def complete(self, query: str, k: int = K) -> List[int]:
+        """
+        Function: Finds the restaurants whose name or type starts with the
+                  query, or with the query with a typo in its last word.
+        Parameters: query -> the text typed
+                    k -> number of restaurants
+        Return: The positions of the restaurants: the ones without typos
+                first, then the names before the types and then in the order
+                of the list.
+        """
+        text = normalize(query)
+        if len(text) == 0:
+            return []
+        head, space, last = text.rpartition(' ')
+        prefixes = [(0, text)] + [(1, head + space + word) for word in
+                                  self.corrections(last)]
+        best: Dict[int, Tuple[int, int]] = {}
+        for typos, prefix in prefixes:
+            for key, field, position in self.starting(prefix):
+                rank = (typos, field)
+                if rank < best.get(position, (2, 0)):
+                    best[position] = rank
+        ranked = heapq.nsmallest(k, best.items(),
+                                 key=lambda item: (item[1], item[0]))
+        return [position for position, rank in ranked]
+
+
+# Completers of the last lists completed
+COMPLETERS: int = 4
+_completers: 'caches.ListCache[Completer]' = \
+    caches.ListCache(Completer, COMPLETERS)
+
+
+def completer_of(restaurants: Sequence) -> Completer:
+    """
+    Function: Gives the completer of a list of restaurants, built the first
+              time the list is completed.
+    Parameters: restaurants -> the list
+    Return: The completer.
+    """
+    return _completers.get(restaurants)
@@ -0,0 +1,7 @@
+"""
+Benchmarks of MetroNyam.
+They run without network on a fixed synthetic snapshot of the data (see
+fixtures.py) and report latency percentiles, throughput and peak memory as
+JSON, so that the results of two commits can be compared.
+Usage: python3 -m benchmarks.run --out results.json
+"""
@@ -0,0 +1,44 @@
+"""
+Benchmark of the ALT searches: preprocessing time, memory of the distance
+arrays and speedup over Dijkstra for different numbers of landmarks.
+"""
+
+# Library used to access different data types
+from typing import Dict
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+from benchmarks.bench_routing import pairs
+
+# Numbers of landmarks compared
+COUNTS = [4, 8, 16, 32]
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times find_path with and without landmarks.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import city
+    import metro
+    import alt
+    street = city.load_osmnx_graph('graf.dat')
+    g = city.build_city_graph(street, metro.get_metro_graph())
+    inputs = [(street, g, src, dst)
+              for src, dst in pairs(config.pairs, config.seed)]
+    results: Dict[str, Stats] = {}
+    results['dijkstra'] = measure(city.find_path, inputs,
+                                  repeat=config.repeat)
+    for count in COUNTS:
+        stats = measure(alt.preprocess, [(g, count)], warmup=0)
+        landmarks = alt.preprocess(g, count)
+        name = 'alt_' + str(count)
+        results[name] = measure(city.find_path,
+                                [args + (landmarks,) for args in inputs],
+                                repeat=config.repeat)
+        results[name].update({
+            'preprocess_ms': stats['mean_ms'],
+            'distances_mb': landmarks.nbytes() / 2**20,
+            'speedup': results['dijkstra']['mean_ms'] /
+            results[name]['mean_ms']})
+    return results
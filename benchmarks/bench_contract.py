@@ -0,0 +1,103 @@
+"""
+Benchmark of the contraction of the chains of street nodes with two
+neighbours: sizes of the graph before and after, contraction time and the
+shortest paths on the city graph and on the contracted graph, with and
+without landmarks. The fixture grid has few such nodes, so the streets are
+also split in several segments, as the streets of the osmnx graphs that
+follow curves.
+"""
+
+# Library used to access different data types
+from typing import Dict
+# Library used to manipulate graphs
+import networkx as nx
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+from benchmarks.bench_routing import pairs
+
+# Segments of every street of the split graph
+PARTS = 4
+# Landmarks of the A* searches
+LANDMARKS = 8
+
+
+def split(street: nx.MultiDiGraph, parts: int) -> nx.MultiDiGraph:
+    """
+    Function: Splits every street of a street graph in several segments,
+              adding nodes along it.
+    Parameters: street -> the street graph
+                parts -> segments of every street
+    Return: The new street graph.
+    """
+    g = nx.MultiDiGraph(**street.graph)
+    g.add_nodes_from(street.nodes(data=True))
+    new = max(street.nodes) + 1
+    done = set()
+    for u, v, data in street.edges(data=True):
+        if (v, u) in done:
+            continue
+        done.add((u, v))
+        previous = u
+        for k in range(1, parts + 1):
+            if k < parts:
+                t = k / parts
+                g.add_node(new, x=street.nodes[u]['x'] * (1 - t) +
+                           street.nodes[v]['x'] * t,
+                           y=street.nodes[u]['y'] * (1 - t) +
+                           street.nodes[v]['y'] * t)
+                node, new = new, new + 1
+            else:
+                node = v
+            g.add_edge(previous, node, length=data['length'] / parts)
+            g.add_edge(node, previous, length=data['length'] / parts)
+            previous = node
+    return g
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times the contraction and the searches on the fixture graph and
+              on the split graph.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import city
+    import metro
+    import alt
+    import contract
+    original = city.load_osmnx_graph('graf.dat')
+    metro_graph = metro.get_metro_graph()
+    results: Dict[str, Stats] = {}
+    for name, street in (('grid', original),
+                         ('split', split(original, PARTS))):
+        g = city.build_city_graph(street, metro_graph)
+        results[name + '_contract'] = measure(contract.contract, [(g,)],
+                                              repeat=config.repeat)
+        contraction = contract.contract(g)
+        results[name + '_contract'].update(contract.summary(g, contraction))
+        landmarks = alt.preprocess(g, LANDMARKS)
+        od = pairs(config.pairs, config.seed)
+        # The pairs are snapped during the warm up, as in bench_routing
+
+        def clean() -> None:
+            city.delete_additional_nodes(g)
+
+        plain = [(street, g, src, dst) for src, dst in od]
+        results[name + '_dijkstra'] = measure(
+            city.find_path, plain, repeat=config.repeat, warmup=len(od),
+            after=clean)
+        results[name + '_alt'] = measure(
+            city.find_path, [args + (landmarks,) for args in plain],
+            repeat=config.repeat, warmup=len(od), after=clean)
+        contracted = [(street, g, contraction, src, dst) for src, dst in od]
+        results[name + '_core_dijkstra'] = measure(
+            contract.find_path, contracted, repeat=config.repeat,
+            warmup=len(od), after=clean)
+        results[name + '_core_alt'] = measure(
+            contract.find_path, [args + (landmarks,) for args in contracted],
+            repeat=config.repeat, warmup=len(od), after=clean)
+        for search in ('dijkstra', 'alt'):
+            results[name + '_core_' + search]['speedup'] = \
+                results[name + '_' + search]['mean_ms'] / \
+                results[name + '_core_' + search]['mean_ms']
+    return results
@@ -0,0 +1,70 @@
+"""
+Benchmark of the files of the street graph: load time, peak memory and size
+of the pickle (graf.dat) and of the .npz columns, stored as they are and
+compressed, on a large grid with the attributes of the osmnx graphs.
+"""
+
+# Library used to write the files
+import os
+import pickle
+# Library used to access different data types
+from typing import Dict
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, peak_memory, Stats
+# Fixed data of the benchmarks
+from benchmarks import fixtures
+
+# Crossroads per side of the grid
+SIDE = 250
+# Types of the streets of the grid
+HIGHWAYS = ['residential', 'footway', 'primary', ['footway', 'steps']]
+
+
+def unpickle(filename: str):
+    """
+    Function: Reads a pickled street graph, as load_osmnx_graph did.
+    Parameters: filename -> the pickle file
+    Return: The street graph.
+    """
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times the loads of the street graph from every kind of file.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import city
+    import graphstore
+    street = fixtures.street_graph(SIDE, config.seed)
+    for i, n in enumerate(street.nodes):
+        street.nodes[n]['street_count'] = street.degree(n) // 2
+    for i, (u, v, data) in enumerate(street.edges(data=True)):
+        data['osmid'] = 1000 + i // 2
+        data['highway'] = HIGHWAYS[i // 2 % len(HIGHWAYS)]
+    files = {'pickle': 'graph.dat', 'npz': 'graph.npz',
+             'npz_compressed': 'graph_compressed.npz'}
+    city.save_osmnx_graph(street, files['pickle'])
+    results: Dict[str, Stats] = {}
+    results['convert'] = measure(graphstore.convert,
+                                 [(files['pickle'], files['npz'])],
+                                 repeat=config.repeat)
+    graphstore.save(street, files['npz_compressed'], compress=True)
+    loads = {'pickle': unpickle, 'npz': graphstore.load,
+             'npz_compressed': graphstore.load}
+    for name, load in loads.items():
+        results[name] = measure(load, [(files[name],)],
+                                repeat=config.repeat)
+        results[name]['peak_mb'] = peak_memory(load, files[name])
+        results[name]['file_mb'] = os.path.getsize(files[name]) / 2**20
+    # Only the columns, mapped from the file (zero copy)
+    results['npz_arrays'] = measure(graphstore.read, [(files['npz'],)],
+                                    repeat=config.repeat)
+    results['npz_arrays']['peak_mb'] = peak_memory(graphstore.read,
+                                                   files['npz'])
+    for stats in results.values():
+        stats['nodes'] = street.number_of_nodes()
+        stats['edges'] = street.number_of_edges()
+    return results
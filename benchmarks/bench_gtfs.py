@@ -0,0 +1,45 @@
+"""
+Benchmark of the GTFS ingestion: build time of every feed added to the
+city graph and stop_times rows read per second.
+"""
+
+# Library used to write the feeds in a temporary folder
+import tempfile
+# Library used to access different data types
+from typing import Dict
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+# Fixed data of the benchmarks
+from benchmarks import fixtures
+
+# Feeds of the benchmark: (name, GTFS route type, number of routes)
+FEEDS = [('bus', 3, 60), ('tram', 0, 6), ('rail', 2, 8)]
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times gtfs.add_feeds for every feed of the fixture.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import city
+    import metro
+    import gtfs
+    folder = tempfile.mkdtemp()
+    street = city.load_osmnx_graph('graf.dat')
+    base = city.build_city_graph(street, metro.get_metro_graph())
+    results: Dict[str, Stats] = {}
+    for name, route_type, routes in FEEDS:
+        filename = fixtures.write_gtfs(folder, name, route_type, routes,
+                                       seed=config.seed)
+        # Every call adds the feed to its own copy of the city graph
+        inputs = [(base.copy(), street, [filename])
+                  for r in range(config.repeat)]
+        stats = measure(gtfs.add_feeds, inputs, warmup=0)
+        report = gtfs.add_feeds(base.copy(), street, [filename])[0]
+        stats.update({'stops': report.stops, 'trips': report.trips,
+                      'stop_times': report.stop_times,
+                      'segments': report.segments,
+                      'stop_times_per_s': report.stop_times / report.seconds})
+        results['add_feed_' + name] = stats
+    return results
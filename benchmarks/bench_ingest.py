@@ -0,0 +1,75 @@
+"""
+Benchmark of the restaurant file reading on a large file: the previous read
+(the whole file at once with pandas), the chunked read and the ingestion into
+the columnar store. Every way runs in its own process to measure its peak
+resident memory.
+"""
+
+# Library used to run every way in its own process
+import os
+import sys
+import json
+import subprocess
+# Library used to access different data types
+from typing import Dict
+# Measuring functions of the benchmarks
+from benchmarks.harness import summary, Stats, PEAK_RSS
+# Fixed data of the benchmarks
+from benchmarks import fixtures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Rows of the large restaurant file
+ROWS = 300000
+FOLDER = 'large'
+
+# Code of every way, run in a new process that prints its peak memory
+WAYS: Dict[str, str] = {
+    'import_only': "pass",
+    'read_whole': """
+df = pd.read_csv(FILE, usecols=list(restaurants.COLUMNS.values()))
+df = df.drop_duplicates(subset=['name'])
+rows = [restaurants.Restaurant(*row[1:]) for row in df.itertuples()]
+""",
+    'read_chunked': "rows = restaurants.read(FILE)",
+    'ingest_store': "ingest.ingest(FILE, FILE + '.store')"}
+TEMPLATE = """
+import sys, time, json
+{peak}
+sys.path.insert(0, {root!r})
+import pandas as pd
+import restaurants, ingest
+FILE = {file!r}
+start = time.perf_counter()
+{code}
+print(json.dumps([time.perf_counter() - start, peak_rss()]))
+"""
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times and measures the peak resident memory of every way of
+              reading a large restaurant file.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every way.
+    """
+    folder = os.path.join(os.getcwd(), FOLDER)
+    path = os.path.join(folder, 'restaurants.csv')
+    if not os.path.exists(path):
+        os.makedirs(folder, exist_ok=True)
+        fixtures.write_restaurants(folder, ROWS, config.seed)
+    results: Dict[str, Stats] = {}
+    for name, code in WAYS.items():
+        samples, peaks = [], []
+        for r in range(config.repeat):
+            output = subprocess.run(
+                [sys.executable, '-c',
+                 TEMPLATE.format(peak=PEAK_RSS, root=ROOT, file=path,
+                                 code=code)],
+                capture_output=True, text=True, check=True).stdout
+            seconds, peak = json.loads(output.splitlines()[-1])
+            samples.append(seconds)
+            peaks.append(peak / 1024)
+        results[name] = summary(samples)
+        results[name]['peak_rss_mb'] = max(peaks)
+        results[name]['rows'] = ROWS
+    return results
@@ -0,0 +1,84 @@
+"""
+Benchmark of the search kernels: one to one searches (networkx
+bidirectional Dijkstra against the bidirectional kernel), searches within
+a time limit and the fastest paths on the contracted graph, with every
+backend available. The streets are split in several segments, as in
+bench_contract, so the graph has the size of the osmnx graphs.
+"""
+
+# Library used to choose the pairs
+import random
+# Library used to access different data types
+from typing import Dict
+# Library used to manipulate graphs
+import networkx as nx
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+from benchmarks.bench_routing import pairs
+from benchmarks.bench_contract import split, PARTS
+
+# Time limit of the searches within a time (seconds)
+LIMIT = 600.0
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times the searches of networkx and of the kernels of every
+              backend.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import city
+    import metro
+    import contract
+    import kernels
+    street = split(city.load_osmnx_graph('graf.dat'), PARTS)
+    g = city.build_city_graph(street, metro.get_metro_graph())
+    rnd = random.Random(config.seed)
+    nodes = [n for n, kind in g.nodes(data='type') if kind == 'Street']
+    node_pairs = [(rnd.choice(nodes), rnd.choice(nodes))
+                  for i in range(config.pairs)]
+    results: Dict[str, Stats] = {}
+    results['networkx_p2p'] = measure(
+        nx.bidirectional_dijkstra,
+        [(g, a, b, 'time') for a, b in node_pairs], repeat=config.repeat)
+    results['networkx_radius'] = measure(
+        nx.single_source_dijkstra_path_length,
+        [(g, a, LIMIT, 'time') for a, b in node_pairs],
+        repeat=config.repeat)
+    results['csr_build'] = measure(kernels.build, [(g,)],
+                                   repeat=config.repeat)
+    csr = kernels.build(g)
+    od = pairs(config.pairs, config.seed)
+
+    def clean() -> None:
+        city.delete_additional_nodes(g)
+
+    previous = kernels.backend()
+    for backend in kernels.BACKENDS:
+        if not kernels.available(backend):
+            continue
+        kernels.select(backend)
+        # First call: compilation, or load of the compiled code from disk
+        results[backend + '_warm'] = measure(kernels.warm, [()], warmup=0)
+        results[backend + '_p2p'] = measure(
+            kernels.shortest_path,
+            [(csr, {a: 0.0}, {b: 0.0}) for a, b in node_pairs],
+            repeat=config.repeat)
+        results[backend + '_radius'] = measure(
+            kernels.distances, [(csr, {a: 0.0}, LIMIT)
+                                for a, b in node_pairs],
+            repeat=config.repeat)
+        contraction = contract.contract(g)
+        results[backend + '_contracted'] = measure(
+            contract.find_path,
+            [(street, g, contraction, src, dst) for src, dst in od],
+            repeat=config.repeat, warmup=len(od), after=clean)
+        for search in ('p2p', 'radius'):
+            results[backend + '_' + search]['speedup'] = \
+                results['networkx_' + search]['mean_ms'] / \
+                results[backend + '_' + search]['mean_ms']
+    kernels.select(previous)
+    for stats in results.values():
+        stats['nodes'] = g.number_of_nodes()
+    return results
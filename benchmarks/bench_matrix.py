@@ -0,0 +1,44 @@
+"""
+Benchmark of the metro travel time matrix: build time, memory, latency of
+the trips answered with the matrix and agreement with Dijkstra.
+"""
+
+# Library used to access different data types
+from typing import Dict
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+from benchmarks.bench_routing import pairs
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times metro_matrix.build_matrix and metro_matrix.find_path and
+              validates the paths against city.find_path.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import city
+    import metro
+    import metro_matrix
+    street = city.load_osmnx_graph('graf.dat')
+    g = city.build_city_graph(street, metro.get_metro_graph())
+    results: Dict[str, Stats] = {}
+    results['build_matrix'] = measure(metro_matrix.build_matrix, [(g,)],
+                                      repeat=config.repeat, warmup=0)
+    matrix = metro_matrix.build_matrix(g)
+    results['build_matrix'].update({
+        'nodes': len(matrix.nodes),
+        'matrices_mb': matrix.nbytes() / 2**20})
+    od = pairs(config.pairs, config.seed)
+    inputs = [(street, g, matrix, src, dst) for src, dst in od]
+    results['matrix_path'] = measure(metro_matrix.find_path, inputs,
+                                     repeat=config.repeat, warmup=len(inputs))
+    results['dijkstra_path'] = measure(city.find_path,
+                                       [(street, g, src, dst)
+                                        for src, dst in od],
+                                       repeat=config.repeat)
+    results['matrix_path'].update(metro_matrix.validate(street, g, matrix,
+                                                        od))
+    if results['matrix_path']['same'] < 1:
+        raise ValueError("The matrix paths are slower than Dijkstra")
+    return results
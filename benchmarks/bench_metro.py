@@ -0,0 +1,151 @@
+"""
+Benchmark of the metro graph construction on synthetic networks 1 to 100
+times larger than TMB's (several cities, each one with TMB's size).
+"""
+
+# Library used to generate the same network on every run
+import random
+# Library used to access different data types
+from typing import Dict, List, Tuple
+# Library used to compare the graphs
+import networkx as nx
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+
+# Approximate size of TMB's network
+TMB_LINES: int = 8
+TMB_STATIONS_PER_LINE: int = 20
+TMB_ACCESSES_PER_STATION: int = 3
+# Times TMB's size of every measured network
+SCALES: List[int] = [1, 10, 30, 100]
+# Largest scale where the old quadratic construction is also measured
+REFERENCE_SCALE: int = 10
+
+
+def network(scale: int, seed: int) -> Tuple[List, List]:
+    """
+    Function: Generates the stations and accesses of scale cities with the
+              size of TMB's network. Lines of the same city share stations,
+              which become transfers.
+    Parameters: scale -> number of cities
+                seed -> seed of the random generator
+    Return: The list of stations and the list of accesses.
+    """
+    import metro
+    rnd = random.Random(seed)
+    stations: List = []
+    accesses: List = []
+    id = 0
+    for c in range(scale):
+        names = ['City {} station {}'.format(c, k) for k in
+                 range(TMB_LINES * TMB_STATIONS_PER_LINE * 3 // 4)]
+        for n in range(TMB_LINES):
+            line = 'C{}L{}'.format(c, n)
+            for order, name in enumerate(rnd.sample(names,
+                                                    TMB_STATIONS_PER_LINE)):
+                point = (rnd.uniform(2.0, 2.3), rnd.uniform(41.3, 41.5))
+                stations.append(metro.Station('station', id, name, line,
+                                              point, name, order + 1,
+                                              '#FF0000'))
+                id += 1
+        for name in names:
+            for k in range(TMB_ACCESSES_PER_STATION):
+                point = (rnd.uniform(2.0, 2.3), rnd.uniform(41.3, 41.5))
+                accesses.append(metro.Access('access', id, name, point, name,
+                                             'Accessible'))
+                id += 1
+    return stations, accesses
+
+
+def reference_add_edges(G: nx.Graph, stations: List) -> None:
+    """
+    Function: Previous construction of the link and railway edges, which
+              compares every pair of stations.
+    """
+    for station1 in stations:
+        for station2 in stations:
+            if station1.name == station2.name:
+                if station1.line != station2.line:
+                    G.add_edge(station1.id, station2.id, type='Link',
+                               colour='#000000')
+            if int(station1.station_order) + 1 == int(station2.station_order):
+                if station1.line == station2.line:
+                    G.add_edge(station1.id, station2.id, type='Railway',
+                               colour=station1.colour)
+
+
+def reference_add_acces_node(G: nx.Graph, stations: List,
+                             accesses: List) -> None:
+    """
+    Function: Previous construction of the access edges, which scans the
+              stations for every access.
+    """
+    for access in accesses:
+        G.add_node(access.id, type=access.type, location=access.loc)
+        for station in stations:
+            if access.code == station.code:
+                G.add_edge(station.id, access.id, type='Access',
+                           colour='#000000')
+                break
+
+
+def build(stations: List, accesses: List) -> nx.Graph:
+    """
+    Function: Previous construction of the metro graph from the lists of
+              stations and accesses.
+    """
+    G = nx.Graph()
+    for station in stations:
+        G.add_node(station.id, type=station.type, line=station.line,
+                   location=station.loc, name=station.name)
+    reference_add_acces_node(G, stations, accesses)
+    reference_add_edges(G, stations)
+    return G
+
+
+def tables(stations: List, accesses: List) -> Tuple:
+    """
+    Function: Converts the lists of stations and accesses into the tables
+              that metro.build_graph uses.
+    """
+    import pandas as pd
+    station_table = pd.DataFrame(
+        [(s.id, s.name, s.line, s.code, s.station_order, s.colour, s.loc[0],
+          s.loc[1]) for s in stations],
+        columns=['id', 'name', 'line', 'code', 'station_order', 'colour',
+                 'x', 'y'])
+    access_table = pd.DataFrame(
+        [(a.id, a.name, a.code, a.accessibility, a.loc[0], a.loc[1])
+         for a in accesses],
+        columns=['id', 'name', 'code', 'accessibility', 'x', 'y'])
+    return station_table, access_table
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times the metro graph construction from the columnar tables
+              at every scale, and the old construction at the small scales,
+              checking the graphs match.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import metro
+    results: Dict[str, Stats] = {}
+    for scale in SCALES:
+        stations, accesses = network(scale, config.seed)
+        stats = measure(metro.build_graph, [tables(stations, accesses)],
+                        repeat=config.repeat)
+        stats['stations'] = len(stations)
+        stats['accesses'] = len(accesses)
+        results['columnar_x' + str(scale)] = stats
+        if scale <= REFERENCE_SCALE:
+            old = build(stations, accesses)
+            columnar = metro.build_graph(*tables(stations, accesses))
+            if not nx.utils.edges_equal(columnar.edges(data=True),
+                                        old.edges(data=True)):
+                raise AssertionError('metro graphs differ at x' +
+                                     str(scale))
+            stats = measure(build, [(stations, accesses)], repeat=1,
+                            warmup=0)
+            results['quadratic_x' + str(scale)] = stats
+    return results
@@ -0,0 +1,130 @@
+"""
+Benchmark of the offline build of the street graph from an OpenStreetMap
+extract: an .osm XML file is written with the streets of a large jittered
+grid, every street drawn with several nodes and joined to the next streets
+of its row or column in long ways, with some ways that cannot be walked and
+some tagged nodes. The streaming build of the osm module and the osmnx build
+from the same file run in their own processes to measure their time and
+peak resident memory.
+"""
+
+# Library used to run every way in its own process
+import os
+import sys
+import json
+import subprocess
+# Library used to write the extract
+from xml.sax.saxutils import quoteattr
+# Library used to access different data types
+from typing import Dict, List
+# Measuring functions of the benchmarks
+from benchmarks.harness import summary, Stats, PEAK_RSS
+# Fixed data of the benchmarks
+from benchmarks import fixtures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Crossroads per side of the grid of the extract
+SIDE = 150
+# Segments of every street (nodes that draw its shape)
+PARTS = 4
+FILE = 'extract.osm'
+
+# Code of every way of building the graph, run in a new process that prints
+# its peak memory and the size of the graph
+WAYS: Dict[str, str] = {
+    'osm_stream': "g = osm.build_graph(FILE)",
+    'osmnx_xml': """
+import osmnx as ox
+g = ox.graph_from_xml(FILE, simplify=True, retain_all=True)
+"""}
+TEMPLATE = """
+import sys, time, json
+{peak}
+sys.path.insert(0, {root!r})
+import osm
+FILE = {file!r}
+start = time.perf_counter()
+{code}
+print(json.dumps([time.perf_counter() - start,
+                  peak_rss(),
+                  g.number_of_nodes(), g.number_of_edges()]))
+"""
+
+
+def write_extract(filename: str, side: int, seed: int) -> None:
+    """
+    Function: Writes an .osm XML extract with the streets of a jittered grid.
+    Parameters: filename -> the extract
+                side -> crossroads per side of the grid
+                seed -> seed of the random generator
+    Return: None.
+    """
+    street = fixtures.street_graph(side, seed)
+    new = max(street.nodes) + 1
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n"
+                "<osm version='0.6' generator='benchmarks'>\n")
+        for n, data in street.nodes(data=True):
+            f.write("<node id='{}' lat='{:.7f}' lon='{:.7f}'/>\n".format(
+                n, data['y'], data['x']))
+        ways: List[List[int]] = []
+        for u in sorted(street.nodes):
+            # The streets of a column (next j) and of a row (next i)
+            for step in (1, side):
+                if street.has_edge(u, u - step):
+                    continue
+                refs, current = [u], u
+                while street.has_edge(current, current + step):
+                    a, b = street.nodes[current], street.nodes[current + step]
+                    for k in range(1, PARTS):
+                        t = k / PARTS
+                        f.write("<node id='{}' lat='{:.7f}' lon='{:.7f}'>"
+                                "<tag k='created_by' v='benchmark'/>"
+                                "</node>\n".format(
+                                    new, a['y'] * (1 - t) + b['y'] * t,
+                                    a['x'] * (1 - t) + b['x'] * t))
+                        refs.append(new)
+                        new += 1
+                    current += step
+                    refs.append(current)
+                if len(refs) > 1:
+                    ways.append(refs)
+        for w, refs in enumerate(ways):
+            # Every tenth way is a motorway, not in the walk network
+            highway = 'motorway' if w % 10 == 9 else 'residential'
+            f.write("<way id='{}'>{}<tag k='highway' v={}/>"
+                    "<tag k='name' v={}/></way>\n".format(
+                        w + 1, ''.join("<nd ref='{}'/>".format(r)
+                                       for r in refs),
+                        quoteattr(highway), quoteattr('Carrer {}'.format(w))))
+        f.write("</osm>\n")
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times and measures the peak resident memory of the builds of
+              the street graph from a large extract.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every way.
+    """
+    path = os.path.join(os.getcwd(), FILE)
+    if not os.path.exists(path):
+        write_extract(path, SIDE, config.seed)
+    results: Dict[str, Stats] = {}
+    for name, code in WAYS.items():
+        samples, peaks = [], []
+        for r in range(config.repeat):
+            output = subprocess.run(
+                [sys.executable, '-c',
+                 TEMPLATE.format(peak=PEAK_RSS, root=ROOT, file=path,
+                                 code=code)],
+                capture_output=True, text=True, check=True).stdout
+            seconds, peak, nodes, edges = json.loads(output.splitlines()[-1])
+            samples.append(seconds)
+            peaks.append(peak / 1024)
+        results[name] = summary(samples)
+        results[name]['peak_rss_mb'] = max(peaks)
+        results[name]['nodes'] = nodes
+        results[name]['edges'] = edges
+        results[name]['file_mb'] = os.path.getsize(path) / 1024 ** 2
+    return results
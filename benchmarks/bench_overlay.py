@@ -0,0 +1,99 @@
+"""
+Benchmark of the multi-level overlay: preprocessing (partition and first
+customization), customization after a change of the times of the streets
+and of the railway, and one to one searches compared with networkx and the
+bidirectional kernel, with every backend available. It runs on the split
+fixture graph (as bench_kernels) and on a split grid with SCALE times more
+nodes in the same area.
+"""
+
+# Library used to choose the pairs
+import random
+# Library used to compute the side of the large grid
+import math
+# Library used to access different data types
+from typing import Dict
+# Library used to manipulate graphs
+import networkx as nx
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+from benchmarks.bench_contract import split, PARTS
+# Fixed data of the benchmarks
+from benchmarks import fixtures
+
+# Times more nodes of the large graph
+SCALE = 10
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times the overlay on the split fixture graph and on the large
+              graph.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import city
+    import metro
+    import kernels
+    import overlay
+    import updates
+    original = city.load_osmnx_graph('graf.dat')
+    side = round(math.sqrt(SCALE * original.number_of_nodes()))
+    metro_graph = metro.get_metro_graph()
+    results: Dict[str, Stats] = {}
+    previous = kernels.backend()
+    for name, street in (('split', split(original, PARTS)),
+                         ('large', split(fixtures.street_graph(side,
+                                                               config.seed),
+                                         PARTS))):
+        g = city.build_city_graph(street, metro_graph)
+        rnd = random.Random(config.seed)
+        nodes = [n for n, kind in g.nodes(data='type') if kind == 'Street']
+        node_pairs = [(rnd.choice(nodes), rnd.choice(nodes))
+                      for i in range(config.pairs)]
+        results[name + '_networkx'] = measure(
+            nx.bidirectional_dijkstra,
+            [(g, a, b, 'time') for a, b in node_pairs], repeat=config.repeat)
+        for backend in kernels.BACKENDS:
+            if not kernels.available(backend):
+                continue
+            kernels.select(backend)
+            kernels.warm()
+            key = name + '_' + backend
+            results[key + '_build'] = measure(overlay.Overlay, [(g,)],
+                                              repeat=config.repeat)
+            ov = overlay.Overlay(g)
+            results[key + '_build'].update(overlay.summary(ov))
+            # Every customization follows a change of the times. The last
+            # call of measure changes them once more: they are customized
+            # before the next kind, which would pay for them otherwise
+            for kind in ('Street', 'Railway'):
+                ov.customize(g)
+                factors = iter([1.25, 0.8] * (config.repeat + 1))
+                updates.scale_times(g, kind, next(factors))
+                results[key + '_customize_' + kind.lower()] = measure(
+                    ov.customize, [(g,)], repeat=config.repeat, warmup=0,
+                    after=lambda: updates.scale_times(g, kind,
+                                                      next(factors)))
+                results[key + '_customize_' + kind.lower()]['cells'] = \
+                    ov.recomputed
+            ov.customize(g)
+            csr = kernels.build(g)
+            results[key + '_kernel'] = measure(
+                kernels.shortest_path,
+                [(csr, {a: 0.0}, {b: 0.0}) for a, b in node_pairs],
+                repeat=config.repeat)
+            results[key + '_overlay'] = measure(
+                ov.search, [({a: 0.0}, {b: 0.0}) for a, b in node_pairs],
+                repeat=config.repeat)
+            results[key + '_overlay']['mismatches'] = sum(
+                abs(kernels.shortest_path(csr, {a: 0.0}, {b: 0.0})[0] -
+                    ov.search({a: 0.0}, {b: 0.0})[0]) > 1e-6
+                for a, b in node_pairs)
+            results[key + '_overlay']['speedup'] = \
+                results[key + '_kernel']['mean_ms'] / \
+                results[key + '_overlay']['mean_ms']
+        for stats in results.values():
+            stats.setdefault('nodes', g.number_of_nodes())
+    kernels.select(previous)
+    return results
@@ -0,0 +1,38 @@
+"""
+Benchmark of the path rendering, with the map tiles replaced by a blank
+background so that no network is used.
+"""
+
+# Library used to write the images in a temporary folder
+import os
+import tempfile
+# Library used to access different data types
+from typing import Dict
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+# Fixed data of the benchmarks
+from benchmarks import fixtures
+from benchmarks.bench_routing import pairs
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times plot_path over the paths of some fixed pairs.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import city
+    import metro
+    fixtures.stub_tiles()
+    street = city.load_osmnx_graph('graf.dat')
+    g = city.build_city_graph(street, metro.get_metro_graph())
+    folder = tempfile.mkdtemp()
+    inputs = []
+    for i, (src, dst) in enumerate(pairs(max(config.pairs // 10, 3),
+                                         config.seed)):
+        # The virtual source and destiny nodes are removed from the path,
+        # because they are deleted from the graph before the next search
+        path = city.find_path(street, g, src, dst)[1:-1]
+        city.delete_additional_nodes(g)
+        inputs.append((path, g, os.path.join(folder, str(i) + '.png')))
+    return {'plot_path': measure(city.plot_path, inputs, repeat=1)}
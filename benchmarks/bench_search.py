@@ -0,0 +1,61 @@
+"""
+Benchmarks of the restaurant searches.
+"""
+
+# Library used to split the logic queries as the bot does
+import re
+# Library used to access different data types
+from typing import Dict, List
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+
+# Queries as users write them, with typos and accents
+QUERIES: List[str] = ['pizza', 'piza', 'sushi', 'sushy', 'tapes', 'gracia',
+                      'Gràcia', 'raval', 'poblenou', 'hamburgueseria',
+                      'vegetaria', 'casa', 'taverna', 'mar', 'italiana',
+                      'japonesa', 'catalana', 'sants', 'marisqueria', 'xyz']
+# Beginnings of names and types as users type them, with typos
+PREFIX_QUERIES: List[str] = ['piz', 'piza', 'sush', 'sushy', 'tap', 'hamb',
+                             'hamvur', 'vegetar', 'vegatar', 'restaurant p',
+                             'restaurant pizzeria 1', 'cuina med', 'x']
+LOGIC_QUERIES: List[str] = ['and(pizza,gracia)', 'or(sushi,tapes)',
+                            'not(pizza)', 'and(sushi,raval)',
+                            'and(sushi,poblenou)', 'or(vegetaria,mar)']
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times the index build, find_rest, the top 12 ranked search,
+              the completion of the names and types and logic_search over a
+              query corpus.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import restaurants
+    import ranking
+    import autocomplete
+    restaurant_list = restaurants.get_list()
+    results: Dict[str, Stats] = {}
+    results['index_build'] = measure(ranking.Index, [(restaurant_list,)],
+                                     repeat=config.repeat)
+    results['find_rest'] = measure(restaurants.find_rest,
+                                   [(q, restaurant_list) for q in QUERIES],
+                                   repeat=config.repeat)
+    results['find_rest_top12'] = measure(restaurants.find_rest,
+                                         [(q, restaurant_list, 12)
+                                          for q in QUERIES],
+                                         repeat=config.repeat)
+    results['completer_build'] = measure(autocomplete.Completer,
+                                         [(restaurant_list,)],
+                                         repeat=config.repeat)
+    completer = autocomplete.completer_of(restaurant_list)
+    results['complete'] = measure(completer.complete,
+                                  [(q,) for q in PREFIX_QUERIES],
+                                  repeat=config.repeat)
+    inputs = []
+    for query in LOGIC_QUERIES:
+        splited = re.split(r'\W+', query)
+        inputs.append((splited, splited[0]))
+    results['logic_search'] = measure(restaurants.logic_search, inputs,
+                                      repeat=config.repeat)
+    return results
@@ -0,0 +1,109 @@
+"""
+Load test of the routing service: throughput of travel requests sent by
+several client threads, with different numbers of worker processes and
+batch sizes.
+"""
+
+# Library used to start the service
+import os
+import sys
+import subprocess
+import socket
+# Library used to send the requests at the same time
+from concurrent.futures import ThreadPoolExecutor
+# Library used to measure elapsed time
+import time
+# Library used to access different data types
+from typing import Dict, List, Tuple
+# Measuring functions of the benchmarks
+from benchmarks.harness import summary, Stats
+from benchmarks.bench_routing import pairs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Numbers of worker processes compared
+WORKERS = [1, 2, 4]
+# Client threads sending requests at the same time
+CLIENTS = 8
+# Travel operations sent in every request
+BATCHES = [1, 8]
+
+
+def free_port() -> int:
+    """
+    Function: Finds a free TCP port of the machine.
+    Parameters: None
+    Return: The port.
+    """
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start(workers: int) -> Tuple[subprocess.Popen, str]:
+    """
+    Function: Starts the service in the fixture folder and waits until it
+              answers.
+    Parameters: workers -> number of worker processes
+    Return: The process and the address of the service.
+    """
+    from client import Client
+    address = '127.0.0.1:{}'.format(free_port())
+    process = subprocess.Popen([sys.executable,
+                                os.path.join(ROOT, 'service.py'),
+                                '--address', address,
+                                '--workers', str(workers)],
+                               stdout=subprocess.DEVNULL)
+    client = Client(address)
+    for i in range(600):
+        connection = client.connect()
+        try:
+            connection.request('GET', '/health')
+            connection.getresponse().read()
+            return process, address
+        except OSError:
+            time.sleep(0.1)
+        finally:
+            connection.close()
+    process.kill()
+    raise RuntimeError("The service did not start")
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Sends the travel requests of the routing pairs to the service
+              from CLIENTS threads and measures the latency of every request
+              and the total throughput.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    from client import Client
+    od = pairs(config.pairs, config.seed) * config.repeat
+    results: Dict[str, Stats] = {}
+    for workers in WORKERS:
+        process, address = start(workers)
+        try:
+            for size in BATCHES:
+                client = Client(address, connections=CLIENTS)
+                batches = [[{'op': 'travel', 'src': src, 'dst': dst}
+                            for src, dst in od[i:i + size]]
+                           for i in range(0, len(od), size)]
+                client.batch(batches[0])
+
+                def send(batch: List[Dict]) -> float:
+                    begin = time.perf_counter()
+                    client.batch(batch)
+                    return time.perf_counter() - begin
+
+                begin = time.perf_counter()
+                with ThreadPoolExecutor(CLIENTS) as pool:
+                    samples = list(pool.map(send, batches))
+                elapsed = time.perf_counter() - begin
+                client.close()
+                name = 'workers_{}_batch_{}'.format(workers, size)
+                results[name] = summary(samples)
+                results[name]['travels_per_s'] = len(od) / elapsed
+        finally:
+            process.terminate()
+            process.wait()
+    results['cpus'] = {'count': os.cpu_count() or 1}
+    return results
@@ -0,0 +1,110 @@
+"""
+Benchmarks of the spatial index: nearest, radius and bounding box queries
+on a large list of random restaurants, with the grid and with a scan of the
+whole list, and the near search with a text filter on the fixture.
+"""
+
+# Library used to generate the large list
+import random
+# Library used to access different data types
+from typing import Dict, List, NamedTuple, Tuple
+# Library used to scan the whole list
+import numpy as np
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+# Fixed data of the benchmarks
+from benchmarks import fixtures
+
+# Restaurants of the large list
+ROWS = 300000
+# Queries of every kind
+QUERIES = 50
+# Distance of the radius queries and side of the boxes (meters)
+METERS = 800.0
+
+
+class Point(NamedTuple):
+    """
+    Class: Contains the coordinates of a restaurant as the Restaurant class
+           (x_coord is the latitude).
+    """
+    x_coord: float
+    y_coord: float
+
+
+def scan_nearest(lat: np.ndarray, lon: np.ndarray, point: Tuple[float, float],
+                 k: int) -> np.ndarray:
+    """
+    Function: Finds the nearest restaurants computing every distance.
+    Parameters: lat, lon -> coordinates of the restaurants
+                point -> (lon, lat) of the location
+                k -> number of restaurants
+    Return: The positions of the restaurants.
+    """
+    import spatial
+    distances = spatial.haversine(point[1], point[0], lat, lon)
+    nearest = np.argpartition(distances, k)[:k]
+    return nearest[np.argsort(distances[nearest])]
+
+
+def scan_radius(lat: np.ndarray, lon: np.ndarray, point: Tuple[float, float],
+                meters: float) -> np.ndarray:
+    """
+    Function: Finds the restaurants at a distance computing every distance.
+    Parameters: lat, lon -> coordinates of the restaurants
+                point -> (lon, lat) of the location
+                meters -> largest distance
+    Return: The positions of the restaurants.
+    """
+    import spatial
+    distances = spatial.haversine(point[1], point[0], lat, lon)
+    return np.flatnonzero(distances <= meters)
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times the build of the grid and the queries with the grid and
+              with a scan of the whole list.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import spatial
+    import restaurants
+    rnd = random.Random(config.seed)
+    points: List[Point] = []
+    for i in range(ROWS):
+        lon, lat = fixtures.random_point(rnd)
+        points.append(Point(lat, lon))
+    queries = [fixtures.random_point(rnd) for i in range(QUERIES)]
+    # Boxes of side METERS around the queries
+    half_lat = METERS / 2 / 110540
+    half_lon = METERS / 2 / (111320 * np.cos(np.radians(41.39)))
+    boxes = [(lat - half_lat, lon - half_lon, lat + half_lat,
+              lon + half_lon) for lon, lat in queries]
+    lat = np.array([p.x_coord for p in points])
+    lon = np.array([p.y_coord for p in points])
+    results: Dict[str, Stats] = {}
+    results['grid_build'] = measure(spatial.SpatialIndex, [(points,)],
+                                    repeat=config.repeat)
+    index = spatial.SpatialIndex(points)
+    results['grid_nearest'] = measure(
+        index.nearest, [(q[1], q[0], spatial.K) for q in queries],
+        repeat=config.repeat)
+    results['scan_nearest'] = measure(
+        scan_nearest, [(lat, lon, q, spatial.K) for q in queries],
+        repeat=config.repeat)
+    results['grid_radius'] = measure(
+        index.radius, [(q[1], q[0], METERS) for q in queries],
+        repeat=config.repeat)
+    results['scan_radius'] = measure(
+        scan_radius, [(lat, lon, q, METERS) for q in queries],
+        repeat=config.repeat)
+    results['grid_bbox'] = measure(index.bbox, boxes, repeat=config.repeat)
+    for stats in results.values():
+        stats['rows'] = ROWS
+    # Near search with a text filter on the restaurants of the fixture
+    restaurants.get_list()
+    results['near_text'] = measure(
+        restaurants.near, [(q, METERS, 'sushi') for q in queries],
+        repeat=config.repeat)
+    return results
@@ -0,0 +1,59 @@
+"""
+Benchmark of the schedule-aware routing: timetable build time, latency of
+the earliest arrival queries with the Connection Scan Algorithm and of the
+travel time of a path following the timetable.
+"""
+
+# Library used to write the feeds in a temporary folder
+import tempfile
+# Library used to access different data types
+from typing import Dict
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+# Fixed data of the benchmarks
+from benchmarks import fixtures
+from benchmarks.bench_gtfs import FEEDS
+from benchmarks.bench_routing import pairs
+
+# Departure time of the queries (8:00)
+DEPARTURE = 8 * 3600
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times transit.build_timetable, transit.earliest_arrival and
+              transit.path_time on the feeds of the GTFS benchmark.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import city
+    import metro
+    import gtfs
+    import transit
+    folder = tempfile.mkdtemp()
+    filenames = [fixtures.write_gtfs(folder, name, route_type, routes,
+                                     seed=config.seed)
+                 for name, route_type, routes in FEEDS]
+    street = city.load_osmnx_graph('graf.dat')
+    g = city.build_city_graph(street, metro.get_metro_graph())
+    gtfs.add_feeds(g, street, filenames)
+    results: Dict[str, Stats] = {}
+    results['build_timetable'] = measure(transit.build_timetable,
+                                         [(filenames,)], repeat=config.repeat,
+                                         warmup=0)
+    tt = transit.build_timetable(filenames)
+    results['build_timetable'].update({'stops': len(tt.stops),
+                                       'connections': len(tt.trip)})
+    inputs = [(tt, g, street, src, dst, DEPARTURE)
+              for src, dst in pairs(config.pairs, config.seed)]
+    results['earliest_arrival'] = measure(transit.earliest_arrival, inputs,
+                                          repeat=config.repeat)
+    paths = []
+    for src, dst in pairs(config.pairs, config.seed):
+        # Without the src and dst nodes, which are removed from the graph
+        paths.append((tt, g, city.find_path(street, g, src, dst)[1:-1],
+                      DEPARTURE))
+        city.delete_additional_nodes(g)
+    results['path_time'] = measure(transit.path_time, paths,
+                                   repeat=config.repeat)
+    return results
@@ -0,0 +1,45 @@
+"""
+Benchmark of the many-to-many travel time matrices, with one process and
+with a pool of processes.
+"""
+
+# Library used to generate the same points on every run
+import random
+# Library used to access different data types
+from typing import Dict
+# Measuring functions of the benchmarks
+from benchmarks.harness import measure, Stats
+# Fixed data of the benchmarks
+from benchmarks import fixtures
+
+# Number of origins and destinations of the matrix
+ORIGINS = 60
+DESTINATIONS = 400
+# Numbers of processes compared
+WORKERS = [1, 4]
+
+
+def run(config) -> Dict[str, Stats]:
+    """
+    Function: Times travel_matrix.travel_matrix.
+    Parameters: config -> options of the benchmark run
+    Return: The statistics of every benchmark.
+    """
+    import city
+    import metro
+    import travel_matrix
+    street = city.load_osmnx_graph('graf.dat')
+    g = city.build_city_graph(street, metro.get_metro_graph())
+    rnd = random.Random(config.seed)
+    origins = [fixtures.random_point(rnd) for i in range(ORIGINS)]
+    destinations = [fixtures.random_point(rnd) for i in range(DESTINATIONS)]
+    results: Dict[str, Stats] = {}
+    for workers in WORKERS:
+        name = 'matrix_{}x{}_workers_{}'.format(ORIGINS, DESTINATIONS,
+                                                workers)
+        results[name] = measure(travel_matrix.travel_matrix,
+                                [(street, g, origins, destinations,
+                                  workers)], repeat=config.repeat)
+        results[name]['pairs_per_s'] = ORIGINS * DESTINATIONS / (
+            results[name]['mean_ms'] / 1000)
+    return results
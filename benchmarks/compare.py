@@ -0,0 +1,48 @@
+"""
+Compares two benchmark result files, for example of two commits.
+Usage: python3 -m benchmarks.compare old.json new.json [--threshold 1.10]
+"""
+
+# Library used to read the command line arguments
+import argparse
+# Library used to read the results
+import json
+import sys
+
+METRICS = ['p50_ms', 'p95_ms', 'p99_ms', 'peak_memory_mb']
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=1.10,
+                        help='new/old ratio considered a regression')
+    config = parser.parse_args()
+    with open(config.old) as f:
+        old = json.load(f)['results']
+    with open(config.new) as f:
+        new = json.load(f)['results']
+
+    regressions = 0
+    print('{:<34} {:>16} {:>12} {:>12} {:>7}'.format(
+        'benchmark', 'metric', 'old', 'new', 'ratio'))
+    for suite in sorted(set(old) & set(new)):
+        for bench in sorted(set(old[suite]) & set(new[suite])):
+            for metric in METRICS:
+                a = old[suite][bench].get(metric)
+                b = new[suite][bench].get(metric)
+                if a is None or b is None:
+                    continue
+                ratio = b / a if a > 0 else 1.0
+                mark = ''
+                if ratio > config.threshold:
+                    mark = ' <- regression'
+                    regressions += 1
+                print('{:<34} {:>16} {:>12.3f} {:>12.3f} {:>7.2f}{}'.format(
+                    suite + '.' + bench, metric, a, b, ratio, mark))
+    sys.exit(int(regressions > 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+Fixed data used by the benchmarks.
+All the files the bot reads (graf.dat, estacions.csv, accessos.csv and
+restaurants.csv) are generated from a fixed seed, so every run and every
+commit works on exactly the same snapshot without downloading anything.
+"""
+
+# Library used to write the csv files
+import csv
+# Library used to build the files paths
+import os
+# Library used to pickle the street graph snapshot
+import pickle
+# Library used to generate the same data on every run
+import random
+# Library used to compute the street lengths
+import math
+# Library used to access different data types
+from typing import Dict, List, Tuple
+# Library used to write the GTFS feeds
+import zipfile
+# Library used to build the street graph snapshot
+import networkx as nx
+
+SEED: int = 2022
+# Bounding box of the fixture (longitude, latitude), the centre of Barcelona
+WEST, EAST = 2.120, 2.200
+SOUTH, NORTH = 41.365, 41.415
+
+# Side of the street grid (number of crossroads per side) of every size
+SIZES: Dict[str, int] = {'small': 40, 'medium': 90, 'large': 180}
+
+LINES: List[Tuple[str, str]] = [('L1', 'CE1126'), ('L2', '93248F'),
+                                ('L3', '1EB53A'), ('L4', 'F7A30E'),
+                                ('L5', '005A97'), ('L9N', 'FB712B'),
+                                ('L10N', '00A6D6'), ('L11', '89B94C')]
+STATIONS: List[str] = ['Sants Estació', 'Espanya', 'Catalunya', 'Diagonal',
+                       'Verdaguer', 'Sagrada Família', 'Clot', 'Glòries',
+                       'Urquinaona', 'Fontana', 'Lesseps', 'Paral·lel',
+                       'Universitat', 'Passeig de Gràcia', 'Jaume I',
+                       'Barceloneta', 'Drassanes', 'Liceu', 'Poble Sec',
+                       'Hostafrancs', 'Plaça de Sants', 'Badal', 'Collblanc',
+                       'Maria Cristina', 'Palau Reial', 'Zona Universitària',
+                       'Les Corts', 'Hospital Clínic', 'Provença', 'Joanic',
+                       'Alfons X', 'Guinardó', 'Maragall', 'Virrei Amat',
+                       'Vilapicina', 'Horta', 'Vall d\'Hebron', 'Sant Pau',
+                       'Encants', 'Monumental', 'Marina', 'Bogatell',
+                       'Llacuna', 'Poblenou', 'Selva de Mar', 'El Maresme']
+TYPES: List[str] = ['Pizzeria', 'Sushi', 'Hamburgueseria', 'Tapes',
+                    'Cuina mediterrània', 'Vegetarià', 'Cuina catalana',
+                    'Marisqueria', 'Cuina italiana', 'Cuina japonesa']
+NEIGHBOURHOODS: List[Tuple[str, str]] = [
+    ('la Vila de Gràcia', 'Gràcia'), ('Sants', 'Sants-Montjuïc'),
+    ('el Raval', 'Ciutat Vella'), ('Sant Antoni', 'Eixample'),
+    ('la Barceloneta', 'Ciutat Vella'), ('el Poblenou', 'Sant Martí'),
+    ('les Corts', 'Les Corts'), ('Sant Gervasi - Galvany',
+                                 'Sarrià-Sant Gervasi'),
+    ('el Clot', 'Sant Martí'), ('la Sagrada Família', 'Eixample')]
+WORDS: List[str] = ['Casa', 'Bar', 'Can', 'La', 'El', 'Taverna', 'Celler',
+                    'Racó', 'Forn', 'Bodega', 'Mar', 'Sol', 'Lluna', 'Roma',
+                    'Tokyo', 'Nonna', 'Pepa', 'Jordi', 'Montse', 'Gambrinus']
+
+
+def distance(x1: float, y1: float, x2: float, y2: float) -> float:
+    """
+    Function: Computes the distance in meters between two (lon, lat) points.
+    Parameters: x1, y1 -> first point
+                x2, y2 -> second point
+    Return: The distance in meters.
+    """
+    dx = (x2 - x1) * 111320 * math.cos(math.radians((y1 + y2) / 2))
+    dy = (y2 - y1) * 110540
+    return math.hypot(dx, dy)
+
+
+def random_point(rnd: random.Random) -> Tuple[float, float]:
+    """
+    Function: Gives a random point inside the fixture bounding box.
+    Parameters: rnd -> random generator
+    Return: A (lon, lat) point.
+    """
+    return (rnd.uniform(WEST, EAST), rnd.uniform(SOUTH, NORTH))
+
+
+def street_graph(side: int, seed: int = SEED) -> nx.MultiDiGraph:
+    """
+    Function: Builds a street graph shaped like the graphs osmnx downloads: a
+              jittered grid of crossroads with streets in both directions and
+              some streets missing.
+    Parameters: side -> number of crossroads per side
+                seed -> seed of the random generator
+    Return: The street graph.
+    """
+    rnd = random.Random(seed)
+    g = nx.MultiDiGraph(crs='epsg:4326')
+    step_x = (EAST - WEST) / (side - 1)
+    step_y = (NORTH - SOUTH) / (side - 1)
+    for i in range(side):
+        for j in range(side):
+            g.add_node(100000 + i * side + j,
+                       x=WEST + step_x * (i + rnd.uniform(-0.3, 0.3)),
+                       y=SOUTH + step_y * (j + rnd.uniform(-0.3, 0.3)))
+    for i in range(side):
+        for j in range(side):
+            u = 100000 + i * side + j
+            for di, dj in ((1, 0), (0, 1)):
+                if i + di < side and j + dj < side and rnd.random() > 0.06:
+                    v = 100000 + (i + di) * side + j + dj
+                    length = distance(g.nodes[u]['x'], g.nodes[u]['y'],
+                                      g.nodes[v]['x'], g.nodes[v]['y'])
+                    g.add_edge(u, v, length=length)
+                    g.add_edge(v, u, length=length)
+    return g
+
+
+def write_metro(directory: str, seed: int = SEED) -> None:
+    """
+    Function: Writes estacions.csv and accessos.csv with the columns of the
+              TMB open data files.
+    Parameters: directory -> folder where the files are written
+                seed -> seed of the random generator
+    Return: None.
+    """
+    rnd = random.Random(seed)
+    places = {name: random_point(rnd) for name in STATIONS}
+    codes = {name: 1000 + i for i, name in enumerate(STATIONS)}
+    with open(os.path.join(directory, 'estacions.csv'), 'w',
+              newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['CODI_ESTACIO_LINIA', 'NOM_ESTACIO', 'NOM_LINIA',
+                    'GEOMETRY', 'CODI_ESTACIO', 'ORDRE_ESTACIO',
+                    'COLOR_LINIA'])
+        id = 6000
+        for line, colour in LINES:
+            for order, name in enumerate(rnd.sample(STATIONS, 14)):
+                x, y = places[name]
+                w.writerow([id, name, line, 'POINT ({:.6f} {:.6f})'.format(
+                    x, y), codes[name], order + 1, colour])
+                id += 1
+    with open(os.path.join(directory, 'accessos.csv'), 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['CODI_ACCES', 'NOM_ACCES', 'GEOMETRY', 'ID_ESTACIO',
+                    'NOM_TIPUS_ACCESSIBILITAT'])
+        id = 80000
+        for name in STATIONS:
+            x, y = places[name]
+            for k in range(rnd.randint(1, 4)):
+                w.writerow([id, name + ' ' + str(k + 1),
+                            'POINT ({:.6f} {:.6f})'.format(
+                                x + rnd.uniform(-0.001, 0.001),
+                                y + rnd.uniform(-0.001, 0.001)),
+                            codes[name],
+                            rnd.choice(['Accessible', 'No accessible'])])
+                id += 1
+
+
+def write_restaurants(directory: str, count: int,
+                      seed: int = SEED) -> None:
+    """
+    Function: Writes restaurants.csv with the columns of the Barcelona open
+              data file (and some duplicated names, as the real one has).
+    Parameters: directory -> folder where the file is written
+                count -> number of rows
+                seed -> seed of the random generator
+    Return: None.
+    """
+    rnd = random.Random(seed)
+    with open(os.path.join(directory, 'restaurants.csv'), 'w',
+              newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['register_id', 'name', 'institution_name',
+                    'addresses_road_name', 'addresses_neighborhood_name',
+                    'addresses_district_name', 'secondary_filters_name',
+                    'geo_epgs_4326_x', 'geo_epgs_4326_y', 'values_value',
+                    'addresses_start_street_number'])
+        for i in range(count):
+            type = rnd.choice(TYPES)
+            neighbourhood, district = rnd.choice(NEIGHBOURHOODS)
+            name = ' '.join(rnd.sample(WORDS, 2)) + ' ' + str(i // 2)
+            x, y = random_point(rnd)
+            telf = rnd.choice(['93' + str(rnd.randint(1000000, 9999999)),
+                               '-'])
+            # The open data file has the latitude in the x column
+            w.writerow([i, name, name + ' SL',
+                        'Carrer ' + rnd.choice(STATIONS), neighbourhood,
+                        district, type, y, x, telf, rnd.randint(1, 300)])
+
+
+def write_gtfs(directory: str, name: str, route_type: int, routes: int,
+               stops_per_route: int = 20, headway: int = 600,
+               seed: int = SEED) -> str:
+    """
+    Function: Writes a GTFS zip file with straight routes across the fixture,
+              each one with a trip every headway seconds from 6:00 to 23:00
+              in both directions. Some stops are shared between routes.
+    Parameters: directory -> folder where the file is written
+                name -> name of the feed (the file is name.zip)
+                route_type -> GTFS route type of all the routes
+                routes -> number of routes
+                stops_per_route -> number of stops of every route
+                headway -> seconds between two trips of a route
+                seed -> seed of the random generator
+    Return: The path of the zip file.
+    """
+    rnd = random.Random(seed + route_type)
+    stops: List[Tuple[str, float, float]] = []
+    lines: List[List[int]] = []
+    for r in range(routes):
+        (x1, y1), (x2, y2) = random_point(rnd), random_point(rnd)
+        line = []
+        for k in range(stops_per_route):
+            # A stop of a previous route is reused now and then
+            if len(stops) > 0 and rnd.random() < 0.15:
+                line.append(rnd.randrange(len(stops)))
+                continue
+            t = k / (stops_per_route - 1)
+            stops.append(('S{}'.format(len(stops)), x1 + (x2 - x1) * t,
+                          y1 + (y2 - y1) * t))
+            line.append(len(stops) - 1)
+        lines.append(line)
+
+    def table(rows: List[List]) -> str:
+        return '\n'.join(','.join(str(v) for v in row) for row in rows)
+
+    def hms(seconds: int) -> str:
+        return '{:02d}:{:02d}:{:02d}'.format(seconds // 3600,
+                                             seconds // 60 % 60,
+                                             seconds % 60)
+
+    filename = os.path.join(directory, name + '.zip')
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('agency.txt', table([
+            ['agency_id', 'agency_name', 'agency_url', 'agency_timezone'],
+            [name, name, 'http://example.com', 'Europe/Madrid']]))
+        zf.writestr('stops.txt', table(
+            [['stop_id', 'stop_name', 'stop_lat', 'stop_lon']] +
+            [[id, 'Stop ' + id, '{:.6f}'.format(y), '{:.6f}'.format(x)]
+             for id, x, y in stops]))
+        zf.writestr('routes.txt', table(
+            [['route_id', 'route_short_name', 'route_type', 'route_color']] +
+            [['R{}'.format(r), '{}{}'.format(name[0].upper(), r), route_type,
+              ''] for r in range(routes)]))
+        zf.writestr('calendar.txt', table([
+            ['service_id', 'monday', 'tuesday', 'wednesday', 'thursday',
+             'friday', 'saturday', 'sunday', 'start_date', 'end_date'],
+            ['ALL', 1, 1, 1, 1, 1, 1, 1, '20220101', '20301231']]))
+        trips = [['route_id', 'service_id', 'trip_id']]
+        stop_times = [['trip_id', 'arrival_time', 'departure_time',
+                       'stop_id', 'stop_sequence']]
+        for r, line in enumerate(lines):
+            for direction, sequence in enumerate((line, line[::-1])):
+                start = 6 * 3600 + rnd.randrange(headway)
+                while start < 23 * 3600:
+                    trip = 'R{}-{}-{}'.format(r, direction, start)
+                    trips.append(['R{}'.format(r), 'ALL', trip])
+                    clock = start
+                    for k, stop in enumerate(sequence):
+                        stop_times.append([trip, hms(clock), hms(clock + 20),
+                                           stops[stop][0], k + 1])
+                        clock += 20 + rnd.randint(60, 120)
+                    start += headway
+        zf.writestr('trips.txt', table(trips))
+        zf.writestr('stop_times.txt', table(stop_times))
+    return filename
+
+
+def prepare(directory: str, size: str = 'small') -> Dict[str, int]:
+    """
+    Function: Writes all the fixture files into a folder.
+    Parameters: directory -> folder where the files are written
+                size -> size of the snapshot (small, medium or large)
+    Return: The number of crossroads, streets and restaurants written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    side = SIZES[size]
+    g = street_graph(side)
+    with open(os.path.join(directory, 'graf.dat'), 'wb') as f:
+        pickle.dump(g, f)
+    write_metro(directory)
+    count = side * side // 4
+    write_restaurants(directory, count)
+    return {'nodes': g.number_of_nodes(), 'edges': g.number_of_edges(),
+            'restaurants': count}
+
+
+def stub_tiles() -> None:
+    """
+    Function: Replaces the download of the map tiles of staticmap by a blank
+              background, so that rendering works without network.
+    Parameters: None
+    Return: None.
+    """
+    from staticmap import staticmap
+
+    def draw_base_layer(self, image) -> None:
+        pass
+
+    staticmap.StaticMap._draw_base_layer = draw_base_layer
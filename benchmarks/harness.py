@@ -0,0 +1,106 @@
+"""
+Measuring functions shared by all the benchmarks.
+"""
+
+# Library used to measure elapsed time
+import time
+# Library used to measure the peak memory
+import tracemalloc
+# Library used to access different data types
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+Stats = Dict[str, float]
+
+# Code that gives the peak resident memory (kB) of a process started by a
+# benchmark, run in the process. ru_maxrss would give the one of its parent
+# when it is larger, as a child process starts as a copy of its parent
+PEAK_RSS: str = """
+def peak_rss():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+"""
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """
+    Function: Computes a percentile with linear interpolation.
+    Parameters: samples -> sorted list of measures
+                p -> percentile between 0 and 100
+    Return: The value of the percentile.
+    """
+    if len(samples) == 0:
+        return 0.0
+    k = (len(samples) - 1) * p / 100
+    i = int(k)
+    if i + 1 >= len(samples):
+        return samples[-1]
+    return samples[i] + (samples[i + 1] - samples[i]) * (k - i)
+
+
+def summary(samples: List[float]) -> Stats:
+    """
+    Function: Summarises a list of latencies.
+    Parameters: samples -> latencies in seconds
+    Return: Count, mean, p50, p95, p99 and max in milliseconds and the
+            throughput in operations per second.
+    """
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {'count': len(ordered),
+            'mean_ms': 1000 * total / max(len(ordered), 1),
+            'p50_ms': 1000 * percentile(ordered, 50),
+            'p95_ms': 1000 * percentile(ordered, 95),
+            'p99_ms': 1000 * percentile(ordered, 99),
+            'max_ms': 1000 * (ordered[-1] if ordered else 0.0),
+            'throughput_per_s': len(ordered) / total if total > 0 else 0.0}
+
+
+def peak_memory(func: Callable[..., Any], *args) -> float:
+    """
+    Function: Measures the peak memory allocated by Python during one call.
+    Parameters: func -> measured function
+                args -> arguments of the call
+    Return: The peak memory in megabytes.
+    """
+    tracemalloc.start()
+    try:
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak / 2**20
+
+
+def measure(func: Callable[..., Any], inputs: Sequence[tuple],
+            repeat: int = 1, warmup: int = 1,
+            after: Optional[Callable[[], Any]] = None) -> Stats:
+    """
+    Function: Calls func with every input and summarises the latencies.
+              The peak memory is measured in a separate call, because tracing
+              the memory slows down the calls.
+    Parameters: func -> measured function
+                inputs -> list of argument tuples
+                repeat -> number of times every input is used
+                warmup -> number of calls not measured before starting
+                after -> function called (not measured) after every call
+    Return: Latency statistics and peak memory.
+    """
+    for args in list(inputs)[:warmup]:
+        func(*args)
+        if after is not None:
+            after()
+    samples: List[float] = []
+    for r in range(repeat):
+        for args in inputs:
+            start = time.perf_counter()
+            func(*args)
+            samples.append(time.perf_counter() - start)
+            if after is not None:
+                after()
+    stats = summary(samples)
+    stats['peak_memory_mb'] = peak_memory(func, *inputs[0])
+    if after is not None:
+        after()
+    return stats
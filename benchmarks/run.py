@@ -0,0 +1,97 @@
+"""
+Runs the benchmarks on the fixed fixture and writes the results as JSON.
+Usage: python3 -m benchmarks.run [--size small|medium|large] [--out file]
+                                 [--only routing,search,...]
+"""
+
+# Library used to read the command line arguments
+import argparse
+# Library used to write the results
+import json
+# Library used to work in the fixture folder
+import os
+import sys
+import tempfile
+# Library used to know the commit and the platform of the results
+import platform
+import subprocess
+# Library used to access different data types
+from typing import Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import fixtures  # noqa: E402
+from benchmarks import bench_routing, bench_search, bench_render  # noqa
+from benchmarks import bench_metro, bench_gtfs, bench_transit  # noqa
+from benchmarks import bench_alt, bench_matrix, bench_travel_matrix  # noqa
+from benchmarks import bench_service, bench_ingest, bench_spatial  # noqa
+from benchmarks import bench_contract, bench_osm, bench_graphstore  # noqa
+from benchmarks import bench_kernels, bench_overlay  # noqa
+
+# Every suite is a module with a run(config) function
+SUITES = {'routing': bench_routing, 'search': bench_search,
+          'render': bench_render, 'metro': bench_metro, 'gtfs': bench_gtfs,
+          'transit': bench_transit, 'alt': bench_alt,
+          'matrix': bench_matrix, 'travel_matrix': bench_travel_matrix,
+          'service': bench_service, 'ingest': bench_ingest,
+          'spatial': bench_spatial, 'contract': bench_contract,
+          'osm': bench_osm, 'graphstore': bench_graphstore,
+          'kernels': bench_kernels, 'overlay': bench_overlay}
+
+
+def commit() -> str:
+    """
+    Function: Gives the current git commit of the repository.
+    Parameters: None
+    Return: The commit hash or an empty string if it is not known.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', default='small',
+                        choices=sorted(fixtures.SIZES))
+    parser.add_argument('--only', default=','.join(SUITES),
+                        help='comma separated suites to run')
+    parser.add_argument('--out', default='-', help='JSON file (- = stdout)')
+    parser.add_argument('--workdir', default=None,
+                        help='folder of the fixture (a temporary one if '
+                        'not given)')
+    parser.add_argument('--pairs', type=int, default=50,
+                        help='number of origin/destination pairs')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=fixtures.SEED)
+    config = parser.parse_args()
+
+    out = config.out
+    if out != '-':
+        out = os.path.abspath(out)
+    workdir = config.workdir or tempfile.mkdtemp(prefix='metronyam-bench-')
+    fixture = fixtures.prepare(workdir, config.size)
+    # The modules of the bot read their files from the current folder
+    os.chdir(workdir)
+
+    results: Dict[str, Dict] = {}
+    for name in config.only.split(','):
+        print('running', name, file=sys.stderr)
+        results[name] = SUITES[name].run(config)
+    report = {'commit': commit(), 'python': platform.python_version(),
+              'size': config.size, 'fixture': fixture,
+              'pairs': config.pairs, 'repeat': config.repeat,
+              'seed': config.seed, 'results': results}
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if out == '-':
+        print(text)
+    else:
+        with open(out, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,101 @@
-# Accesses functionalities dependent on the Operating System
-import os
+# Library used to measure the startup time. It starts measuring when it is
+# imported if the bot runs with --profile-startup, so it is imported first
+import profiling
+# Library used to read the command line arguments
+import sys
+# Library used to measure the time of every command
+import metrics
 # Library used to import Telegram's API
 from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
+from telegram.ext import InlineQueryHandler
+from telegram import InlineQueryResultArticle, InputTextMessageContent
 # Library used to access different data types
 from typing import Optional, Union, TextIO, List, Tuple, Dict
-# Imports the city functions
-import city
-# Imports the metro functions
-import metro
-# Imports the restaurants functions
-import restaurants
-# Library used for the split in the find function
-import re
+# Imports the restaurants and their identifiers
+import records
+# Library used to keep the state of every user
+import sessions
+# Library used to send the images of the paths from memory
+import io
+# Library used to skip the lock of the graph when it is not loaded here
+import contextlib
+
+# With --profile-startup the bot only loads its data, prints how long every
+# import and loading phase took and exits
+PROFILE_STARTUP = '--profile-startup' in sys.argv
+# Restaurants listed by /find
+SHOWN: int = 12
+
+
+def option(flag: str) -> Optional[str]:
+    """
+    Function: Gives the value that follows a flag in the command line.
+    Parameters: flag -> the flag, for example --metrics-port
+    Return: The value of the flag or None if the flag is not used.
+    """
+    if flag in sys.argv:
+        position = sys.argv.index(flag) + 1
+        if position < len(sys.argv):
+            return sys.argv[position]
+    return None
 
 
 # Done once when starting the program:
-# Downloads bcn graph
-bcn_graph = city.load_osmnx_graph('graf.dat')
-# Downloads metro graph
-metro_graph = metro.get_metro_graph()
-# Creates a graph with bcn graph and metro graph.
-GRAPH = city.build_city_graph(bcn_graph, metro_graph)
-# Downloads the restaurant's list
-restaurant_list = restaurants.read()
+# With --routing-service the graphs and the restaurant list are kept by a
+# routing service (see service.py) shared by several bots, and only its
+# client is imported (see client.py), otherwise they are loaded here
+# (python3 bot.py --routing-service 127.0.0.1:8765)
+if option('--routing-service') is not None:
+    # Imports the client of the routing service
+    import client
+    ROUTER = client.Client(option('--routing-service'))
+    GRAPH = None
+    # The graph is updated by the service, nothing is shared here
+    LOCK = contextlib.nullcontext()
+    feed_reports = []
+else:
+    # Imports the restaurants functions
+    import restaurants
+    # Imports the lock shared with the updates of the graph
+    import updates
+    # Imports the routing and search core
+    import service
+    # Library used to choose the backend of the search kernels
+    import kernels
+    # With --kernels python|numba the search kernels of that backend are
+    # used (see kernels.py), otherwise Numba if it is installed
+    if option('--kernels') is not None:
+        kernels.select(option('--kernels'))
+    ROUTER, feed_reports = service.load()
+    GRAPH = ROUTER.g
+    LOCK = updates.lock
+    for report in feed_reports:
+        metrics.set_gauge('gtfs_build_seconds', report.seconds,
+                          help='Build time of every GTFS feed.',
+                          feed=report.name)
+    # Downloads the restaurant's list and snaps all the restaurants, again
+    # every time the list is reloaded
+    with profiling.phase('restaurant load'):
+        restaurants.snapshot()
+    with profiling.phase('restaurant snap'):
+        restaurants.on_reload(ROUTER.snap_restaurants)
+        ROUTER.snap_restaurants(restaurants.snapshot())
+
+if PROFILE_STARTUP:
+    profiling.stop()
+    # An optional budget in seconds can follow the flag (not another flag)
+    budget = 0.0
+    try:
+        budget = float(option('--profile-startup') or '')
+    except ValueError:
+        pass
+    print(profiling.report(budget))
+    for report in feed_reports:
+        print("GTFS {}: {} stops, {} trips, {} segments in {:.3f} s".format(
+            report.name, report.stops, report.trips, report.segments,
+            report.seconds))
+    # Exits with an error code if the startup is over the budget
+    sys.exit(int(budget > 0 and profiling.total() > budget))
 
 
 ##################
@@ -38,12 +111,7 @@ def start(update, context):
                 more details of the user information and perform
                 actions with the bot
     Return: A message greeting the user.
-            A message on the terminal indicating who have started using
-            MetroNyam.
     """
-    # Prints a message on the terminal
-    print(update.effective_chat.first_name + " is using MetroNyam🚇🍕.")
-
     context.user_data['received_loc'] = False
     context.user_data['done_find'] = False
 
@@ -67,12 +135,7 @@ def help(update, context):
                 more details of the user information and perform
                 actions with the bot
     Return: A message with the possible commands and their definitions.
-            A message on the terminal indicating that help have been
-            requested.
     """
-    # Prints a message on the terminal
-    print(update.effective_chat.first_name + " is asking for help.")
-
     # Sends a message with all the commands and their functionality
     message = "This are my functions: \n\n•/start: starts the "
     message += "conversation. \n•/help: offers help on available orders."
@@ -83,8 +146,19 @@ def help(update, context):
     message += "of your chosen restaurant. \nExample of usage: /info 3. \n•"
     message += "/guide <number>: shows a map of the shortest path from your "
     message += "current location to the chosen restaurant. \nExample of usage:"
-    message += " /guide 3. \n•/time <number>: returns the average time to get"
+    message += " /guide 3. \nAdd a mode for other routes: accessible (only "
+    message += "step-free accesses), transfers (fewest transfers) or walking "
+    message += "(least walking). \nExample of usage: /guide 3 accessible. "
+    message += "\n•/routes <number>: shows up to 3 different routes to the "
+    message += "chosen restaurant. \nExample of usage: /routes 3."
+    message += "\n•/time <number> [mode]: returns the average time to get"
     message += "to the chosen restaurant. \nExample of usage: /time 3."
+    message += "\n•/near [meters] [query]: looks for the nearest restaurants "
+    message += "to your location, within a distance and matching a query if "
+    message += "they are given. \nExample of usage: /near 800 sushi."
+    message += "\n•@<bot name> <text>: in any chat, completes the name or "
+    message += "type of a restaurant while you type it (even with a typo) "
+    message += "and searches the chosen one."
     context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=message
@@ -99,11 +173,7 @@ def author(update, context):
                 more details of the user information and perform
                 actions with the bot
     Return: A message with the name of the authors.
-            A message on the terminal indicating authors have been asked.
     """
-    # Prints a message on the terminal
-    print(update.effective_chat.first_name + " is asking for the authors.")
-
     # Sends a message with the authors
     context.bot.send_message(
         chat_id=update.effective_chat.id,
@@ -120,10 +190,7 @@ def location(update, context):
                 actions with the bot
     Return: A message thanking for the location and indicating what
             commands can be executed next.
-            A message on the terminal indicating a location has been sent.
     """
-    # Prints a message on the terminal
-    print(update.effective_chat.first_name + " is sending a location.")
     # Takes the location coordinates
     get_loc = update.message.location
     lat, lon = get_loc.latitude, get_loc.longitude
@@ -154,9 +221,6 @@ def find(update, context):
             Returns error message if there is no query entered or if
             there are no restaurants that fullfil the request.
     """
-    # Prints a message on the terminal
-    print(update.effective_chat.first_name +
-          " is trying to find a restaurant.")
     # Sends an error message if a query is not entered
     if len(context.args) == 0:
         error_message1 = "💣 Please execute the /find function with "
@@ -165,29 +229,12 @@ def find(update, context):
             chat_id=update.effective_chat.id,
             text=error_message1
         )
+        return
     else:
-        query: str = context.args
-        # Treats each different search as a particular case
-        # Case1: multiple word search
-        if len(query) != 1:
-            sel_list = restaurants.create_multiple(query)
-        else:
-            # Splits the string by every non-word character found
-            pattern = r'\W+'
-            splited = re.split(pattern, query[0])
-            word1 = splited[0]
+        # Gets the twelve firsts restaurants from the resultant list (the
+        # search counts all the candidates)
+        sel_list = ROUTER.find(context.args, SHOWN)
 
-            # Case2: logic search
-            if word1 == 'and' or word1 == 'or' or word1 == 'not':
-                sel_list = restaurants.logic_search(splited, word1)
-
-            # Case3: diffuse search
-            else:
-                sel_list = restaurants.find_rest(query[0],
-                                                 restaurant_list)
-
-    # Gets the twelve firsts restaurants from the resultant list
-    sel_list = sel_list[:12]
     length = len(sel_list)
     context.user_data['done_find'] = True
     context.user_data['selection_list'] = sel_list
@@ -202,7 +249,7 @@ def find(update, context):
     else:
         message = "This are the restaurants that fulfil your request: \n \n"
         for i in range(1, length+1):
-            message += str(i) + ". " + str(sel_list[i-1].name) + "\n"
+            message += str(i) + ". " + name(sel_list[i-1]) + "\n"
 
     context.bot.send_message(
         chat_id=update.effective_chat.id,
@@ -223,8 +270,6 @@ def info(update, context):
             restaurant's number does not belong to the list provided
             or if the information entered is not a number.
     """
-    # Prints a message on the terminal
-    print(update.effective_chat.first_name + " is asking for info.")
     # Detects the possible errors that can occur and sends an error
     # message
     error = errors(update, context, 'info')
@@ -242,7 +287,7 @@ def info(update, context):
         message += str(sel_list[int(number)-1].neighbourhood)
         message += "\nDistrict: " + str(sel_list[int(number)-1].district)
         # Detects if the restaurant has no phone number
-        if sel_list[int(number)-1].telf == 'nan':
+        if sel_list[int(number)-1].telf == '':
             message += "\nTel. number: does not have a number"
         elif sel_list[int(number)-1].telf == '-':
             message += "\nTel. number: does not have a number"
@@ -271,9 +316,6 @@ def guide(update, context):
             if the information entered is not a number or if the
             location has not been sent yet.
     """
-    # Prints a message on the terminal
-    print(update.effective_chat.first_name +
-          " needs a path to get to the restaurant.")
     # Detects the possible errors that can occur and sends an error
     # message
     error = errors(update, context, 'guide')
@@ -300,16 +342,16 @@ def guide(update, context):
             text=message
             )
         # Plots the path in the screen
-        # Defines an interactive name to avoid problems when the bot is
-        # executedbsimultaneously by more than one user
-        name = str(update.effective_chat.first_name) + ".png"
-        city.plot_path(context.user_data['path'], GRAPH,  name)
-        context.bot.send_photo(
-            chat_id=update.effective_chat.id,
-            photo=open(name, 'rb')
-            )
-        city.delete_additional_nodes(GRAPH)
-        os.remove(name)
+        loc = context.user_data['location']
+        destiny = (float(sel_list[int(number)-1].y_coord),
+                   float(sel_list[int(number)-1].x_coord))
+        with metrics.phase('render'):
+            image = ROUTER.render(context.user_data['path'], loc, destiny)
+        with metrics.phase('upload'):
+            context.bot.send_photo(
+                chat_id=update.effective_chat.id,
+                photo=io.BytesIO(image)
+                )
 
 
 def time(update, context) -> None:
@@ -338,14 +380,118 @@ def time(update, context) -> None:
         loc = context.user_data['location']
         destiny = (float(sel_list[int(number)-1].y_coord),
                    float(sel_list[int(number)-1].x_coord))
-        # Finds the shortest path
-        context.user_data['path'] = city.find_path(bcn_graph, GRAPH,
-                                                   loc, destiny)
-        # Calculates the travel time of the shortests path
-        time = city.time(GRAPH, context.user_data['path'])
+        # The route mode can follow the number of the restaurant
+        mode = context.args[1] if len(context.args) > 1 else 'fastest'
+        # Finds the shortest path, or the best path of the chosen mode, and
+        # its travel time (the earliest arrival leaving now if there are
+        # timetables)
+        context.user_data['path'], time = ROUTER.travel(loc, destiny, mode)
         print_time(update, context, time)
 
 
+def routes(update, context) -> None:
+    """
+    Function: Shows different routes from the users location to the chosen
+              restaurant, with their travel time and the transports used.
+    Parameters: update and context -> objects that allow us to have
+                more details of the user information and perform
+                actions with the bot
+    Return: A message with up to 3 routes.
+            An error message if there if no information entered, if
+            the function is executed before /find, if the
+            restaurant's number does not belong to the list provided,
+            if the information entered is not a number or if the
+            location has not been sent yet.
+    """
+    error = errors(update, context, 'routes')
+    if not error:
+        number: int = context.args[0]
+        sel_list = context.user_data['selection_list']
+        loc = context.user_data['location']
+        destiny = (float(sel_list[int(number)-1].y_coord),
+                   float(sel_list[int(number)-1].x_coord))
+        found = ROUTER.routes(loc, destiny)
+        message = "These are the routes to " + sel_list[int(number)-1].name
+        message += ":\n"
+        for i, (seconds, types) in enumerate(found):
+            # Transports used by the route, walking if there are none
+            message += "\n" + str(i + 1) + ". " + str(round(seconds / 60))
+            message += " min: " + (" + ".join(types) or "walking")
+        context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=message
+            )
+
+
+def near(update, context) -> None:
+    """
+    Function: Looks for the nearest restaurants to the user's location,
+              optionally within a distance and matching some words, and
+              keeps them as the list used by /info, /guide, /time and
+              /routes.
+    Parameters: update and context -> objects that allow us to have
+                more details of the user information and perform
+                actions with the bot
+    Return: A message with the list of the restaurants and their distances,
+            12 at most.
+            Returns error message if the location has not been sent yet or
+            if there are no restaurants near.
+    """
+    if not context.user_data['received_loc']:
+        message = "💣 Please send your location and execute the /near "
+        message += "function after."
+        context.bot.send_message(chat_id=update.effective_chat.id,
+                                 text=message)
+        return
+    args = list(context.args)
+    # The first argument is the distance if it is a number
+    meters = None
+    if len(args) > 0 and args[0].isdigit():
+        meters = float(args.pop(0))
+    found = ROUTER.near(context.user_data['location'], meters,
+                        ' '.join(args))
+    metrics.record('search_candidates', len(found))
+    context.user_data['done_find'] = True
+    context.user_data['selection_list'] = [r for r, d in found]
+    if len(found) == 0:
+        message = "💣 There are no restaurants near you that fullfil your "
+        message += "request. Please execute the function /near again with "
+        message += "a larger distance or another requirement.\n"
+    else:
+        message = "This are the nearest restaurants: \n \n"
+        for i, (r, distance) in enumerate(found):
+            message += str(i + 1) + ". " + name(r) + " ("
+            message += str(round(distance)) + " m)\n"
+    context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=message
+        )
+
+
+def complete(update, context) -> None:
+    """
+    Function: Answers an inline query (@bot <text>) with the restaurants
+              whose name or type starts with the text typed. Choosing one
+              sends /find with its name.
+    Parameters: update and context -> objects that allow us to have
+                more details of the user information and perform
+                actions with the bot
+    Return: None (the restaurants are the answer of the inline query).
+    """
+    found = ROUTER.complete(update.inline_query.query)
+    results = []
+    for r in found:
+        # The restaurants not loaded yet by this process are not offered
+        if r is None:
+            continue
+        results.append(InlineQueryResultArticle(
+            id=str(records.restaurant_id(r)), title=str(r.name),
+            description=str(r.restaurant_type) + ", " + str(r.neighbourhood),
+            input_message_content=InputTextMessageContent(
+                "/find " + str(r.name))))
+    update.inline_query.answer(results, cache_time=60)
+
+
 ######################
 # AUXILIAR FUNCTIONS #
 ######################
@@ -402,9 +548,28 @@ def errors(update, context, func: str) -> bool:
                     chat_id=update.effective_chat.id,
                     text=error_message3
                 )
+            # Error if the restaurant was removed by a reload of the list
+            elif sel_list[int(number)-1] is None:
+                error_message6 = "💣 The restaurant " + str(number) + " is "
+                error_message6 += "no longer available."
+                error = True
+                context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text=error_message6
+                )
+            # Error if the route mode is not known
+            elif len(context.args) > 1 and \
+                    context.args[1] not in ROUTER.modes():
+                error_message5 = "💣 The route mode can be "
+                error_message5 += ", ".join(ROUTER.modes()) + "."
+                error = True
+                context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text=error_message5
+                )
             # Error if the location has not been sent yet, only for guide and
             # time functions (not info)
-            elif func == 'guide' or func == 'time':
+            elif func in ('guide', 'time', 'routes'):
                 if not context.user_data['received_loc']:
                     error_message4 = "💣 We have not received your location yet"
                     error_message4 += ".\nPlease send your location to start "
@@ -417,6 +582,17 @@ def errors(update, context, func: str) -> bool:
     return error
 
 
+def name(r: Optional[records.Restaurant]) -> str:
+    """
+    Function: Gives the name of a restaurant of the list shown to the user.
+    Parameters: r -> the restaurant (None if it was removed by a reload)
+    Return: The name.
+    """
+    if r is None:
+        return "(no longer available)"
+    return str(r.name)
+
+
 def print_time(update, context, time: float) -> None:
     """
     Function: Converts the provided time (sec) into hours, minutes
@@ -458,6 +634,77 @@ def print_time(update, context, time: float) -> None:
         )
 
 
+def measured(command: str, func):
+    """
+    Function: Wraps a command function so that its time, split in phases,
+              is measured every time it runs.
+    Parameters: command -> name of the command
+                func -> function of the command
+    Return: The wrapped function.
+    """
+    def handler(update, context):
+        with metrics.request(command):
+            return func(update, context)
+    return handler
+
+
+def locked(func):
+    """
+    Function: Wraps a command function that uses the city graph so that the
+              graph is not updated while it runs (the commands add and
+              remove the src and dst nodes too). With a routing service the
+              graph is not here and the function is not wrapped.
+    Parameters: func -> function of the command
+    Return: The wrapped function.
+    """
+    if GRAPH is None:
+        return func
+
+    def handler(update, context):
+        with LOCK:
+            return func(update, context)
+    return handler
+
+
+def stateful(func):
+    """
+    Function: Wraps a command function so that the state of the user is read
+              from the session store into context.user_data before it runs
+              and written back (compactly) after it, so that the dispatcher
+              does not keep it in memory.
+    Parameters: func -> function of the command
+    Return: The wrapped function.
+    """
+    def handler(update, context):
+        user = update.effective_user.id
+        session = SESSIONS.get(user)
+        with LOCK:
+            if session is not None:
+                context.user_data.update(
+                    sessions.unpack(session, GRAPH, ROUTER.lookup))
+            else:
+                context.user_data.update(received_loc=False,
+                                         done_find=False)
+        try:
+            return func(update, context)
+        finally:
+            with LOCK:
+                SESSIONS.put(user, sessions.pack(context.user_data, GRAPH))
+            context.user_data.clear()
+    return handler
+
+
+def evict_sessions(context) -> None:
+    """
+    Function: Removes the expired sessions (run every hour).
+    Parameters: context -> object of the job
+    Return: None.
+    """
+    SESSIONS.evict()
+    metrics.set_gauge('sessions', len(SESSIONS),
+                      help='Number of stored user sessions.')
+
+
 def warn(update, context) -> None:
     """
     Function: Detects if the input is not a defined command of the bot.
@@ -482,6 +729,26 @@ def warn(update, context) -> None:
 # Declares a constant with the access token that reads from token.txt
 TOKEN = open('token.txt').read().strip()
 
+# Serves the metrics as Prometheus text (python3 bot.py --metrics-port 9100)
+# and writes a JSON line for every command (python3 bot.py --json-log)
+if option('--metrics-port') is not None:
+    metrics.serve(int(option('--metrics-port')))
+if '--json-log' in sys.argv:
+    metrics.enable_json_log(sys.stdout)
+
+# Keeps the state of the users in a SQLite file that survives restarts
+# (python3 bot.py --sessions sessions.db) or in memory
+if option('--sessions') is not None:
+    SESSIONS = sessions.SQLiteStore(option('--sessions'))
+else:
+    SESSIONS = sessions.MemoryStore()
+
+# Reads the restaurant list again when restaurants.csv changes and follows
+# the closures of updates.json (the routing service does it itself)
+if GRAPH is not None:
+    restaurants.Reloader('restaurants.csv').start()
+    updates.Watcher(GRAPH).start()
+
 # Creates objects to work with Telegram
 updater = Updater(token=TOKEN, use_context=True)
 dispatcher = updater.dispatcher
@@ -489,14 +756,31 @@ dispatcher = updater.dispatcher
 # Exectutes the warning function to detect possible input errors
 dispatcher.add_handler(MessageHandler(Filters.text & (~Filters.command), warn))
 # Indicates when the bot receives a command and exectutes its function
-dispatcher.add_handler(CommandHandler('start', start))
-dispatcher.add_handler(CommandHandler('help', help))
-dispatcher.add_handler(CommandHandler('author', author))
-dispatcher.add_handler(MessageHandler(Filters.location, location))
-dispatcher.add_handler(CommandHandler('find', find))
-dispatcher.add_handler(CommandHandler('info', info))
-dispatcher.add_handler(CommandHandler('guide', guide))
-dispatcher.add_handler(CommandHandler('time', time))
+dispatcher.add_handler(CommandHandler('start',
+                                      measured('start', stateful(start))))
+dispatcher.add_handler(CommandHandler('help', measured('help', help)))
+dispatcher.add_handler(CommandHandler('author', measured('author', author)))
+dispatcher.add_handler(MessageHandler(Filters.location,
+                                      measured('location',
+                                               stateful(location))))
+dispatcher.add_handler(CommandHandler('find',
+                                      measured('find', stateful(find))))
+dispatcher.add_handler(CommandHandler('near',
+                                      measured('near', stateful(near))))
+dispatcher.add_handler(CommandHandler('info',
+                                      measured('info', stateful(info))))
+dispatcher.add_handler(CommandHandler('guide',
+                                      measured('guide',
+                                               stateful(locked(guide)))))
+dispatcher.add_handler(CommandHandler('time',
+                                      measured('time',
+                                               stateful(locked(time)))))
+dispatcher.add_handler(CommandHandler('routes',
+                                      measured('routes',
+                                               stateful(locked(routes)))))
+# Completes the restaurants typed in inline queries (@bot <text>)
+dispatcher.add_handler(InlineQueryHandler(measured('complete', complete)))
+updater.job_queue.run_repeating(evict_sessions, interval=3600, first=3600)
 
 # Starts the bot
 updater.start_polling()
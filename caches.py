@@ -0,0 +1,40 @@
+"""
+This module keeps the structures built for the last lists of restaurants
+used (the ranking index, the completer and the spatial index), so that they
+are built once for every list: the first time it is used or when it is
+reloaded.
+"""
+
+# Library used to access different data types
+from typing import Callable, Dict, Generic, Sequence, Tuple, TypeVar
+
+# Structure built for a list
+T = TypeVar('T')
+
+
+class ListCache(Generic[T]):
+    """
+    Class: Contains the structures of the last lists used, by identifier of
+           the list, with the lists so that their identifiers are not reused.
+    """
+
+    def __init__(self, build: Callable[[Sequence], T], size: int) -> None:
+        self.build = build
+        self.size = size
+        self.cached: Dict[int, Tuple[Sequence, int, T]] = {}
+
+    def get(self, restaurants: Sequence) -> T:
+        """
+        Function: Gives the structure of a list, built the first time the
+                  list is used (or again if its length changed). The oldest
+                  structure is dropped when there are too many.
+        Parameters: restaurants -> the list
+        Return: The structure.
+        """
+        cached = self.cached.get(id(restaurants))
+        if cached is None or cached[1] != len(restaurants):
+            if len(self.cached) >= self.size:
+                del self.cached[next(iter(self.cached))]
+            cached = (restaurants, len(restaurants), self.build(restaurants))
+            self.cached[id(restaurants)] = cached
+        return cached[2]
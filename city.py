@@ -9,32 +9,36 @@ This graph will contain all the necessary information to know the fastest path
 to get from one point of the city of Barcelona to another on foot or by metro.
 """
 
+# Postpones the evaluation of annotations, so that the plotting classes
+# used in them do not have to be imported at startup
+from __future__ import annotations
 # Library used to initialize classes
 from dataclasses import dataclass
 # Library used to access different data types
-from typing import Optional, Union, TextIO, List, Tuple, Dict
+from typing import Optional, Union, TextIO, List, Tuple, Dict, TYPE_CHECKING
 # Library used to generate undirected graphs of networkx
 from typing_extensions import TypeAlias
 # Library used to manipulate graphs
 import networkx as nx
-# Library used to get the graph of the streets of Barcelona
-import osmnx as ox
 # Library used to get the metro graph
-from metro import *
-# Library used to read csv docs
-import pandas as pd
-# Library used to draw a graph interactively
-import matplotlib.pyplot as plt
-# Library used to draw a graph on a picture
-from staticmap import StaticMap, Line, CircleMarker
-# Library used to draw a graph interactively
-import matplotlib.pyplot as plt
+from metro import MetroGraph
 # Library used to pickle and unpickle graphs in order to save them
 import pickle
+# Library used to save the street graph as columns of arrays
+import graphstore
 # Library used to access, read or write files
 import os.path
 # Library used to calculate distances between two points
 import haversine as hs
+# Library used to measure the phases of the bot commands
+import metrics
+
+# osmnx (used to get the graph of the streets of Barcelona and to find the
+# nearest nodes), matplotlib and staticmap (used to draw graphs) are slow to
+# import, so they are imported inside the functions that need them
+if TYPE_CHECKING:
+    from staticmap import StaticMap
+    from alt import Landmarks
 
 CityGraph: TypeAlias = nx.Graph  # Undirected graph from networkx
 
@@ -47,16 +51,36 @@ NodeID: TypeAlias = Union[int, str]  # COMENTAR
 Path: TypeAlias = List[NodeID]
 
 
+# Average speed (m/s) of the public transport modes of the GTFS feeds
+SPEEDS: Dict[str, float] = {"Subway": 7.2, "Rail": 11.0, "Tram": 5.0,
+                            "Bus": 4.2, "Funicular": 2.5, "Ferry": 4.0}
+
+# Local OpenStreetMap extracts of Barcelona, used (the first one found)
+# instead of downloading the streets (see the osm module)
+OSM_FILES: Tuple[str, ...] = ('barcelona.osm.pbf', 'barcelona.osm',
+                              'barcelona.osm.bz2', 'barcelona.osm.gz')
+
+
 @dataclass
 class Edge:
     """
     Class: Contains the attributes of an edge.
     """
-    type: str  # Railway, link, street
+    type: str  # Railway, link, street (or a GTFS mode: Bus, Tram...)
     colour: str
     distance: str
 
 
+@dataclass
+class Route:
+    """
+    Class: Contains an alternative route between two points.
+    """
+    path: Path
+    time: float     # Travel time in seconds
+    overlap: float  # Part of its time shared with the better routes
+
+
 def get_speed(type: str) -> float:
     """
     Function: Assigns a speed for every type of edge.
@@ -67,30 +91,45 @@ def get_speed(type: str) -> float:
         return 7.2
     if type == "Link":
         return 0.8
+    # Public transport modes read from GTFS feeds (see the gtfs module).
+    # As for the metro, the speeds are averages that include the stops
+    if type in SPEEDS:
+        return SPEEDS[type]
     return 1.4
 
 
 def get_osmnx_graph() -> OsmnxGraph:
     """
-    Function: Gets a graph with all Barcelona's streets, provided by the osmnx
-              module.
+    Function: Gets a graph with all Barcelona's streets, built from a local
+              OpenStreetMap extract if there is one, or provided by the
+              osmnx module.
     Parameters: None
     Return: Barcelona's streets graph with all its information.
     """
+    for filename in OSM_FILES:
+        if os.path.exists(filename):
+            import osm
+            return osm.build_graph(filename, 'graf.npz')
+    import osmnx as ox
     g = ox.graph_from_place('Barcelona, Spain', network_type='walk',
                             simplify=True)
     # Calls function defined below
-    save_osmnx_graph(g, 'graf.dat')
+    save_osmnx_graph(g, 'graf.npz')
     return g
 
 
 def save_osmnx_graph(g: OsmnxGraph, filename: str) -> None:
     """
-    Function: Saves the street graph into a given file.
+    Function: Saves the street graph into a given file, as columns of
+              arrays if it is an .npz file (see the graphstore module) or
+              pickled otherwise.
     Parameters: g -> Barcelona's streets graph
                 filename -> file containing the final graph
     Return: None.
     """
+    if filename.endswith('.npz'):
+        graphstore.save(g, filename)
+        return
     # Goes through all OsmnxGraph edges
     for u, v, key, geom in g.edges(data="geometry", keys=True):
         if geom is not None:
@@ -103,12 +142,20 @@ def save_osmnx_graph(g: OsmnxGraph, filename: str) -> None:
 
 def load_osmnx_graph(filename: str) -> OsmnxGraph:
     """
-    Function: Downloads the street graph from a given file.
+    Function: Downloads the street graph from a given file. An .npz file
+              that does not exist is converted from the pickle file with
+              the same name (graf.dat for graf.npz), if there is one.
     Parameters: g -> Barcelona's streets graph
                 filename -> file containing the final graph
     Returns: The downloaded OsmnxGraph.
     """
-    if os.path.exists(filename):
+    if filename.endswith('.npz'):
+        pickled = os.path.splitext(filename)[0] + '.dat'
+        if not os.path.exists(filename) and os.path.exists(pickled):
+            graphstore.convert(pickled, filename)
+        if os.path.exists(filename):
+            return graphstore.load(filename)
+    elif os.path.exists(filename):
         # Reads an unpickled graph stored in pickle_file
         pickle_file = open(filename, 'rb')
         result = pickle.load(pickle_file)
@@ -154,6 +201,7 @@ def link(city: CityGraph, street: OsmnxGraph, metro: MetroGraph) -> None:
                 metro ->  Metro graph
     Return: None.
     """
+    import osmnx as ox
     x_coords: List = []
     y_coords: List = []
 
@@ -206,6 +254,9 @@ def build_metro_graph(gm: MetroGraph, gc: CityGraph) -> None:
     for node in gm.nodes:
         gc.add_node(node, type=gm.nodes[node]["type"],
                     location=gm.nodes[node]["location"])
+        # Accesses keep if they are step-free, used by the accessible routes
+        if "accessible" in gm.nodes[node]:
+            gc.nodes[node]["accessible"] = gm.nodes[node]["accessible"]
     for edge in gm.edges:
         # Calculates distance (meters) using haversine function
         dist = hs.haversine(gm.nodes[edge[0]]["location"],
@@ -242,6 +293,7 @@ def show_graph(g: CityGraph) -> None:
     Parameters: g -> City graph (merge of street and metro graphs)
     Return: None.
     """
+    import matplotlib.pyplot as plt
     coords = nx.get_node_attributes(g, 'location')
     nx.draw(g, coords, node_size=10)
     plt.show()
@@ -254,6 +306,7 @@ def plot_graph(g: CityGraph, filename: str) -> StaticMap:
                 filename -> file containing the final image
     Return: An image file of a graphic representation of a graph in a map.
     """
+    from staticmap import StaticMap
     # Gets StaticMap image
     m = StaticMap(2500, 3000, 80)
     # Calls functions defined below
@@ -270,6 +323,7 @@ def print_lines_graph(m: StaticMap, g: CityGraph) -> StaticMap:
                 g -> City graph (fusion of street and metro graphs)
     Return: An image file of a graphic representation of a graph in a map.
     """
+    from staticmap import Line
     for edge in g.edges:
         # Given an edge, line get's the location of their 2 nodes, the colour
         # of that edge, i el gruix amb el qual imprimirem l'aresta.
@@ -287,6 +341,7 @@ def print_circles_graph(m: StaticMap, g: CityGraph) -> StaticMap:
                 g -> City graph (fusion of street and metro graphs)
     Return: An image file of a graphic representation of a graph in a map.
     """
+    from staticmap import CircleMarker
     for node in g.nodes:
         tipus = g.nodes[node]["type"]
         if tipus == "access":
@@ -303,20 +358,118 @@ def print_circles_graph(m: StaticMap, g: CityGraph) -> StaticMap:
     return m
 
 
-def find_path(ox_g: OsmnxGraph, g: CityGraph, src: Coord, dst: Coord) -> Path:
+# Nearest street node of the already snapped coordinates. The bot snaps the
+# same locations and restaurants many times and every osmnx search has to
+# build a spatial index of the whole street graph
+_snap_cache: Dict[Tuple[int, float, float], Tuple[NodeID, float]] = {}
+SNAP_CACHE_SIZE: int = 10000
+# Nearest street node of all the restaurants, built when the restaurant list
+# is read and replaced at once (without a size limit)
+_snap_table: Dict[Tuple[int, float, float], Tuple[NodeID, float]] = {}
+
+
+def snap(ox_g: OsmnxGraph, coords: List[Coord]) -> Tuple[List, List]:
     """
-    Function: Finds the shortest path from source to destiny.
+    Function: Finds the nearest street node of every coordinate, using a
+              cache of the coordinates already snapped.
+    Parameters: ox_g -> Barcelona's streets graph
+                coords -> List of (longitude, latitude) coordinates
+    Return: The list of nearest nodes and the list of their distances.
+    """
+    keys = [(id(ox_g), float(c[0]), float(c[1])) for c in coords]
+    table = _snap_table
+    # The hits are kept before the cache can be cleared below
+    found: Dict[Tuple[int, float, float], Tuple[NodeID, float]] = {}
+    missing = []
+    for k in dict.fromkeys(keys):
+        hit = table.get(k) or _snap_cache.get(k)
+        if hit is None:
+            missing.append(k)
+        else:
+            found[k] = hit
+    metrics.cache_hit('snap', len(keys) - len(missing))
+    if len(missing) > 0:
+        import osmnx as ox
+        metrics.cache_miss('snap', len(missing))
+        nodes, dist = ox.distance.nearest_nodes(ox_g, [k[1] for k in missing],
+                                                [k[2] for k in missing],
+                                                return_dist=True)
+        if len(_snap_cache) + len(missing) > SNAP_CACHE_SIZE:
+            _snap_cache.clear()
+        for i in range(len(missing)):
+            found[missing[i]] = (nodes[i], dist[i])
+            _snap_cache[missing[i]] = found[missing[i]]
+    return [found[k][0] for k in keys], [found[k][1] for k in keys]
+
+
+def set_snap_table(ox_g: OsmnxGraph, coords: List[Coord]) -> None:
+    """
+    Function: Snaps many coordinates at once (the restaurants) into a table
+              that replaces the previous one, so that they are not snapped
+              again while answering the commands.
+    Parameters: ox_g -> Barcelona's streets graph
+                coords -> List of (longitude, latitude) coordinates
+    Return: None.
+    """
+    global _snap_table
+    keys = list(dict.fromkeys((id(ox_g), float(c[0]), float(c[1]))
+                              for c in coords))
+    table: Dict[Tuple[int, float, float], Tuple[NodeID, float]] = {}
+    if len(keys) > 0:
+        import osmnx as ox
+        nodes, dist = ox.distance.nearest_nodes(ox_g, [k[1] for k in keys],
+                                                [k[2] for k in keys],
+                                                return_dist=True)
+        table = dict(zip(keys, zip(nodes, dist)))
+    _snap_table = table
+
+
+def patch_snap_cache(ox_g: OsmnxGraph, removed: List[NodeID],
+                     added: List[NodeID]) -> None:
+    """
+    Function: Updates the snapped coordinates of a street graph after some of
+              its nodes were removed or added, instead of emptying the cache.
+    Parameters: ox_g -> Barcelona's streets graph (already updated)
+                removed -> nodes removed from the graph
+                added -> nodes added to the graph
+    Return: None.
+    """
+    gone = set(removed)
+    new = [(n, (ox_g.nodes[n]["y"], ox_g.nodes[n]["x"])) for n in added]
+    for cache in (_snap_cache, _snap_table):
+        for key in list(cache):
+            if key[0] != id(ox_g):
+                continue
+            node, dist = cache[key]
+            if node in gone:
+                del cache[key]
+                continue
+            for n, location in new:
+                d = hs.haversine((key[2], key[1]), location, unit="m")
+                if d < dist:
+                    node, dist = n, d
+            cache[key] = (node, dist)
+
+
+def add_additional_nodes(ox_g: OsmnxGraph, g: CityGraph, src: Coord,
+                         dst: Coord) -> List[NodeID]:
+    """
+    Function: Adds the source and destiny nodes to the CityGraph, joined to
+              their nearest street nodes.
     Parameters: ox_g -> Barcelona's streets graph
                 g -> City graph (merge of street and metro graphs)
                 src -> Coordinate of the starting point
                 dst -> Coordinate of the final point
-    Return: Returns a Path.
+    Return: The nearest street nodes of the source and the destiny.
     """
     # For source and destiny nodes, saves their nearest node and their distance
     # into two different lists
-    nearest_nodes, dist = ox.distance.nearest_nodes(ox_g, [src[0], dst[0]],
-                                                    [src[1], dst[1]],
-                                                    return_dist=True)
+    with metrics.phase('snapping'):
+        nearest_nodes, dist = snap(ox_g, [src, dst])
+    # Removes the source and destiny nodes of a previous search, otherwise
+    # their old edges would still be used
+    if 'src' in g or 'dst' in g:
+        delete_additional_nodes(g)
     # Connects the source and destiny nodes to the CityGraph
     g.add_node('src', location=src)
     edge1 = Edge("Street", "#000000", dist[0])
@@ -325,9 +478,127 @@ def find_path(ox_g: OsmnxGraph, g: CityGraph, src: Coord, dst: Coord) -> Path:
     g.add_node('dst', location=dst)
     edge2 = Edge("Street", "#000000", dist[1])
     g.add_edge('dst', nearest_nodes[1], attributes=edge2,
-               time=dist[0]/get_speed("Street"))
+               time=dist[1]/get_speed("Street"))
+    return nearest_nodes
+
+
+def find_path(ox_g: OsmnxGraph, g: CityGraph, src: Coord, dst: Coord,
+              landmarks: Optional[Landmarks] = None) -> Path:
+    """
+    Function: Finds the shortest path from source to destiny.
+    Parameters: ox_g -> Barcelona's streets graph
+                g -> City graph (merge of street and metro graphs)
+                src -> Coordinate of the starting point
+                dst -> Coordinate of the final point
+                landmarks -> if given (see the alt module) and still valid
+                             for g, the search is an A* guided by them
+    Return: Returns a Path.
+    """
+    nearest_nodes = add_additional_nodes(ox_g, g, src, dst)
     # Looks for the shortest path using networkx function
-    return nx.shortest_path(g, source="src", target="dst", weight="time")
+    with metrics.phase('shortest path'):
+        if landmarks is not None and landmarks.valid(g):
+            # The bounds to dst are the bounds to its street node
+            bound = landmarks.heuristic(nearest_nodes[1])
+            return nx.astar_path(g, "src", "dst", heuristic=bound,
+                                 weight="time")
+        return nx.shortest_path(g, source="src", target="dst", weight="time")
+
+
+# Alternative routes slower than the fastest one by this factor are ignored
+MAX_STRETCH: float = 1.4
+# Alternative routes sharing more than this part of their time with a better
+# route are ignored
+MAX_OVERLAP: float = 0.6
+# Alternative routes must have a plateau (a part that is the shortest path
+# from both ends) of at least this part of their time
+MIN_PLATEAU: float = 0.2
+
+
+def tree_path(pred: Dict, node: NodeID) -> Path:
+    """
+    Function: Rebuilds a path from the predecessors of a Dijkstra search.
+    Parameters: pred -> predecessors of every node (networkx format)
+                node -> last node of the path
+    Return: The path from the root of the search to node.
+    """
+    path = [node]
+    while len(pred[path[-1]]) > 0:
+        path.append(pred[path[-1]][0])
+    return path[::-1]
+
+
+def shared_time(g: CityGraph, path: Path, other: Path) -> float:
+    """
+    Function: Calculates the time of the edges of a path that are in another.
+    Parameters: g -> City graph
+                path, other -> the paths
+    Return: The shared time in seconds.
+    """
+    edges = set()
+    for i in range(1, len(other)):
+        edges.add((other[i-1], other[i]))
+        edges.add((other[i], other[i-1]))
+    return sum(g.edges[path[i-1], path[i]]["time"]
+               for i in range(1, len(path)) if (path[i-1], path[i]) in edges)
+
+
+def find_routes(ox_g: OsmnxGraph, g: CityGraph, src: Coord, dst: Coord,
+                k: int = 3) -> List[Route]:
+    """
+    Function: Finds up to k meaningfully different routes with the plateau
+              method: with one search from the source and one from the
+              destiny, the chains of edges that are in both shortest path
+              trees (plateaus) give routes that are locally optimal. The
+              plateaus are tried from the fastest route and the routes that
+              are too slow or share too much with a better one are skipped.
+    Parameters: ox_g -> Barcelona's streets graph
+                g -> City graph (merge of street and metro graphs)
+                src -> Coordinate of the starting point
+                dst -> Coordinate of the final point
+                k -> maximum number of routes
+    Return: The routes, from the fastest one.
+    """
+    add_additional_nodes(ox_g, g, src, dst)
+    with metrics.phase('shortest path'):
+        pred_f, dist_f = nx.dijkstra_predecessor_and_distance(g, "src",
+                                                              weight="time")
+        if "dst" not in dist_f:
+            raise nx.NetworkXNoPath("No path to the destination")
+        best = dist_f["dst"]
+        pred_b, dist_b = nx.dijkstra_predecessor_and_distance(
+            g, "dst", cutoff=best * MAX_STRETCH, weight="time")
+    with metrics.phase('plateaus'):
+        # Node -> next node of its plateau
+        following: Dict[NodeID, NodeID] = {}
+        for v, pred in pred_f.items():
+            if len(pred) > 0 and v in dist_b:
+                u = pred[0]
+                if u in pred_b and len(pred_b[u]) > 0 and pred_b[u][0] == v:
+                    following[u] = v
+        starts = set(following) - set(following.values())
+        plateaus = []
+        for start in starts:
+            end = start
+            while end in following:
+                end = following[end]
+            cost = dist_f[start] + dist_b[start]
+            if cost <= best * MAX_STRETCH:
+                plateaus.append((cost, dist_f[end] - dist_f[start],
+                                 str(start), start, end))
+        plateaus.sort()
+        routes: List[Route] = []
+        for cost, length, name, start, end in plateaus:
+            if len(routes) == k:
+                break
+            if length < MIN_PLATEAU * cost and len(routes) > 0:
+                continue
+            path = tree_path(pred_f, end) + tree_path(pred_b, end)[-2::-1]
+            overlap = max([shared_time(g, path, r.path) / max(cost, 1e-9)
+                           for r in routes], default=0.0)
+            if overlap <= MAX_OVERLAP:
+                routes.append(Route(path, float(cost), float(overlap)))
+    return routes
 
 
 def delete_additional_nodes(g: CityGraph) -> None:
@@ -337,8 +608,10 @@ def delete_additional_nodes(g: CityGraph) -> None:
     Parameters: g -> City graph (merge of street and metro graphs)
     Return: None.
     """
-    g.remove_node('src')
-    g.remove_node('dst')
+    if 'src' in g:
+        g.remove_node('src')
+    if 'dst' in g:
+        g.remove_node('dst')
 
 
 def plot_path(path: Path, city: CityGraph, filename: str) -> None:
@@ -349,6 +622,7 @@ def plot_path(path: Path, city: CityGraph, filename: str) -> None:
                 filename -> file containing the final image
     Return: None.
     """
+    from staticmap import StaticMap
     m = StaticMap(2500, 3000, 80)
     path_lines(m, path, city)
     path_nodes(m, path, city)
@@ -364,6 +638,7 @@ def path_nodes(m: StaticMap, path: Path, city: CityGraph) -> None:
                 city -> City graph (fusion of street and metro graphs)
     Return: None.
     """
+    from staticmap import CircleMarker
     for element in path:
         circle = CircleMarker(city.nodes[element]["location"], "#000000", 7)
         m.add_marker(circle)
@@ -377,6 +652,7 @@ def path_lines(m: StaticMap, path: Path, city: CityGraph) -> None:
                 city -> City graph (fusion of street and metro graphs)
     Return: None.
     """
+    from staticmap import Line
     for i in range(1, len(path)):
         edge_type = city.edges[path[i-1], path[i]]["attributes"].type
         if edge_type != "Street":
@@ -0,0 +1,268 @@
+"""
+This module is the client of the routing service (see service.py), used by
+the bots started with --routing-service. It does not import the routing
+modules (graphs, search kernels, timetables) nor the restaurant searches,
+and does not read the restaurant file: the restaurants found by the service
+are asked to it the first time they appear and kept in a table by
+identifier, so these bots start quickly and use little memory. The table
+keeps the restaurants used last and is emptied when the service reads the
+restaurant file again.
+"""
+
+# Library used to serialize the requests and the answers
+import json
+import base64
+# Library used to call HTTP
+import http.client
+import socket
+# Library used to keep the open connections of the client
+import queue
+# Library used to keep the restaurants used last
+from collections import OrderedDict
+import threading
+# Library used to access different data types
+from typing import Dict, List, Optional, Tuple
+# Library used to build the restaurants sent by the service
+import records
+
+# Open connections kept by every client
+CONNECTIONS: int = 8
+# Restaurants kept by every client
+TABLE: int = 4096
+
+# Types of the routing core (see city.py), which is not imported here
+Coord = Tuple[float, float]
+Path = List
+
+
+def plain(value):
+    """
+    Function: Converts the NumPy numbers of the graphs (node identifiers,
+              times) into Python numbers when writing JSON.
+    Parameters: value -> the value that JSON cannot write
+    Return: The Python number.
+    """
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError("Cannot write " + type(value).__name__ + " as JSON")
+
+
+class UnixConnection(http.client.HTTPConnection):
+    """
+    Class: Contains an HTTP connection over a Unix socket.
+    """
+
+    def __init__(self, filename: str, timeout: float) -> None:
+        super().__init__('localhost', timeout=timeout)
+        self.filename = filename
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.filename)
+
+
+class ServiceError(RuntimeError):
+    """
+    Class: Contains an error of an operation of the service.
+    """
+
+
+class Client:
+    """
+    Class: Contains the connections to a routing service and the restaurants
+           it has sent. It has the same functions as Router, so the bot can
+           use any of them.
+    """
+
+    def __init__(self, address: str, connections: int = CONNECTIONS,
+                 timeout: float = 60.0, size: int = TABLE) -> None:
+        self.address = address
+        self.timeout = timeout
+        self.pool: 'queue.LifoQueue[http.client.HTTPConnection]' = \
+            queue.LifoQueue(connections)
+        # Restaurant identifier -> restaurant (None if the service does not
+        # have it anymore), in least recently used order
+        self.table: 'OrderedDict[int, Optional[records.Restaurant]]' = \
+            OrderedDict()
+        self.size = size
+        self.table_lock = threading.Lock()
+        # Version of the restaurant list of the service in the table
+        self.version: Optional[str] = None
+        self.known_modes: Optional[List[str]] = None
+
+    def connect(self) -> http.client.HTTPConnection:
+        """
+        Function: Opens a new connection to the service.
+        Parameters: None
+        Return: The connection.
+        """
+        if self.address.startswith('unix:'):
+            return UnixConnection(self.address[len('unix:'):], self.timeout)
+        host, port = self.address.rsplit(':', 1)
+        return http.client.HTTPConnection(host, int(port),
+                                          timeout=self.timeout)
+
+    def batch(self, requests: List[Dict]) -> List[Dict]:
+        """
+        Function: Sends a batch of operations in a single request, using an
+                  open connection of the pool. A connection closed by the
+                  service is opened again once.
+        Parameters: requests -> list of operations (op and arguments)
+        Return: The result or the error of every operation.
+        """
+        body = json.dumps(requests, default=plain).encode()
+        for attempt in range(2):
+            try:
+                connection = self.pool.get_nowait()
+            except queue.Empty:
+                connection = self.connect()
+            try:
+                connection.request('POST', '/batch', body,
+                                   {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                answer = json.loads(response.read())
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                if attempt == 1:
+                    raise
+                continue
+            self.check_version(response.getheader('X-Restaurants-Version'))
+            try:
+                self.pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+            if response.status != 200:
+                raise ServiceError(answer.get('message', ''))
+            return answer
+        return []
+
+    def call(self, op: str, **args):
+        """
+        Function: Runs a single operation on the service.
+        Parameters: op -> name of the operation
+                    args -> arguments of the operation
+        Return: The result of the operation.
+        """
+        answer = self.batch([dict(args, op=op)])[0]
+        if 'error' in answer:
+            if answer['error'] == 'NetworkXNoPath':
+                # Imported only here, as the routing libraries are not
+                # imported by the frontends
+                import networkx as nx
+                raise nx.NetworkXNoPath(answer['message'])
+            raise ServiceError(answer['error'] + ': ' + answer['message'])
+        return answer['result']
+
+    def check_version(self, version: Optional[str]) -> None:
+        """
+        Function: Empties the table of restaurants when the service answers
+                  with another version of its restaurant list.
+        Parameters: version -> version sent by the service (None if it does
+                               not send it)
+        Return: None.
+        """
+        with self.table_lock:
+            if version is not None and version != self.version:
+                self.table.clear()
+                self.version = version
+
+    def lookup(self, ids: List[int]
+               ) -> List[Optional[records.Restaurant]]:
+        """
+        Function: Same as Router.lookup, asking the service only for the
+                  restaurants that are not in the table. The restaurants
+                  used least recently leave the table when it is full.
+        """
+        found: Dict[int, Optional[records.Restaurant]] = {}
+        with self.table_lock:
+            for id in dict.fromkeys(ids):
+                if id in self.table:
+                    self.table.move_to_end(id)
+                    found[id] = self.table[id]
+        missing = [id for id in dict.fromkeys(ids) if id not in found]
+        if len(missing) > 0:
+            answer = self.call('lookup', ids=missing)
+            with self.table_lock:
+                for id, fields in zip(missing, answer):
+                    found[id] = None if fields is None else \
+                        records.Restaurant(*fields)
+                    self.table[id] = found[id]
+                while len(self.table) > self.size:
+                    self.table.popitem(last=False)
+        return [found[id] for id in ids]
+
+    def modes(self) -> List[str]:
+        """
+        Function: Same as Router.modes, asked to the service once.
+        """
+        if self.known_modes is None:
+            self.known_modes = self.call('modes')
+        return self.known_modes
+
+    def find(self, query: List[str], k: Optional[int] = None
+             ) -> List[Optional[records.Restaurant]]:
+        """
+        Function: Same as Router.find, run by the service, which sends only
+                  the k first restaurants. The restaurants that the service
+                  does not have anymore are None.
+        """
+        return self.lookup(self.call('find', query=query, k=k))
+
+    def complete(self, query: str, k: Optional[int] = None
+                 ) -> List[Optional[records.Restaurant]]:
+        """
+        Function: Same as Router.complete, run by the service (with None as
+                  in find). Without k, the service gives autocomplete.K.
+        """
+        return self.lookup(self.call('complete', query=query, k=k))
+
+    def near(self, location: Coord, meters: Optional[float] = None,
+             query: str = '', k: Optional[int] = None
+             ) -> List[Tuple[Optional[records.Restaurant], float]]:
+        """
+        Function: Same as Router.near, run by the service (with None as in
+                  find). Without k, the service gives spatial.K.
+        """
+        found = self.call('near', location=location, meters=meters,
+                          query=query, k=k)
+        return list(zip(self.lookup([id for id, meters in found]),
+                        [meters for id, meters in found]))
+
+    def travel(self, src: Coord, dst: Coord,
+               mode: str = 'fastest') -> Tuple[Path, float]:
+        """
+        Function: Same as Router.travel, run by the service.
+        """
+        answer = self.call('travel', src=src, dst=dst, mode=mode)
+        return answer['path'], answer['time']
+
+    def routes(self, src: Coord, dst: Coord,
+               k: int = 3) -> List[Tuple[float, List[str]]]:
+        """
+        Function: Same as Router.routes, run by the service.
+        """
+        return [(time, types) for time, types in
+                self.call('routes', src=src, dst=dst, k=k)]
+
+    def render(self, path: Path, src: Coord, dst: Coord) -> bytes:
+        """
+        Function: Same as Router.render, run by the service.
+        """
+        return base64.b64decode(self.call('render', path=path, src=src,
+                                          dst=dst))
+
+    def update(self, state: Dict) -> bool:
+        """
+        Function: Same as Router.update, run by the service.
+        """
+        return self.call('update', state=state)
+
+    def close(self) -> None:
+        """
+        Function: Closes the open connections.
+        Parameters: None
+        Return: None.
+        """
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
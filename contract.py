@@ -0,0 +1,279 @@
+"""
+This module makes the city graph smaller for the searches. The street nodes
+with only two neighbours (the points that draw the shape of a street) are
+removed and every chain of them becomes a single edge with the time of the
+whole chain. The nodes of every chain are kept in a side list, so a path of
+the contracted graph is expanded into the path of the city graph that
+plot_path and time use. The src and dst nodes of a search are joined to
+both ends of the chain of their street node when it was removed.
+The contracted graph is also kept as arrays, searched by the kernels of
+the kernels module.
+"""
+
+# Library used to initialize classes
+from dataclasses import dataclass
+# Library used to access different data types
+from typing import Dict, List, Optional, Set, Tuple
+# Library used to manipulate graphs
+import networkx as nx
+# Library used to access the city graph functions
+import city
+# Library used to compute the landmarks of the searches
+import alt
+# Library used to measure the phases of the bot commands
+import metrics
+# Library used to search the contracted graph as arrays
+import kernels
+
+# Nodes added to the city graph by every search
+ADDITIONAL: Tuple[str, str] = ('src', 'dst')
+
+
+@dataclass
+class Contraction:
+    """
+    Class: Contains the contracted graph of a city graph, the chains of
+           removed nodes and where every removed node is.
+    """
+    core: city.CityGraph            # Kept nodes and contracted edges
+    chains: List[Tuple[city.NodeID, ...]]   # Nodes of every chain and ends
+    times: List[Tuple[float, ...]]  # Time from the first node of the chain
+    where: Dict[city.NodeID, Tuple[int, int]]   # Node -> (chain, position)
+    version: int                    # Version of the graph when contracted
+    signature: tuple                # Number of nodes and edges of the graph
+    csr: kernels.CSR                # Contracted graph as arrays
+
+    def valid(self, g: city.CityGraph) -> bool:
+        """
+        Function: Tells if the contracted graph still represents a graph.
+        Parameters: g -> City graph
+        Return: True if the graph did not change since the contraction.
+        """
+        return g.graph.get('version', 0) == self.version and \
+            alt.signature(g) == self.signature
+
+    def attach(self, g: city.CityGraph, node: str) -> None:
+        """
+        Function: Joins the src or dst node of a search to the contracted
+                  graph: to its street node, or to both ends of the chain of
+                  its street node if it was removed.
+        Parameters: g -> City graph with the node already added
+                    node -> 'src' or 'dst'
+        Return: None.
+        """
+        street = next(iter(g[node]))
+        time = g.edges[node, street]['time']
+        self.core.add_node(node)
+        if street not in self.where:
+            self.core.add_edge(node, street, time=time, via=None)
+            return
+        c, p = self.where[street]
+        chain, times = self.chains[c], self.times[c]
+        for end, last, part in ((0, 1, times[p]),
+                                (len(chain) - 1, len(chain) - 2,
+                                 times[-1] - times[p])):
+            if self.core.has_edge(node, chain[end]) and \
+                    self.core.edges[node, chain[end]]['time'] <= time + part:
+                continue
+            self.core.add_edge(node, chain[end], time=time + part,
+                               via=(c, p, last), first=node)
+
+    def join_same_chain(self, g: city.CityGraph) -> None:
+        """
+        Function: Joins the src and dst nodes directly when their street
+                  nodes are in the same chain, because the part of the chain
+                  between them is not an edge of the contracted graph.
+        Parameters: g -> City graph with the src and dst nodes
+        Return: None.
+        """
+        streets = [next(iter(g[n])) for n in ADDITIONAL]
+        if streets[0] not in self.where or streets[1] not in self.where:
+            return
+        (c, p), (d, q) = self.where[streets[0]], self.where[streets[1]]
+        if c != d:
+            return
+        time = g.edges['src', streets[0]]['time'] + \
+            g.edges['dst', streets[1]]['time'] + \
+            abs(self.times[c][p] - self.times[c][q])
+        self.core.add_edge('src', 'dst', time=time, via=(c, p, q),
+                           first='src')
+
+    def detach(self) -> None:
+        """
+        Function: Removes the src and dst nodes of a search.
+        Parameters: None
+        Return: None.
+        """
+        for node in ADDITIONAL:
+            if node in self.core:
+                self.core.remove_node(node)
+
+    def search(self) -> city.Path:
+        """
+        Function: Finds the shortest path between the src and dst nodes of
+                  the contracted graph with the kernels, starting from the
+                  nodes joined to src and ending at the nodes joined to dst.
+        Parameters: None
+        Return: The path of the contracted graph.
+        """
+        sources = {n: data['time'] for n, data in self.core['src'].items()
+                   if n != 'dst'}
+        targets = {n: data['time'] for n, data in self.core['dst'].items()
+                   if n != 'src'}
+        direct = self.core.edges['src', 'dst']['time'] \
+            if self.core.has_edge('src', 'dst') else float('inf')
+        try:
+            time, nodes = kernels.shortest_path(self.csr, sources, targets)
+        except nx.NetworkXNoPath:
+            if direct == float('inf'):
+                raise
+            time, nodes = direct, []
+        if direct <= time:
+            return ['src', 'dst']
+        return ['src'] + nodes + ['dst']
+
+    def expand(self, path: city.Path) -> city.Path:
+        """
+        Function: Expands a path of the contracted graph into the path of the
+                  city graph, putting back the nodes of the chains.
+        Parameters: path -> path of the contracted graph
+        Return: The path of the city graph.
+        """
+        if len(path) == 0:
+            return []
+        full: city.Path = [path[0]]
+        for a, b in zip(path, path[1:]):
+            data = self.core.edges[a, b]
+            via = data.get('via')
+            if via is not None:
+                c, i, j = via
+                step = 1 if i <= j else -1
+                nodes = [self.chains[c][k] for k in range(i, j + step, step)]
+                if data['first'] != a:
+                    nodes.reverse()
+                full.extend(nodes)
+            full.append(b)
+        return full
+
+
+def walk(g: city.CityGraph, removable: Set[city.NodeID],
+         start: city.NodeID, first: city.NodeID) -> List[city.NodeID]:
+    """
+    Function: Follows a chain of removable nodes from a node to its end.
+    Parameters: g -> City graph
+                removable -> nodes with two street neighbours
+                start -> node where the walk starts
+                first -> neighbour of start in the direction of the walk
+    Return: The nodes after start, the end (a kept node) the last one, or
+            start the last one if the chain is a closed ring.
+    """
+    nodes = [first]
+    previous, current = start, first
+    while current in removable and current != start:
+        a, b = g[current]
+        previous, current = current, (b if a == previous else a)
+        nodes.append(current)
+    return nodes
+
+
+def contract(g: city.CityGraph) -> Contraction:
+    """
+    Function: Removes the street nodes with two neighbours and joins their
+              chains into single edges.
+    Parameters: g -> City graph (without the src and dst nodes)
+    Return: The contraction.
+    """
+    removable = {n for n, data in g.nodes(data=True)
+                 if data.get('type') == 'Street' and g.degree(n) == 2 and
+                 n not in ADDITIONAL}
+    core = nx.Graph()
+    core.add_nodes_from(n for n in g.nodes
+                        if n not in removable and n not in ADDITIONAL)
+    chains: List[Tuple[city.NodeID, ...]] = []
+    times: List[Tuple[float, ...]] = []
+    where: Dict[city.NodeID, Tuple[int, int]] = {}
+    for node in list(removable):
+        if node in where or node in core:
+            continue
+        a, b = g[node]
+        backward = walk(g, removable, node, a)
+        if backward[-1] == node:
+            # A closed ring of removable nodes: its nodes are kept
+            core.add_nodes_from(backward)
+            continue
+        forward = walk(g, removable, node, b)
+        chain = tuple(backward[::-1] + [node] + forward)
+        elapsed = [0.0]
+        for u, v in zip(chain, chain[1:]):
+            elapsed.append(elapsed[-1] + g.edges[u, v]['time'])
+        c = len(chains)
+        chains.append(chain)
+        times.append(tuple(elapsed))
+        for p in range(1, len(chain) - 1):
+            where[chain[p]] = (c, p)
+        u, v = chain[0], chain[-1]
+        # A chain that comes back to its first node is never in a shortest
+        # path, but its nodes can still be the street node of a search
+        if u != v and (not core.has_edge(u, v) or
+                       core.edges[u, v]['time'] > elapsed[-1]):
+            core.add_edge(u, v, time=elapsed[-1],
+                          via=(c, 1, len(chain) - 2), first=u)
+    for u, v, time in g.edges(data='time'):
+        if u in core and v in core:
+            if not core.has_edge(u, v) or core.edges[u, v]['time'] > time:
+                core.add_edge(u, v, time=time, via=None)
+    return Contraction(core, chains, times, where, g.graph.get('version', 0),
+                       alt.signature(g), kernels.build(core))
+
+
+def find_path(ox_g: city.OsmnxGraph, g: city.CityGraph,
+              contraction: Contraction, src: city.Coord, dst: city.Coord,
+              landmarks: Optional[alt.Landmarks] = None) -> city.Path:
+    """
+    Function: Finds the shortest path from source to destiny on the
+              contracted graph and expands it, with the same result as
+              city.find_path. The src and dst nodes are also added to the
+              city graph, as city.find_path does.
+    Parameters: ox_g -> Barcelona's streets graph
+                g -> City graph
+                contraction -> the contraction of g (valid)
+                src -> Coordinate of the starting point
+                dst -> Coordinate of the final point
+                landmarks -> if given and valid for g, the search is an A*
+                             guided by them, otherwise it is done by the
+                             bidirectional kernel
+    Return: The path of the city graph.
+    """
+    nearest_nodes = city.add_additional_nodes(ox_g, g, src, dst)
+    try:
+        for node in ADDITIONAL:
+            contraction.attach(g, node)
+        contraction.join_same_chain(g)
+        with metrics.phase('shortest path'):
+            if landmarks is not None and landmarks.valid(g):
+                bound = landmarks.heuristic(nearest_nodes[1])
+                path = nx.astar_path(contraction.core, 'src', 'dst',
+                                     heuristic=bound, weight='time')
+            else:
+                path = contraction.search()
+        with metrics.phase('expansion'):
+            return contraction.expand(path)
+    finally:
+        contraction.detach()
+
+
+def summary(g: city.CityGraph, contraction: Contraction) -> Dict[str, float]:
+    """
+    Function: Compares the sizes of a graph and its contraction.
+    Parameters: g -> City graph
+                contraction -> the contraction of g
+    Return: The nodes and edges before and after and the part removed.
+    """
+    nodes, edges = alt.signature(g)
+    core = contraction.core
+    return {'nodes': nodes, 'edges': edges,
+            'core_nodes': core.number_of_nodes(),
+            'core_edges': core.number_of_edges(),
+            'chains': len(contraction.chains),
+            'node_reduction': 1 - core.number_of_nodes() / max(nodes, 1),
+            'edge_reduction': 1 - core.number_of_edges() / max(edges, 1)}
@@ -0,0 +1,265 @@
+"""
+This module saves the street graph as columns of NumPy arrays in an .npz
+file instead of a pickle of the networkx graph: the identifiers and
+coordinates of the nodes and the ends, keys, lengths, way identifiers and
+types (highway tag) of the edges. The file does not depend on the version of
+networkx and is read without unpickling anything, so it is safe to load.
+When it is not compressed, the arrays are mapped from the file instead of
+read (zero copy), so reading them takes almost no time and memory and the
+pages are shared by the processes that read the same file.
+Usage: python3 graphstore.py graf.dat graf.npz [--compress]
+"""
+
+# Library used to read the command line arguments
+import argparse
+# Library used to initialize classes
+from dataclasses import dataclass
+# Library used to access different data types
+from typing import Dict, List, Optional
+# Library used to find the arrays inside the .npz file
+import zipfile
+# Library used to read the pickled graphs to convert them
+import pickle
+# Library used to build the graph without garbage collections
+import gc
+# Library used to keep the columns
+import numpy as np
+# Library used to manipulate graphs
+import networkx as nx
+
+# Version of the format of the files
+FORMAT: int = 1
+# Separator of the types of an edge that joins several ways
+SEPARATOR: str = ';'
+
+
+@dataclass
+class StreetArrays:
+    """
+    Class: Contains the columns of a street graph.
+    """
+    ids: np.ndarray             # int64, identifier of every node
+    x: np.ndarray               # float64, longitude of every node
+    y: np.ndarray               # float64, latitude of every node
+    street_count: np.ndarray    # int32, streets of every node (-1 unknown)
+    u: np.ndarray               # int32, position of the first node
+    v: np.ndarray               # int32, position of the second node
+    key: np.ndarray             # int32, key of the parallel edges
+    length: np.ndarray          # float64, length of every edge (meters)
+    osmid: np.ndarray           # int64, first way of every edge (-1 none)
+    highway: np.ndarray         # int32, position of the type (-1 none)
+    highways: List[str]         # Types of the edges
+    crs: str                    # Coordinate system of the graph
+
+
+def first(value) -> int:
+    """
+    Function: Gives the first way of an edge, as osmnx keeps a list of them
+              when the edge joins several ways.
+    Parameters: value -> the osmid attribute of the edge
+    Return: The way identifier or -1.
+    """
+    if isinstance(value, (list, tuple)):
+        value = value[0] if len(value) > 0 else None
+    return -1 if value is None else int(value)
+
+
+def to_arrays(g: nx.MultiDiGraph) -> StreetArrays:
+    """
+    Function: Converts a street graph into columns.
+    Parameters: g -> Barcelona's streets graph
+    Return: The columns of the graph.
+    """
+    ids = np.array(list(g.nodes), dtype=np.int64)
+    position = {n: i for i, n in enumerate(g.nodes)}
+    data = list(g.nodes.values())
+    x = np.array([d['x'] for d in data], dtype=np.float64)
+    y = np.array([d['y'] for d in data], dtype=np.float64)
+    street_count = np.array([d.get('street_count', -1) for d in data],
+                            dtype=np.int32)
+    highways: List[str] = []
+    codes: Dict[str, int] = {}
+    columns: List[list] = [[], [], [], [], [], []]
+    for a, b, k, d in g.edges(keys=True, data=True):
+        tag = d.get('highway')
+        if isinstance(tag, (list, tuple)):
+            tag = SEPARATOR.join(tag)
+        if tag is not None and tag not in codes:
+            codes[tag] = len(highways)
+            highways.append(tag)
+        for column, value in zip(columns,
+                                 (position[a], position[b], k,
+                                  d.get('length', np.nan),
+                                  first(d.get('osmid')),
+                                  -1 if tag is None else codes[tag])):
+            column.append(value)
+    u, v, key, length, osmid, highway = columns
+    return StreetArrays(ids, x, y, street_count,
+                        np.array(u, dtype=np.int32),
+                        np.array(v, dtype=np.int32),
+                        np.array(key, dtype=np.int32),
+                        np.array(length, dtype=np.float64),
+                        np.array(osmid, dtype=np.int64),
+                        np.array(highway, dtype=np.int32), highways,
+                        str(g.graph.get('crs', 'epsg:4326')))
+
+
+def to_graph(arrays: StreetArrays) -> nx.MultiDiGraph:
+    """
+    Function: Builds the street graph from its columns. The dictionaries of
+              the graph are filled as add_nodes_from and add_edges_from
+              fill them, without their checks for every edge, which take
+              most of the time.
+    Parameters: arrays -> the columns
+    Return: The street graph, as the osmnx graphs used by the bot.
+    """
+    g = nx.MultiDiGraph(crs=arrays.crs)
+    node, succ, pred = g._node, g._succ, g._pred
+    ids = arrays.ids.tolist()
+    types = [t.split(SEPARATOR) if SEPARATOR in t else t
+             for t in arrays.highways]
+    # The garbage collector would run many times while the dictionaries
+    # are created, without anything to free
+    gc.disable()
+    try:
+        for n, x, y, c in zip(ids, arrays.x.tolist(), arrays.y.tolist(),
+                              arrays.street_count.tolist()):
+            node[n] = {'x': x, 'y': y, 'street_count': c} if c >= 0 else \
+                {'x': x, 'y': y}
+            succ[n] = {}
+            pred[n] = {}
+        data = [{'length': d} for d in arrays.length.tolist()]
+        for d, w in zip(data, arrays.osmid.tolist()):
+            if w >= 0:
+                d['osmid'] = w
+        for d, h in zip(data, arrays.highway.tolist()):
+            if h >= 0:
+                d['highway'] = types[h]
+        us = [ids[a] for a in arrays.u.tolist()]
+        vs = [ids[b] for b in arrays.v.tolist()]
+        for u, v, k, d in zip(us, vs, arrays.key.tolist(), data):
+            # The parallel edges of u and v share their dictionary of keys
+            keys = succ[u].get(v)
+            if keys is None:
+                keys = succ[u][v] = pred[v][u] = {}
+            keys[k] = d
+    finally:
+        gc.enable()
+    return g
+
+
+def save(g: nx.MultiDiGraph, filename: str, compress: bool = False) -> None:
+    """
+    Function: Saves a street graph into an .npz file.
+    Parameters: g -> Barcelona's streets graph
+                filename -> the .npz file
+                compress -> if True the file is smaller, but the arrays are
+                            decompressed instead of mapped when read
+    Return: None.
+    """
+    arrays = to_arrays(g)
+    columns = {name: getattr(arrays, name)
+               for name in ('ids', 'x', 'y', 'street_count', 'u', 'v', 'key',
+                            'length', 'osmid', 'highway')}
+    write = np.savez_compressed if compress else np.savez
+    write(filename, format=np.array(FORMAT), crs=np.array(arrays.crs),
+          highways=np.array(arrays.highways, dtype=str), **columns)
+
+
+def mapped(filename: str, archive: zipfile.ZipFile,
+           info: zipfile.ZipInfo) -> Optional[np.ndarray]:
+    """
+    Function: Maps an array of an .npz file without reading it, when it is
+              stored without compression.
+    Parameters: filename -> the .npz file
+                archive -> the open .npz file
+                info -> the member of the array
+    Return: The mapped array, or None if it cannot be mapped.
+    """
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with archive.open(info) as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            header = np.lib.format.read_array_header_1_0(f)
+        else:
+            header = np.lib.format.read_array_header_2_0(f)
+        shape, fortran, dtype = header
+        start = f.tell()
+    if dtype.hasobject or len(shape) == 0 or 0 in shape:
+        return None
+    # The data starts after the local header of the member (30 bytes, the
+    # name and the extra field) and the header of the .npy file
+    with open(filename, 'rb') as f:
+        f.seek(info.header_offset + 26)
+        sizes = np.frombuffer(f.read(4), dtype='<u2')
+    offset = info.header_offset + 30 + int(sizes[0]) + int(sizes[1]) + start
+    return np.memmap(filename, dtype=dtype, mode='r', offset=offset,
+                     shape=shape, order='F' if fortran else 'C')
+
+
+def read(filename: str, mmap: bool = True) -> StreetArrays:
+    """
+    Function: Reads the columns of a street graph saved with save.
+    Parameters: filename -> the .npz file
+                mmap -> if True the arrays stored without compression are
+                        mapped from the file instead of read
+    Return: The columns.
+    """
+    columns: Dict[str, np.ndarray] = {}
+    with np.load(filename, allow_pickle=False) as data:
+        if int(data['format']) != FORMAT:
+            raise ValueError("{} has format {}, {} expected".format(
+                filename, int(data['format']), FORMAT))
+        with zipfile.ZipFile(filename) as archive:
+            for info in archive.infolist():
+                name = info.filename[:-len('.npy')]
+                array = mapped(filename, archive, info) if mmap else None
+                columns[name] = data[name] if array is None else array
+    return StreetArrays(columns['ids'], columns['x'], columns['y'],
+                        columns['street_count'], columns['u'], columns['v'],
+                        columns['key'], columns['length'], columns['osmid'],
+                        columns['highway'], columns['highways'].tolist(),
+                        str(columns['crs']))
+
+
+def load(filename: str) -> nx.MultiDiGraph:
+    """
+    Function: Reads a street graph saved with save.
+    Parameters: filename -> the .npz file
+    Return: The street graph.
+    """
+    return to_graph(read(filename))
+
+
+def convert(source: str, target: str, compress: bool = False) -> None:
+    """
+    Function: Converts a pickled street graph (graf.dat) into an .npz file.
+              Only trusted pickles must be converted, as unpickling can run
+              any code.
+    Parameters: source -> the pickle file
+                target -> the .npz file
+                compress -> if True the .npz file is compressed
+    Return: None.
+    """
+    with open(source, 'rb') as f:
+        g = pickle.load(f)
+    save(g, target, compress)
+
+
+def main() -> None:
+    """
+    Function: Converts the pickle file given in the command line.
+    Parameters: None (command line arguments)
+    Return: None.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('source', help='pickled street graph (graf.dat)')
+    parser.add_argument('target', help='.npz file (graf.npz)')
+    parser.add_argument('--compress', action='store_true')
+    args = parser.parse_args()
+    convert(args.source, args.target, args.compress)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,404 @@
+"""
+This module reads public transport feeds in the GTFS format (local zip files
+such as the TMB bus, TRAM, FGC or Rodalies feeds) and adds their stops, route
+segments and transfers to the city graph, so that buses, trams and trains can
+be used together with the metro and the streets.
+The stop_times.txt file, which is by far the largest one, is read as a stream
+one trip at a time, and only the distinct segments are kept.
+"""
+
+# Library used to initialize classes
+from dataclasses import dataclass, field
+# Library used to access different data types
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+# Library used to read the feeds
+import csv
+import io
+import os
+import zipfile
+# Library used to store the stop coordinates compactly
+from array import array
+# Library used to measure the build time of every feed
+import time
+# Library used to know which services run on a day
+import datetime
+# Library used to calculate distances between two points
+import haversine as hs
+# Library used to build the edges of the city graph
+import city
+
+# Edge type of every GTFS route_type (basic and extended route types)
+MODES: Dict[int, str] = {0: 'Tram', 1: 'Subway', 2: 'Rail', 3: 'Bus',
+                         4: 'Ferry', 5: 'Tram', 6: 'Funicular',
+                         7: 'Funicular', 11: 'Bus', 12: 'Rail'}
+EXTENDED_MODES: List[Tuple[int, str]] = [(100, 'Rail'), (200, 'Bus'),
+                                         (400, 'Subway'), (700, 'Bus'),
+                                         (900, 'Tram'), (1000, 'Ferry'),
+                                         (1400, 'Funicular')]
+# Colour of the segments of the routes without route_color
+COLOURS: Dict[str, str] = {'Tram': '#008E78', 'Subway': '#E2001A',
+                           'Rail': '#F26E21', 'Bus': '#E30613',
+                           'Ferry': '#0098D8', 'Funicular': '#7B2C83'}
+
+
+@dataclass
+class Route:
+    """
+    Class: Contains the attributes of a route of a feed.
+    """
+    id: str                 # Route's identifier in the feed
+    name: str               # Route's short name (for example V15 or S1)
+    mode: str               # Edge type of its segments (Bus, Tram...)
+    colour: str             # Route's colour
+
+
+@dataclass
+class Feed:
+    """
+    Class: Contains the stops, segments and transfers of a feed. Stops are
+           numbered, so that segments and transfers are pairs of numbers.
+    """
+    name: str                                   # Feed's name (file name)
+    stop_ids: List[str] = field(default_factory=list)
+    stop_names: List[str] = field(default_factory=list)
+    stop_x: array = field(default_factory=lambda: array('d'))
+    stop_y: array = field(default_factory=lambda: array('d'))
+    stop_parents: List[str] = field(default_factory=list)
+    routes: List[Route] = field(default_factory=list)
+    # (stop, next stop) -> route number of the first trip that uses it
+    segments: Dict[Tuple[int, int], int] = field(default_factory=dict)
+    # (stop, other stop) -> minimum transfer time (seconds) or None
+    transfers: Dict[Tuple[int, int], Optional[float]] = field(
+        default_factory=dict)
+
+    def node(self, stop: int) -> str:
+        """
+        Function: Gives the city graph node of a stop.
+        Parameters: stop -> number of the stop
+        Return: The node identifier (feed name and stop_id).
+        """
+        return self.name + ':' + self.stop_ids[stop]
+
+
+@dataclass
+class FeedReport:
+    """
+    Class: Contains what was added to the city graph from a feed and how
+           long it took.
+    """
+    name: str
+    stops: int
+    routes: int
+    trips: int
+    stop_times: int
+    segments: int
+    transfers: int
+    seconds: float
+
+
+def mode(route_type: int) -> str:
+    """
+    Function: Gives the edge type of a GTFS route_type.
+    Parameters: route_type -> basic or extended GTFS route type
+    Return: The edge type (Tram, Subway, Rail, Bus, Ferry or Funicular).
+    """
+    if route_type in MODES:
+        return MODES[route_type]
+    result = 'Bus'
+    for start, name in EXTENDED_MODES:
+        if route_type >= start:
+            result = name
+    return result
+
+
+def parse_time(text: str) -> int:
+    """
+    Function: Converts a GTFS time (HH:MM:SS, hours can be over 24) into
+              seconds after midnight.
+    Parameters: text -> the time as a string
+    Return: The seconds after midnight.
+    """
+    hours, minutes, seconds = text.strip().split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def open_table(zf: zipfile.ZipFile, name: str) -> Optional[Iterator[Dict]]:
+    """
+    Function: Opens a file of a feed as a stream of rows. Files inside a
+              folder of the zip are also found.
+    Parameters: zf -> the zip file of the feed
+                name -> name of the file (for example stops.txt)
+    Return: An iterator over the rows as dictionaries, or None if the feed
+            does not have the file.
+    """
+    for info in zf.infolist():
+        if os.path.basename(info.filename) == name:
+            text = io.TextIOWrapper(zf.open(info), encoding='utf-8-sig')
+            return csv.DictReader(text)
+    return None
+
+
+def read_stops(zf: zipfile.ZipFile, feed: Feed) -> Dict[str, int]:
+    """
+    Function: Reads the stops (not the stations that group them) of a feed.
+    Parameters: zf -> the zip file of the feed
+                feed -> the feed where the stops are stored
+    Return: The number of every stop_id.
+    """
+    numbers: Dict[str, int] = {}
+    for row in open_table(zf, 'stops.txt') or []:
+        # Stations, entrances and other locations are not stops
+        if row.get('location_type', '') not in ('', '0'):
+            continue
+        numbers[row['stop_id']] = len(feed.stop_ids)
+        feed.stop_ids.append(row['stop_id'])
+        feed.stop_names.append(row.get('stop_name', ''))
+        feed.stop_x.append(float(row['stop_lon']))
+        feed.stop_y.append(float(row['stop_lat']))
+        feed.stop_parents.append(row.get('parent_station', ''))
+    return numbers
+
+
+def read_routes(zf: zipfile.ZipFile, feed: Feed) -> Dict[str, int]:
+    """
+    Function: Reads the routes of a feed.
+    Parameters: zf -> the zip file of the feed
+                feed -> the feed where the routes are stored
+    Return: The number of every route_id.
+    """
+    numbers: Dict[str, int] = {}
+    for row in open_table(zf, 'routes.txt') or []:
+        route_mode = mode(int(row.get('route_type') or 3))
+        colour = row.get('route_color', '').strip()
+        colour = '#' + colour if colour != '' else COLOURS[route_mode]
+        name = row.get('route_short_name') or row.get('route_long_name', '')
+        numbers[row['route_id']] = len(feed.routes)
+        feed.routes.append(Route(row['route_id'], name, route_mode, colour))
+    return numbers
+
+
+def active_services(zf: zipfile.ZipFile, date: datetime.date) -> Set[str]:
+    """
+    Function: Finds the services that run on a date, from calendar.txt and
+              the exceptions of calendar_dates.txt.
+    Parameters: zf -> the zip file of the feed
+                date -> the day of the trips
+    Return: The set of service_id that run that day.
+    """
+    day = date.strftime('%Y%m%d')
+    weekday = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+               'saturday', 'sunday'][date.weekday()]
+    services: Set[str] = set()
+    for row in open_table(zf, 'calendar.txt') or []:
+        if row['start_date'] <= day <= row['end_date'] and \
+                row.get(weekday, '0').strip() == '1':
+            services.add(row['service_id'])
+    for row in open_table(zf, 'calendar_dates.txt') or []:
+        if row['date'] == day:
+            # Exception type 1 adds the service and type 2 removes it
+            if row['exception_type'].strip() == '1':
+                services.add(row['service_id'])
+            else:
+                services.discard(row['service_id'])
+    return services
+
+
+def read_trip_routes(zf: zipfile.ZipFile, routes: Dict[str, int],
+                     service_ids: Optional[Set[str]] = None) -> Dict:
+    """
+    Function: Reads the route of every trip.
+    Parameters: zf -> the zip file of the feed
+                routes -> number of every route_id
+                service_ids -> if given, only the trips of these services
+    Return: The route number of every trip_id.
+    """
+    trips: Dict[str, int] = {}
+    for row in open_table(zf, 'trips.txt') or []:
+        if service_ids is None or row['service_id'] in service_ids:
+            trips[row['trip_id']] = routes[row['route_id']]
+    return trips
+
+
+def iter_trips(zf: zipfile.ZipFile, stops: Dict[str, int],
+               trips: Dict[str, int]) -> Iterator[Tuple[str, int, List]]:
+    """
+    Function: Reads stop_times.txt as a stream, one trip at a time. The rows
+              of a trip are expected to be together, as in all the feeds of
+              the Barcelona area.
+    Parameters: zf -> the zip file of the feed
+                stops -> number of every stop_id
+                trips -> route number of every trip_id to read
+    Return: An iterator of (trip_id, route number, list of (stop number,
+            arrival, departure) sorted by stop_sequence).
+    """
+    current: Optional[str] = None
+    rows: List[Tuple[int, int, int, int]] = []
+    for row in open_table(zf, 'stop_times.txt') or []:
+        trip_id = row['trip_id']
+        if trip_id != current:
+            if current in trips and len(rows) > 1:
+                rows.sort()
+                yield current, trips[current], [r[1:] for r in rows]
+            current = trip_id
+            rows = []
+        if trip_id not in trips or row['stop_id'] not in stops:
+            continue
+        arrival = row.get('arrival_time', '').strip()
+        departure = row.get('departure_time', '').strip() or arrival
+        # Stops without times (interpolated) take the time of the previous
+        # stop of the trip
+        if arrival == '' and len(rows) > 0:
+            times = (rows[-1][2], rows[-1][3])
+        elif arrival == '':
+            continue
+        else:
+            times = (parse_time(arrival), parse_time(departure))
+        rows.append((int(row['stop_sequence']), stops[row['stop_id']],
+                     times[0], times[1]))
+    if current in trips and len(rows) > 1:
+        rows.sort()
+        yield current, trips[current], [r[1:] for r in rows]
+
+
+def read_transfers(zf: zipfile.ZipFile, feed: Feed,
+                   stops: Dict[str, int]) -> None:
+    """
+    Function: Reads the transfers of a feed and adds transfers between the
+              stops of the same station.
+    Parameters: zf -> the zip file of the feed
+                feed -> the feed where the transfers are stored
+                stops -> number of every stop_id
+    Return: None.
+    """
+    for row in open_table(zf, 'transfers.txt') or []:
+        a, b = row.get('from_stop_id'), row.get('to_stop_id')
+        # Transfers that are not possible (type 3) are ignored
+        if a in stops and b in stops and a != b and \
+                row.get('transfer_type', '') != '3':
+            seconds = row.get('min_transfer_time', '').strip()
+            feed.transfers[(stops[a], stops[b])] = \
+                float(seconds) if seconds != '' else None
+    stations: Dict[str, List[int]] = {}
+    for stop, parent in enumerate(feed.stop_parents):
+        if parent != '':
+            stations.setdefault(parent, []).append(stop)
+    for group in stations.values():
+        for i in range(len(group)):
+            for j in range(i + 1, len(group)):
+                feed.transfers.setdefault((group[i], group[j]), None)
+
+
+def feed_name(filename: str) -> str:
+    """
+    Function: Gives the name of a feed, used in the nodes of its stops.
+    Parameters: filename -> the zip file of the feed
+    Return: The file name without the directory and the extension.
+    """
+    name = os.path.basename(filename)
+    if name.endswith('.zip'):
+        name = name[:-4]
+    return name
+
+
+def read_feed(filename: str,
+              service_ids: Optional[Set[str]] = None) -> Tuple[Feed, Dict]:
+    """
+    Function: Reads a GTFS zip file.
+    Parameters: filename -> the zip file
+                service_ids -> if given, only the trips of these services
+    Return: The feed and the counters of what was read.
+    """
+    feed = Feed(feed_name(filename))
+    counters = {'trips': 0, 'stop_times': 0}
+    with zipfile.ZipFile(filename) as zf:
+        stops = read_stops(zf, feed)
+        routes = read_routes(zf, feed)
+        trips = read_trip_routes(zf, routes, service_ids)
+        for trip_id, route, stop_times in iter_trips(zf, stops, trips):
+            counters['trips'] += 1
+            counters['stop_times'] += len(stop_times)
+            for i in range(1, len(stop_times)):
+                segment = (stop_times[i-1][0], stop_times[i][0])
+                if segment[0] != segment[1]:
+                    feed.segments.setdefault(segment, route)
+        read_transfers(zf, feed, stops)
+    return feed, counters
+
+
+def add_feed(g: city.CityGraph, street: city.OsmnxGraph, feed: Feed) -> None:
+    """
+    Function: Adds the stops, segments and transfers of a feed to the city
+              graph and joins every stop to its nearest street node.
+    Parameters: g -> City graph (merge of street and metro graphs)
+                street -> Barcelona's streets graph
+                feed -> the feed to add
+    Return: None.
+    """
+    used: Set[int] = set()
+    for a, b in feed.segments:
+        used.update((a, b))
+    for a, b in feed.transfers:
+        if a in used or b in used:
+            used.update((a, b))
+    stops = sorted(used)
+    for stop in stops:
+        g.add_node(feed.node(stop), type='stop', name=feed.stop_names[stop],
+                   location=(feed.stop_x[stop], feed.stop_y[stop]))
+
+    def distance(a: int, b: int) -> float:
+        return hs.haversine((feed.stop_y[a], feed.stop_x[a]),
+                            (feed.stop_y[b], feed.stop_x[b]), unit='m')
+
+    for (a, b), route in feed.segments.items():
+        r = feed.routes[route]
+        dist = distance(a, b)
+        time = dist / city.get_speed(r.mode)
+        u, v = feed.node(a), feed.node(b)
+        # The graph has a single edge between two stops, the fastest one
+        if not g.has_edge(u, v) or g.edges[u, v]['time'] > time:
+            g.add_edge(u, v, attributes=city.Edge(r.mode, r.colour, dist),
+                       time=time, route=r.name)
+    for (a, b), seconds in feed.transfers.items():
+        if a in used and b in used:
+            dist = distance(a, b)
+            if seconds is None:
+                seconds = dist / city.get_speed('Link')
+            u, v = feed.node(a), feed.node(b)
+            # A transfer does not replace a faster ride between the stops
+            if not g.has_edge(u, v) or g.edges[u, v]['time'] > seconds:
+                if g.has_edge(u, v):
+                    # The route of the slower ride is not kept
+                    g.remove_edge(u, v)
+                g.add_edge(u, v, attributes=city.Edge('Link', '#000000',
+                                                      dist),
+                           time=seconds)
+    # Joins every stop to the streets as the metro accesses are joined
+    if len(stops) > 0:
+        nearest, dist = city.snap(street, [(feed.stop_x[s], feed.stop_y[s])
+                                           for s in stops])
+        for i in range(len(stops)):
+            g.add_edge(feed.node(stops[i]), nearest[i],
+                       attributes=city.Edge('Street', '#F3A83B', dist[i]),
+                       time=dist[i] / city.get_speed('Street'))
+
+
+def add_feeds(g: city.CityGraph, street: city.OsmnxGraph,
+              filenames: List[str]) -> List[FeedReport]:
+    """
+    Function: Reads GTFS zip files and adds them to the city graph.
+    Parameters: g -> City graph (merge of street and metro graphs)
+                street -> Barcelona's streets graph
+                filenames -> list of GTFS zip files
+    Return: A report of every feed, with its build time.
+    """
+    reports: List[FeedReport] = []
+    for filename in filenames:
+        start = time.perf_counter()
+        feed, counters = read_feed(filename)
+        add_feed(g, street, feed)
+        reports.append(FeedReport(feed.name, len(feed.stop_ids),
+                                  len(feed.routes), counters['trips'],
+                                  counters['stop_times'], len(feed.segments),
+                                  len(feed.transfers),
+                                  time.perf_counter() - start))
+    return reports
@@ -0,0 +1,259 @@
+"""
+This module ingests large restaurant files, such as the whole equipment
+open data file of Catalonia, without reading them at once: the file is read
+in chunks, the duplicated names are removed with a set of hashes and the
+text is normalized (lower case, without accents or punctuation). Every chunk
+is written straight into a columnar store (one Parquet file per chunk) and
+the inverted index of its words (word -> rows) into a file of its own, so
+the memory used does not grow with the chunks that were already written. At
+the end the indexes of the chunks are merged into one, copying the rows of
+one chunk at a time into a file mapped in memory.
+The store and its index are an offline artifact, separate from the bot: the
+bot reads restaurants.csv (restaurants.read) and ranks its searches with
+ranking.Index, and the store is only read by load and Store.search.
+Usage: python3 ingest.py <csv file> <store folder> [--chunksize N]
+"""
+
+# Library used to read the command line arguments
+import argparse
+# Library used to initialize classes
+from dataclasses import dataclass
+# Library used to access different data types
+from typing import Dict, List, Tuple
+# Library used to keep the rows of every word compactly
+from array import array
+# Library used to access, read or write files
+import os
+import glob
+# Library used to measure the ingestion time
+import time
+# Library used to store the columns and the index
+import numpy as np
+import pandas as pd
+# Library used to access the restaurant functions
+import restaurants
+# Library used to normalize the text like the ranked search
+from ranking import normalize
+
+# Fields whose words are indexed (not the coordinates or the phone number)
+SEARCH_FIELDS: Tuple[str, ...] = ('name', 'institution_name', 'street_name',
+                                  'neighbourhood', 'district',
+                                  'restaurant_type')
+# Words and offsets of the merged index, and the rows of all its words
+INDEX_FILE: str = 'index.npz'
+ROWS_FILE: str = 'rows.npy'
+# Index of every chunk, removed once they are merged
+CHUNK_INDEX: str = 'index-{:05d}.npz'
+
+
+def normalize_column(values: pd.Series) -> List[str]:
+    """
+    Function: Normalizes a column, once for every different value (the
+              neighbourhoods, districts and types repeat a lot).
+    Parameters: values -> the column
+    Return: The normalized values.
+    """
+    normalized = {value: normalize(value) for value in set(values.tolist())}
+    return [normalized[value] for value in values.tolist()]
+
+
+@dataclass
+class IngestReport:
+    """
+    Class: Contains the result of an ingestion.
+    """
+    rows: int           # Restaurants written (without duplicates)
+    chunks: int         # Parquet files written
+    words: int          # Different words of the index
+    seconds: float      # Time of the ingestion
+
+
+def ingest(filename: str, directory: str,
+           chunksize: int = restaurants.CHUNK) -> IngestReport:
+    """
+    Function: Reads a restaurant file in chunks and writes them into a
+              columnar store and an inverted index.
+    Parameters: filename -> the csv file
+                directory -> folder of the store (created if needed, the
+                             old files are replaced)
+                chunksize -> rows read at once
+    Return: The report of the ingestion.
+    """
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    for pattern in ('part-*.parquet', 'index-*.npz'):
+        for old in glob.glob(os.path.join(directory, pattern)):
+            os.remove(old)
+    rows, chunks = 0, 0
+    for df in restaurants.read_chunks(filename, chunksize):
+        df = df.rename(columns={column: field for field, column
+                                in restaurants.COLUMNS.items()})
+        text = [' '.join(words) for words in
+                zip(*[normalize_column(df[field])
+                      for field in SEARCH_FIELDS])]
+        # Only the words of this chunk are kept
+        postings: Dict[str, array] = {}
+        for row, words in enumerate(text, rows):
+            for word in set(words.split()):
+                postings.setdefault(word, array('I')).append(row)
+        df.to_parquet(os.path.join(directory,
+                                   'part-{:05d}.parquet'.format(chunks)),
+                      index=False)
+        save_index(postings, os.path.join(directory,
+                                          CHUNK_INDEX.format(chunks)))
+        rows += len(df)
+        chunks += 1
+    words = merge_indexes([os.path.join(directory, CHUNK_INDEX.format(i))
+                           for i in range(chunks)], directory)
+    return IngestReport(rows, chunks, words, time.perf_counter() - start)
+
+
+def save_index(postings: Dict[str, array], filename: str) -> None:
+    """
+    Function: Saves an inverted index as sorted words and the rows of every
+              word one after the other (offsets[i]:offsets[i+1] are the rows
+              of words[i]).
+    Parameters: postings -> rows of every word
+                filename -> the .npz file
+    Return: None.
+    """
+    words = sorted(postings)
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[w]) for w in words])
+    rows = np.empty(offsets[-1], dtype=np.uint32)
+    for i, word in enumerate(words):
+        rows[offsets[i]:offsets[i + 1]] = postings[word]
+    np.savez(filename, words=np.array(words, dtype=str), offsets=offsets,
+             rows=rows)
+
+
+def merge_indexes(filenames: List[str], directory: str) -> int:
+    """
+    Function: Merges the indexes of the chunks (saved with save_index, in
+              the order of their rows) into the index of the store and
+              removes them. The words are merged first; then the rows of
+              every chunk are copied after the ones of the chunks before it,
+              one chunk at a time, into a file mapped in memory, so the rows
+              of every word stay sorted.
+    Parameters: filenames -> the indexes of the chunks
+                directory -> folder of the store
+    Return: The number of different words.
+    """
+    words = np.array([], dtype=str)
+    for filename in filenames:
+        with np.load(filename) as index:
+            words = np.union1d(words, index['words'])
+    # Rows of every word in all the chunks
+    counts = np.zeros(len(words), dtype=np.int64)
+    for filename in filenames:
+        with np.load(filename) as index:
+            position = np.searchsorted(words, index['words'])
+            counts[position] += np.diff(index['offsets'])
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    rows = np.lib.format.open_memmap(os.path.join(directory, ROWS_FILE),
+                                     mode='w+', dtype=np.uint32,
+                                     shape=(int(offsets[-1]),))
+    # Next free position of the rows of every word
+    cursor = offsets[:-1].copy()
+    for filename in filenames:
+        with np.load(filename) as index:
+            position = np.searchsorted(words, index['words'])
+            starts = index['offsets']
+            lengths = np.diff(starts)
+            target = np.repeat(cursor[position] - starts[:-1],
+                               lengths) + np.arange(starts[-1])
+            rows[target] = index['rows']
+            cursor[position] += lengths
+    rows.flush()
+    del rows
+    np.savez(os.path.join(directory, INDEX_FILE), words=words,
+             offsets=offsets)
+    for filename in filenames:
+        os.remove(filename)
+    return len(words)
+
+
+@dataclass
+class Store:
+    """
+    Class: Contains the restaurants of a store as columns and their inverted
+           index.
+    """
+    columns: Dict[str, np.ndarray]  # Field -> values of every restaurant
+    words: np.ndarray               # Sorted words of the index
+    offsets: np.ndarray             # Start of the rows of every word
+    rows: np.ndarray                # Rows of all the words (mapped)
+
+    def __len__(self) -> int:
+        return len(self.columns['name'])
+
+    def restaurant(self, row: int) -> restaurants.Restaurant:
+        """
+        Function: Builds the Restaurant of a row.
+        Parameters: row -> number of the row
+        Return: The restaurant.
+        """
+        return restaurants.Restaurant(*[self.columns[field][row] for field
+                                        in restaurants.COLUMNS])
+
+    def lookup(self, word: str) -> np.ndarray:
+        """
+        Function: Gives the rows that contain a word.
+        Parameters: word -> a normalized word
+        Return: The sorted rows.
+        """
+        i = int(np.searchsorted(self.words, word))
+        if i == len(self.words) or self.words[i] != word:
+            return self.rows[:0]
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def search(self, query: str) -> List[int]:
+        """
+        Function: Finds the rows that contain all the words of a query.
+        Parameters: query -> the query
+        Return: The sorted rows.
+        """
+        words = normalize(query).split()
+        if len(words) == 0:
+            return []
+        found = self.lookup(words[0])
+        for word in words[1:]:
+            found = np.intersect1d(found, self.lookup(word),
+                                   assume_unique=True)
+        return found.tolist()
+
+
+def load(directory: str) -> Store:
+    """
+    Function: Reads a store written by ingest.
+    Parameters: directory -> folder of the store
+    Return: The store.
+    """
+    parts = sorted(glob.glob(os.path.join(directory, 'part-*.parquet')))
+    df = pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+    columns = {field: df[field].to_numpy() for field in restaurants.COLUMNS}
+    with np.load(os.path.join(directory, INDEX_FILE)) as index:
+        return Store(columns, index['words'], index['offsets'],
+                     np.load(os.path.join(directory, ROWS_FILE),
+                             mmap_mode='r'))
+
+
+def main() -> None:
+    """
+    Function: Ingests a restaurant file from the command line.
+    Parameters: None (command line arguments)
+    Return: None.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('csv', help='restaurant csv file')
+    parser.add_argument('store', help='folder of the store')
+    parser.add_argument('--chunksize', type=int, default=restaurants.CHUNK)
+    args = parser.parse_args()
+    report = ingest(args.csv, args.store, args.chunksize)
+    print("{} restaurants, {} chunks, {} words in {:.2f} s".format(
+        report.rows, report.chunks, report.words, report.seconds))
+
+
+if __name__ == '__main__':
+    main()
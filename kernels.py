@@ -0,0 +1,347 @@
+"""
+This module runs the shortest path searches on compact arrays instead of
+the dictionaries of networkx. A graph is stored in CSR form (compressed
+sparse rows): the neighbours of node i are indices[indptr[i]:indptr[i + 1]]
+and the times of the edges are in weights at the same positions. There are
+three kernels: Dijkstra within a time limit (one to many), and bidirectional
+Dijkstra (one to one), both from several sources with a starting time each,
+as the src and dst nodes of a search join several nodes.
+The kernels are compiled with Numba if it is installed, and the compiled
+code is cached on disk so it is only compiled once. Otherwise the same code
+runs as plain Python over lists. The backend can be chosen at runtime with
+select.
+"""
+
+# Library used to initialize classes
+from dataclasses import dataclass, field
+# Library used to access different data types
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+# Library used to keep the queues of the searches
+import heapq
+# Library used to store the graphs as arrays
+import numpy as np
+# Library used to manipulate graphs
+import networkx as nx
+
+# Backends of the kernels, the first available one is used by default
+BACKENDS: Tuple[str, ...] = ('numba', 'python')
+INF: float = float('inf')
+
+
+@dataclass
+class CSR:
+    """
+    Class: Contains an undirected graph as compressed sparse rows.
+    """
+    nodes: list                 # Node of every position
+    indptr: np.ndarray          # int64, first edge of every node
+    indices: np.ndarray         # int64, other node of every edge
+    weights: np.ndarray         # float64, time of every edge
+    index: Dict = field(init=False, repr=False)     # Node -> position
+    lists: Optional[tuple] = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.index = {n: i for i, n in enumerate(self.nodes)}
+
+    def arrays(self, backend: str) -> tuple:
+        """
+        Function: Gives the arrays of the graph in the form used by a
+                  backend: NumPy arrays for Numba and lists for Python,
+                  whose items are read faster by the interpreter.
+        Parameters: backend -> the backend
+        Return: The indptr, indices and weights.
+        """
+        if backend == 'numba':
+            return self.indptr, self.indices, self.weights
+        if self.lists is None:
+            self.lists = (self.indptr.tolist(), self.indices.tolist(),
+                          self.weights.tolist())
+        return self.lists
+
+
+def build(g: nx.Graph, weight: str = 'time',
+          skip: Sequence = ()) -> CSR:
+    """
+    Function: Converts an undirected graph into compressed sparse rows.
+    Parameters: g -> the graph (the city graph or a contracted graph)
+                weight -> attribute of the time of the edges
+                skip -> nodes left out (the src and dst nodes of a search)
+    Return: The graph as arrays.
+    """
+    nodes = [n for n in g.nodes if n not in skip]
+    index = {n: i for i, n in enumerate(nodes)}
+    edges = [(index[u], index[v], w) for u, v, w in g.edges(data=weight)
+             if u in index and v in index]
+    u = np.array([e[0] for e in edges], dtype=np.int64)
+    v = np.array([e[1] for e in edges], dtype=np.int64)
+    w = np.array([e[2] for e in edges], dtype=np.float64)
+    # Every edge is stored in both directions
+    tails, heads = np.concatenate([u, v]), np.concatenate([v, u])
+    order = np.argsort(tails, kind='stable')
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=len(nodes)), out=indptr[1:])
+    return CSR(nodes, indptr, heads[order],
+               np.concatenate([w, w])[order])
+
+
+def _dijkstra(indptr, indices, weights, sources, starts, limit, dist,
+              parent, order):
+    """
+    Function: Dijkstra search from several sources, that stops at a time.
+    Parameters: indptr, indices, weights -> the graph
+                sources -> positions of the sources
+                starts -> time at every source
+                limit -> nodes farther than this time are not settled
+                dist, parent -> work arrays, infinite and -1
+                order -> work array where the settled nodes are written
+    Return: The number of nodes settled (dist, parent and order are
+            filled).
+    """
+    heap = [(0.0, 0)]
+    heap.pop()
+    for i in range(len(sources)):
+        s = int(sources[i])
+        if starts[i] < dist[s]:
+            dist[s] = starts[i]
+            heapq.heappush(heap, (float(starts[i]), s))
+    settled = 0
+    while len(heap) > 0:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        if d > limit:
+            break
+        order[settled] = u
+        settled += 1
+        for e in range(indptr[u], indptr[u + 1]):
+            v = int(indices[e])
+            nd = d + weights[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                parent[v] = u
+                heapq.heappush(heap, (nd, v))
+    return settled
+
+
+def _bidirectional(indptr, indices, weights, sources, starts, targets,
+                   ends, dist_f, dist_b, parent_f, parent_b):
+    """
+    Function: Bidirectional Dijkstra search from several sources to several
+              targets, that advances the side with the nearest node and
+              stops when no shorter path can be found.
+    Parameters: indptr, indices, weights -> the graph (undirected)
+                sources, starts -> positions of the sources and their times
+                targets, ends -> positions of the targets and their times
+                dist_f, dist_b, parent_f, parent_b -> work arrays, infinite
+                                                      and -1
+    Return: The time of the shortest path and the node where both searches
+            meet (-1 if there is no path).
+    """
+    heap_f = [(0.0, 0)]
+    heap_f.pop()
+    heap_b = [(0.0, 0)]
+    heap_b.pop()
+    for i in range(len(sources)):
+        s = int(sources[i])
+        if starts[i] < dist_f[s]:
+            dist_f[s] = starts[i]
+            heapq.heappush(heap_f, (float(starts[i]), s))
+    best, meet = INF, -1
+    for i in range(len(targets)):
+        t = int(targets[i])
+        if ends[i] < dist_b[t]:
+            dist_b[t] = ends[i]
+            heapq.heappush(heap_b, (float(ends[i]), t))
+            if dist_f[t] + ends[i] < best:
+                best, meet = dist_f[t] + ends[i], t
+    while len(heap_f) > 0 and len(heap_b) > 0:
+        if heap_f[0][0] + heap_b[0][0] >= best:
+            break
+        forward = heap_f[0][0] <= heap_b[0][0]
+        if forward:
+            d, u = heapq.heappop(heap_f)
+            if d > dist_f[u]:
+                continue
+        else:
+            d, u = heapq.heappop(heap_b)
+            if d > dist_b[u]:
+                continue
+        for e in range(indptr[u], indptr[u + 1]):
+            v = int(indices[e])
+            nd = d + weights[e]
+            if forward and nd < dist_f[v]:
+                dist_f[v] = nd
+                parent_f[v] = u
+                heapq.heappush(heap_f, (nd, v))
+                if nd + dist_b[v] < best:
+                    best, meet = nd + dist_b[v], v
+            elif not forward and nd < dist_b[v]:
+                dist_b[v] = nd
+                parent_b[v] = u
+                heapq.heappush(heap_b, (nd, v))
+                if nd + dist_f[v] < best:
+                    best, meet = nd + dist_f[v], v
+    return best, meet
+
+
+# Kernels of every backend, compiled the first time they are asked for
+_kernels: Dict[str, Dict[str, Callable]] = {
+    'python': {'dijkstra': _dijkstra, 'bidirectional': _bidirectional}}
+_backend: Optional[str] = None
+
+
+def available(backend: str) -> bool:
+    """
+    Function: Tells if a backend can be used.
+    Parameters: backend -> one of BACKENDS
+    Return: True if it can be used.
+    """
+    if backend == 'numba':
+        try:
+            import numba  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    return backend in BACKENDS
+
+
+def select(backend: Optional[str] = None) -> str:
+    """
+    Function: Chooses the backend of the kernels.
+    Parameters: backend -> one of BACKENDS (None: the first available one)
+    Return: The backend chosen.
+    """
+    global _backend
+    if backend is None:
+        backend = next(b for b in BACKENDS if available(b))
+    elif not available(backend):
+        raise ValueError("Backend {} is not available".format(backend))
+    _backend = backend
+    return backend
+
+
+def backend() -> str:
+    """
+    Function: Gives the backend of the kernels, choosing the default one the
+              first time.
+    Parameters: None
+    Return: The backend.
+    """
+    return _backend if _backend is not None else select()
+
+
+def kernel(name: str) -> Callable:
+    """
+    Function: Gives a kernel of the current backend, compiling it if
+              needed. Numba keeps the compiled code in the __pycache__
+              folder, so the next processes load it instead of compiling.
+    Parameters: name -> 'dijkstra' or 'bidirectional'
+    Return: The kernel.
+    """
+    current = backend()
+    if current not in _kernels:
+        import numba
+        _kernels[current] = {
+            'dijkstra': numba.njit(cache=True)(_dijkstra),
+            'bidirectional': numba.njit(cache=True)(_bidirectional)}
+    return _kernels[current][name]
+
+
+def work(n: int, current: str) -> Tuple:
+    """
+    Function: Creates the work arrays of a search.
+    Parameters: n -> nodes of the graph
+                current -> the backend
+    Return: A distance array (infinite) and a parent array (-1).
+    """
+    if current == 'numba':
+        return np.full(n, INF), np.full(n, -1, dtype=np.int64)
+    return [INF] * n, [-1] * n
+
+
+def positions(csr: CSR, times: Dict, current: str) -> Tuple:
+    """
+    Function: Converts the starting nodes of a search into positions.
+    Parameters: csr -> the graph
+                times -> node -> starting time
+                current -> the backend
+    Return: The positions and the times.
+    """
+    nodes = [csr.index[n] for n in times]
+    starts = [float(t) for t in times.values()]
+    if current == 'numba':
+        return np.array(nodes, dtype=np.int64), np.array(starts)
+    return nodes, starts
+
+
+def distances(csr: CSR, sources: Dict, limit: Optional[float] = None
+              ) -> Dict:
+    """
+    Function: Computes the times from some sources to the nodes within a
+              time limit.
+    Parameters: csr -> the graph
+                sources -> node -> time at the node
+                limit -> largest time (None: no limit)
+    Return: The time of every node reached (node -> time).
+    """
+    current = backend()
+    dist, parent = work(len(csr.nodes), current)
+    order = work(len(csr.nodes), current)[1]
+    nodes, starts = positions(csr, sources, current)
+    settled = kernel('dijkstra')(*csr.arrays(current), nodes, starts,
+                                 INF if limit is None else float(limit),
+                                 dist, parent, order)
+    reached = order[:settled]
+    if current == 'numba':
+        return dict(zip([csr.nodes[i] for i in reached.tolist()],
+                        dist[reached].tolist()))
+    return {csr.nodes[i]: dist[i] for i in reached}
+
+
+def shortest_path(csr: CSR, sources: Dict, targets: Dict
+                  ) -> Tuple[float, List]:
+    """
+    Function: Finds the shortest path from some sources to some targets with
+              a bidirectional search.
+    Parameters: csr -> the graph
+                sources -> node -> time at the node
+                targets -> node -> time from the node to the end
+    Return: The time of the path (with the starting and ending times) and
+            its nodes, from a source to a target.
+    """
+    current = backend()
+    dist_f, parent_f = work(len(csr.nodes), current)
+    dist_b, parent_b = work(len(csr.nodes), current)
+    s, starts = positions(csr, sources, current)
+    t, ends = positions(csr, targets, current)
+    best, meet = kernel('bidirectional')(*csr.arrays(current), s, starts,
+                                         t, ends, dist_f, dist_b, parent_f,
+                                         parent_b)
+    if meet < 0:
+        raise nx.NetworkXNoPath("No path to the destination")
+    path = []
+    node = int(meet)
+    while node >= 0:
+        path.append(node)
+        node = int(parent_f[node])
+    path.reverse()
+    node = int(parent_b[meet])
+    while node >= 0:
+        path.append(node)
+        node = int(parent_b[node])
+    return float(best), [csr.nodes[i] for i in path]
+
+
+def warm() -> None:
+    """
+    Function: Compiles (or loads from the cache) the kernels of the current
+              backend on a small graph, so that the first search does not.
+    Parameters: None
+    Return: None.
+    """
+    g = nx.Graph()
+    g.add_edge(0, 1, time=1.0)
+    g.add_edge(1, 2, time=1.0)
+    csr = build(g)
+    distances(csr, {0: 0.0})
+    shortest_path(csr, {0: 0.0}, {2: 0.0})
@@ -0,0 +1,361 @@
+"""
+This module measures where the time of every bot command goes.
+Every command is timed as a request split in phases (snapping, shortest path,
+time sum, render, upload...), and some counters are kept (search candidates,
+cache hits and misses).
+The measures can be read as Prometheus text through a local HTTP port and,
+optionally, a JSON line is written for every request.
+"""
+
+# Library used to write the JSON log lines
+import json
+# Library used to measure elapsed time
+import time
+# Library used to protect the measures shared between threads
+import threading
+# Library used to serve the measures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+# Library used to define the context managers
+from contextlib import contextmanager
+# Library used to access different data types
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]   # Sorted (name, value) pairs
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS: List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                        5.0, 10.0, 30.0]
+PREFIX: str = 'metronyam_'
+
+
+class Histogram:
+    """
+    Class: Contains the count, the sum and the cumulative buckets of a
+           measure.
+    """
+
+    def __init__(self, buckets: List[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Function: Adds a new value to the histogram.
+        Parameters: value -> the measured value
+        Return: None.
+        """
+        self.count += 1
+        self.sum += value
+        for i in range(len(self.buckets)):
+            if value <= self.buckets[i]:
+                self.counts[i] += 1
+
+
+class Request:
+    """
+    Class: Contains the measures of a single command while it runs.
+    """
+
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.values: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Labels], float] = {}
+_histograms: Dict[Tuple[str, Labels], Histogram] = {}
+_gauges: Dict[Tuple[str, Labels], float] = {}
+_help: Dict[str, Tuple[str, str]] = {}
+_local = threading.local()
+_json_log: Optional[TextIO] = None
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, help: str = '', **labels) -> None:
+    """
+    Function: Increments a counter.
+    Parameters: name -> name of the counter
+                value -> amount added to the counter
+                help -> description shown in the Prometheus text
+                labels -> labels of the counter
+    Return: None.
+    """
+    key = (name, _labels(labels))
+    with _lock:
+        _help.setdefault(name, ('counter', help))
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def set_gauge(name: str, value: float, help: str = '', **labels) -> None:
+    """
+    Function: Sets the value of a gauge.
+    Parameters: name -> name of the gauge
+                value -> new value of the gauge
+                help -> description shown in the Prometheus text
+                labels -> labels of the gauge
+    Return: None.
+    """
+    with _lock:
+        _help.setdefault(name, ('gauge', help))
+        _gauges[(name, _labels(labels))] = value
+
+
+def observe(name: str, value: float, help: str = '',
+            buckets: Optional[List[float]] = None, **labels) -> None:
+    """
+    Function: Adds a value to a histogram.
+    Parameters: name -> name of the histogram
+                value -> the measured value
+                help -> description shown in the Prometheus text
+                buckets -> upper bounds of the buckets (latency by default)
+                labels -> labels of the histogram
+    Return: None.
+    """
+    key = (name, _labels(labels))
+    with _lock:
+        _help.setdefault(name, ('histogram', help))
+        if key not in _histograms:
+            _histograms[key] = Histogram(buckets or BUCKETS)
+        _histograms[key].observe(value)
+
+
+def cache_hit(cache: str, count: int = 1) -> None:
+    """
+    Function: Counts hits of a cache.
+    Parameters: cache -> name of the cache
+                count -> number of hits
+    Return: None.
+    """
+    inc('cache_requests_total', count, help='Cache lookups by result.',
+        cache=cache, result='hit')
+
+
+def cache_miss(cache: str, count: int = 1) -> None:
+    """
+    Function: Counts misses of a cache.
+    Parameters: cache -> name of the cache
+                count -> number of misses
+    Return: None.
+    """
+    inc('cache_requests_total', count, help='Cache lookups by result.',
+        cache=cache, result='miss')
+
+
+def current() -> Optional[Request]:
+    """
+    Function: Gives the request being measured in this thread.
+    Parameters: None
+    Return: The current Request or None if there is no request.
+    """
+    return getattr(_local, 'request', None)
+
+
+@contextmanager
+def request(command: str) -> Iterator[Request]:
+    """
+    Function: Measures a bot command. A request started inside another one
+              (for example /guide calling /time) is part of the outer one.
+    Parameters: command -> name of the command
+    Return: The Request being measured.
+    """
+    outer = current()
+    if outer is not None:
+        yield outer
+        return
+    req = Request(command)
+    _local.request = req
+    try:
+        yield req
+    except Exception as e:
+        req.error = type(e).__name__
+        raise
+    finally:
+        _local.request = None
+        _finish(req)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Function: Measures a phase of the current request. Does nothing more than
+              running the block if there is no request being measured.
+    Parameters: name -> name of the phase
+    Return: None.
+    """
+    req = current()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if req is not None:
+            elapsed = time.perf_counter() - start
+            req.phases[name] = req.phases.get(name, 0.0) + elapsed
+
+
+def record(name: str, value: float) -> None:
+    """
+    Function: Stores a value of the current request (for example the number
+              of search candidates), which is also added to a histogram.
+    Parameters: name -> name of the value
+                value -> the value
+    Return: None.
+    """
+    req = current()
+    if req is not None:
+        req.values[name] = value
+
+
+def _finish(req: Request) -> None:
+    """
+    Function: Adds the measures of a finished request to the metrics and
+              writes its JSON log line.
+    Parameters: req -> the finished request
+    Return: None.
+    """
+    elapsed = time.perf_counter() - req.start
+    status = 'ok' if req.error is None else 'error'
+    inc('commands_total', help='Bot commands handled.', command=req.command,
+        status=status)
+    observe('command_seconds', elapsed, help='Bot command latency.',
+            command=req.command)
+    for name, secs in req.phases.items():
+        observe('phase_seconds', secs, help='Bot command latency by phase.',
+                command=req.command, phase=name)
+    for name, value in req.values.items():
+        observe(name, value, help='Value recorded by bot commands.',
+                buckets=[0, 1, 5, 12, 50, 100, 500, 1000, 5000],
+                command=req.command)
+    if _json_log is not None:
+        line = {'ts': round(time.time(), 3), 'command': req.command,
+                'status': status, 'seconds': round(elapsed, 6),
+                'phases': {k: round(v, 6) for k, v in req.phases.items()}}
+        line.update(req.values)
+        if req.error is not None:
+            line['error'] = req.error
+        with _lock:
+            _json_log.write(json.dumps(line) + '\n')
+            _json_log.flush()
+
+
+def enable_json_log(stream: Optional[TextIO]) -> None:
+    """
+    Function: Writes a JSON line for every finished request into stream.
+    Parameters: stream -> where the lines are written (None to disable it)
+    Return: None.
+    """
+    global _json_log
+    _json_log = stream
+
+
+def _format_labels(labels: Labels, extra: Tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if len(pairs) == 0:
+        return ''
+    text = ','.join('{}="{}"'.format(k, str(v).replace('"', '\\"'))
+                    for k, v in pairs)
+    return '{' + text + '}'
+
+
+def prometheus_text() -> str:
+    """
+    Function: Writes all the metrics in the Prometheus text format.
+    Parameters: None
+    Return: The metrics as a string.
+    """
+    lines: List[str] = []
+    with _lock:
+        series: Dict[str, List[str]] = {}
+        for (name, labels), value in sorted(_counters.items()):
+            series.setdefault(name, []).append(
+                PREFIX + name + _format_labels(labels) + ' ' + repr(value))
+        for (name, labels), value in sorted(_gauges.items()):
+            series.setdefault(name, []).append(
+                PREFIX + name + _format_labels(labels) + ' ' + repr(value))
+        for (name, labels), h in sorted(_histograms.items(),
+                                        key=lambda item: item[0]):
+            rows = series.setdefault(name, [])
+            for bound, count in zip(h.buckets, h.counts):
+                rows.append(PREFIX + name + '_bucket' +
+                            _format_labels(labels, (('le', bound),)) + ' ' +
+                            str(count))
+            rows.append(PREFIX + name + '_bucket' +
+                        _format_labels(labels, (('le', '+Inf'),)) + ' ' +
+                        str(h.count))
+            rows.append(PREFIX + name + '_sum' + _format_labels(labels) +
+                        ' ' + repr(h.sum))
+            rows.append(PREFIX + name + '_count' + _format_labels(labels) +
+                        ' ' + str(h.count))
+        for name in sorted(series):
+            kind, help = _help[name]
+            lines.append('# HELP ' + PREFIX + name + ' ' + help)
+            lines.append('# TYPE ' + PREFIX + name + ' ' + kind)
+            lines += series[name]
+        lines += _hit_ratios()
+    return '\n'.join(lines) + '\n'
+
+
+def _hit_ratios() -> List[str]:
+    """
+    Function: Computes the hit ratio of every cache from its counters.
+    Parameters: None
+    Return: The Prometheus lines of the hit ratios.
+    """
+    totals: Dict[str, List[float]] = {}
+    for (name, labels), value in _counters.items():
+        if name == 'cache_requests_total':
+            info = dict(labels)
+            total = totals.setdefault(info['cache'], [0.0, 0.0])
+            total[0 if info['result'] == 'hit' else 1] += value
+    if len(totals) == 0:
+        return []
+    lines = ['# HELP ' + PREFIX + 'cache_hit_ratio Cache hits over lookups.',
+             '# TYPE ' + PREFIX + 'cache_hit_ratio gauge']
+    for cache in sorted(totals):
+        hits, misses = totals[cache]
+        if hits + misses == 0:
+            continue
+        lines.append(PREFIX + 'cache_hit_ratio{cache="' + cache + '"} ' +
+                     repr(hits / (hits + misses)))
+    return lines
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Class: Answers the HTTP requests of the metrics server.
+    """
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        # Scrapes are not written to the terminal
+        pass
+
+
+def serve(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """
+    Function: Serves the metrics in a background thread.
+    Parameters: port -> local port of the server (0 chooses a free one)
+                host -> address the server listens to
+    Return: The running server.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
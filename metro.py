@@ -8,20 +8,27 @@ Every type of node (station and access) and edge (access, link, railway) has
 its own attributes.
 """
 
+# Postpones the evaluation of annotations, so that the plotting classes
+# used in them do not have to be imported at startup
+from __future__ import annotations
 # Library used to initialize classes
 from dataclasses import dataclass
 # Library used to access different data types
-from typing import Optional, TextIO, List, Tuple, Dict
+from typing import Optional, TextIO, List, Tuple, Dict, TYPE_CHECKING
 # Library used to generate undirected graphs of networkx
 from typing_extensions import TypeAlias
+# Library used to check the cache files
+import os
 # Library used to read csv docs
 import pandas as pd
 # Library used to manipulate graphs
 import networkx as nx
-# Library used to draw a graph interactively
-import matplotlib.pyplot as plt
-# Library used to draw a graph on a picture
-from staticmap import StaticMap, Line, CircleMarker
+
+# matplotlib (used to draw a graph interactively) and staticmap (used to draw
+# a graph on a picture) are slow to import, so they are imported inside the
+# functions that need them
+if TYPE_CHECKING:
+    from staticmap import StaticMap
 
 Point: TypeAlias = Tuple[float, float]  # Tuple of a point (coord_x, coord_y)
 
@@ -60,34 +67,117 @@ Stations = List[Station]
 Accesses = List[Access]
 
 
+Table: TypeAlias = pd.DataFrame     # Columnar table of stations or accesses
+
+# Columns of the station and access tables and the csv columns they come from
+STATION_COLUMNS: Dict[str, str] = {'CODI_ESTACIO_LINIA': 'id',
+                                   'NOM_ESTACIO': 'name',
+                                   'NOM_LINIA': 'line',
+                                   'CODI_ESTACIO': 'code',
+                                   'ORDRE_ESTACIO': 'station_order',
+                                   'COLOR_LINIA': 'colour'}
+ACCESS_COLUMNS: Dict[str, str] = {'CODI_ACCES': 'id',
+                                  'NOM_ACCES': 'name',
+                                  'ID_ESTACIO': 'code',
+                                  'NOM_TIPUS_ACCESSIBILITAT': 'accessibility'}
+
+
+def parse_points(geometry: pd.Series) -> pd.DataFrame:
+    """
+    Function: Splits a whole column of Points (POINT (x_coord y_coord)) into
+              two float columns at once.
+    Parameters: geometry -> column of Points as strings
+    Return: A table with the columns x and y.
+    """
+    coords = geometry.str.extract(r'POINT\s*\(\s*(\S+)\s+(\S+)\s*\)')
+    coords.columns = ['x', 'y']
+    return coords.astype(float)
+
+
+def read_table(filename: str, columns: Dict[str, str],
+               cache: bool = False) -> Table:
+    """
+    Function: Reads a TMB csv file into a table with one column per
+              attribute, with the location split into the x and y columns.
+              With cache, the table is also saved in a feather file next to
+              the csv that is read instead of the csv while it is newer.
+    Parameters: filename -> csv file
+                columns -> csv columns to read and their new names
+                cache -> whether the feather cache is used
+    Return: The table.
+    """
+    cache_file = os.path.splitext(filename)[0] + '.feather'
+    if cache and os.path.exists(cache_file) and \
+            os.path.getmtime(cache_file) >= os.path.getmtime(filename):
+        try:
+            return pd.read_feather(cache_file)
+        except ImportError:
+            # pyarrow is not installed, the csv is read
+            pass
+        except (OSError, ValueError):
+            # The file is damaged (for example a write stopped halfway): it
+            # is removed and written again from the csv
+            remove(cache_file)
+    df = pd.read_csv(filename, usecols=list(columns) + ['GEOMETRY'])
+    table = df[list(columns)].rename(columns=columns)
+    table = pd.concat([table, parse_points(df['GEOMETRY'])], axis=1)
+    if cache:
+        try:
+            table.to_feather(cache_file)
+        except ImportError:
+            pass
+        except (OSError, ValueError):
+            # The folder cannot be written: a part written is not kept
+            remove(cache_file)
+    return table
+
+
+def remove(filename: str) -> None:
+    """
+    Function: Removes a file if it exists.
+    Parameters: filename -> the file
+    Return: None.
+    """
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+
+def read_stations_table(cache: bool = False) -> Table:
+    """
+    Function: Reads the station file into a table.
+    Parameters: cache -> whether the feather cache is used
+    Return: A table with the columns id, name, line, code, station_order,
+            colour, x and y.
+    """
+    table = read_table('estacions.csv', STATION_COLUMNS, cache)
+    table['colour'] = '#' + table['colour'].astype(str)
+    return table
+
+
+def read_accesses_table(cache: bool = False) -> Table:
+    """
+    Function: Reads the accesses file into a table.
+    Parameters: cache -> whether the feather cache is used
+    Return: A table with the columns id, name, code, accessibility, x and y.
+    """
+    return read_table('accessos.csv', ACCESS_COLUMNS, cache)
+
+
 def read_stations() -> Stations:
     """
     Function: Downloads and reads the station file.
     Parameters: None
     Return: A list of the stations in the csv.
     """
-    f = open('estacions.csv', 'r')
-    stations = []
-    id: str = 'CODI_ESTACIO_LINIA'
-    name: str = 'NOM_ESTACIO'
-    line: str = 'NOM_LINIA'
-    loc: str = 'GEOMETRY'
-    code: str = 'CODI_ESTACIO'
-    station_order: str = 'ORDRE_ESTACIO'
-    colour: str = 'COLOR_LINIA'
-
-    # Defines dataframe with the data of the csv
-    df = pd.read_csv(f, usecols=[id, name, line, loc, code, station_order,
-                                 colour])
-    # Creates a station with the information read in the dataframe and
-    # appends it into a list of stations
-    for row in df.itertuples():
-        point = get_location(row.GEOMETRY)
-        st = Station('station', row.CODI_ESTACIO_LINIA, row.NOM_ESTACIO,
-                     row.NOM_LINIA, point, row.CODI_ESTACIO, row.ORDRE_ESTACIO,
-                     "#"+row.COLOR_LINIA)
-        stations.append(st)
-    return stations
+    t = read_stations_table()
+    # Creates a station with every row of the table
+    return [Station('station', id, name, line, (x, y), code, order, colour)
+            for id, name, line, x, y, code, order, colour in
+            zip(t['id'].tolist(), t['name'].tolist(), t['line'].tolist(),
+                t['x'].tolist(), t['y'].tolist(), t['code'].tolist(),
+                t['station_order'].tolist(), t['colour'].tolist())]
 
 
 def read_accesses() -> Accesses:
@@ -96,24 +186,13 @@ def read_accesses() -> Accesses:
     Parameters: None
     Return: A list of the accesses in the csv.
     """
-    f = open('accessos.csv', 'r')
-    accesses = []
-    id:   str = 'CODI_ACCES'
-    name: str = 'NOM_ACCES'
-    loc:  str = 'GEOMETRY'
-    code: str = 'ID_ESTACIO'
-    accessibility: str = 'NOM_TIPUS_ACCESSIBILITAT'
-
-    # Defines dataframe with the data of the csv
-    df = pd.read_csv(f, usecols=[id, name, loc, code, accessibility])
-    # Creates an access with the information read in the dataframe and
-    # appends it into a list of accesses
-    for row in df.itertuples():
-        point = get_location(row.GEOMETRY)
-        ac = Access('access', row.CODI_ACCES, row.NOM_ACCES, point,
-                    row.ID_ESTACIO, row.NOM_TIPUS_ACCESSIBILITAT)
-        accesses.append(ac)
-    return accesses
+    t = read_accesses_table()
+    # Creates an access with every row of the table
+    return [Access('access', id, name, (x, y), code, accessibility)
+            for id, name, x, y, code, accessibility in
+            zip(t['id'].tolist(), t['name'].tolist(), t['x'].tolist(),
+                t['y'].tolist(), t['code'].tolist(),
+                t['accessibility'].tolist())]
 
 
 def get_location(loc: str) -> Point:
@@ -126,68 +205,72 @@ def get_location(loc: str) -> Point:
     return (float(coords[0]), float(coords[1]))
 
 
-def add_acces_node(G: MetroGraph, stations: List, accesses: List) -> None:
+def is_accessible(accessibility: str) -> bool:
     """
-    Function: Adds access nodes to the graph and accces edges from an access
-              point to a station.
-    Parameters: graph -> MetroGraph with stations as nodes
-                stations -> a list of stations
-                accesses -> a list of accesses that lead to stations
-    Return: None.
-    """
-    for access in accesses:
-        # Creates new node for an access point (ignores this action if this
-        # node already exists)
-        G.add_node(access.id, type=access.type, location=access.loc)
-        found = False
-        i = 0
-        while i < len(stations) and not found:
-            station = stations[i]
-            # If it is an access to that station, add access edge
-            if access.code == station.code:
-                G.add_edge(station.id, access.id, type='Access',
-                           colour='#000000')
-                found = True
-            i += 1
-
-
-def add_edges(G: MetroGraph, stations: List) -> None:
-    """
-    Function: Adds link edges and railway edges between stations.
-    Parameters: graph -> MetroGraph with stations as nodes
-                stations -> a list of stations
-    Return: None.
+    Function: Tells if an access is step-free from its accessibility type.
+    Parameters: accessibility -> NOM_TIPUS_ACCESSIBILITAT of the access
+    Return: True if the access is 'Accessible'.
     """
-    for station1 in stations:
-        for station2 in stations:
-            if station1.name == station2.name:
-                if station1.line != station2.line:
-                    G.add_edge(station1.id, station2.id, type='Link',
-                               colour='#000000')
-            # If stations with same line are consecutives, add railway edge
-            if int(station1.station_order) + 1 == int(station2.station_order):
-                if station1.line == station2.line:
-                    G.add_edge(station1.id, station2.id, type='Railway',
-                               colour=station1.colour)
+    return str(accessibility).strip().lower() == 'accessible'
 
 
-def get_metro_graph() -> MetroGraph:
+def get_metro_graph(cache: bool = False) -> MetroGraph:
     """
     Function: Creates a MetroGraph by adding nodes (station and access) and
               edges (link and railway) with all their information.
-    Parameters: None
+    Parameters: cache -> whether the feather cache of the csv files is used
     Return: A complete graph that represents Barcelona's metro network.
     """
-    stations = read_stations()
-    accesses = read_accesses()
+    return build_graph(read_stations_table(cache), read_accesses_table(cache))
+
+
+def build_graph(stations: Table, accesses: Table) -> MetroGraph:
+    """
+    Function: Creates a MetroGraph from the station and access tables.
+              The nodes and edges are computed on whole columns of the
+              tables and added to the graph at once.
+    Parameters: stations -> table of stations (see read_stations_table)
+                accesses -> table of accesses (see read_accesses_table)
+    Return: A complete graph that represents the metro network.
+    """
     G = nx.Graph()
-    for station in stations:
-        # Call networkx function
-        G.add_node(station.id, type=station.type, line=station.line,
-                   location=station.loc, name=station.name)
-    # Calls functions previously defined
-    add_acces_node(G, stations, accesses)
-    add_edges(G, stations)
+    # Station nodes
+    G.add_nodes_from(
+        (id, {'type': 'station', 'line': line, 'location': (x, y),
+              'name': name})
+        for id, line, x, y, name in
+        zip(stations['id'].tolist(), stations['line'].tolist(),
+            stations['x'].tolist(), stations['y'].tolist(),
+            stations['name'].tolist()))
+    # Access nodes and access edges to the first station with their code
+    G.add_nodes_from(
+        (id, {'type': 'access', 'location': (x, y),
+              'accessible': is_accessible(accessibility)})
+        for id, x, y, accessibility in
+        zip(accesses['id'].tolist(), accesses['x'].tolist(),
+            accesses['y'].tolist(), accesses['accessibility'].tolist()))
+    first = stations.drop_duplicates('code')[['code', 'id']]
+    access_edges = accesses[['code', 'id']].merge(first, on='code',
+                                                  suffixes=('', '_station'))
+    G.add_edges_from(zip(access_edges['id_station'].tolist(),
+                         access_edges['id'].tolist()),
+                     type='Access', colour='#000000')
+    # Link edges between stations with the same name in different lines
+    numbered = stations.assign(position=range(len(stations)))
+    pairs = numbered.merge(numbered, on='name')
+    pairs = pairs[(pairs['position_x'] < pairs['position_y']) &
+                  (pairs['line_x'] != pairs['line_y'])]
+    G.add_edges_from(zip(pairs['id_x'].tolist(), pairs['id_y'].tolist()),
+                     type='Link', colour='#000000')
+    # Railway edges between consecutive stations of the same line
+    following = numbered.assign(
+        station_order=numbered['station_order'].astype(int) - 1)
+    numbered['station_order'] = numbered['station_order'].astype(int)
+    pairs = numbered.merge(following, on=['line', 'station_order'])
+    G.add_edges_from((u, v, {'type': 'Railway', 'colour': colour})
+                     for u, v, colour in zip(pairs['id_x'].tolist(),
+                                             pairs['id_y'].tolist(),
+                                             pairs['colour_x'].tolist()))
     return G
 
 
@@ -197,6 +280,7 @@ def show(G: MetroGraph) -> None:
     Parameters: graph -> MetroGraph that will be displayed
     Return: A graphic representation of the metro graph.
     """
+    import matplotlib.pyplot as plt
     # Calls networkx and matplotlib.pyplot functions
     coords = nx.get_node_attributes(G, 'location')
     nx.draw(G, coords, node_size=10)
@@ -211,6 +295,7 @@ def plot(G: MetroGraph, filename: str) -> StaticMap:
                 filename -> file containing the final image
     Return: An image file of a graphic representation of a graph in a map.
     """
+    from staticmap import StaticMap
     # Gets StaticMap image
     map = StaticMap(2500, 3000, 80)
     # Calls functions defined below
@@ -227,6 +312,7 @@ def print_lines(map: StaticMap, G: MetroGraph) -> StaticMap:
                 graph -> MetroGraph with the edges to be printed as lines
     Return: A map with the graph's edges as lines.
     """
+    from staticmap import Line
     for edge in G.edges:
         # Tuples = (Points, colour, width)
         if G.edges[edge[0], edge[1]]["type"] == "Access":
@@ -251,6 +337,7 @@ def print_circles(map: StaticMap, G: MetroGraph) -> StaticMap:
                 graph -> MetroGraph with the nodes to be printed as circles
     Return: A map with the graph's nodes as circles.
     """
+    from staticmap import CircleMarker
     for node in G.nodes:
         # Tuples = (Points, colour, width)
         circle = CircleMarker(G.nodes[node]["location"], "#FB0006", 7)
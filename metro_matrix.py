@@ -0,0 +1,341 @@
+"""
+This module precomputes the travel time between every pair of transit nodes
+of the city graph (metro stations and accesses, and the stops of the GTFS
+feeds) and the next transit node of every fastest path, stored as NumPy
+arrays. The times are searched on the whole city graph, so a path can leave
+the metro, walk and enter it again. A trip is then a walk to a transit node,
+a lookup in the matrix and a walk from a transit node, instead of a search
+over the whole city graph.
+"""
+
+# Library used to initialize classes
+from dataclasses import dataclass
+# Library used to access different data types
+from typing import Dict, List, Optional, Tuple
+# Library used to access, read or write files
+import os.path
+# Library used to store the matrices
+import numpy as np
+# Library used to manipulate graphs
+import networkx as nx
+# Library used to calculate distances between two points
+import haversine as hs
+# Library used to access the city graph functions
+import city
+# Library used to walk on the streets of the city graph
+import transit
+# Library used to detect that the stored matrices belong to another graph
+import alt
+import sessions
+
+# Types of the transit nodes of the city graph
+NODE_TYPES: Tuple[str, ...] = ('station', 'access', 'stop')
+# Longest walk (seconds) to a transit node or from a transit node
+MAX_WALK: float = 15 * 60
+# Nodes added by the searches, which are not part of the matrices
+ADDITIONAL: Tuple[str, str] = ('src', 'dst')
+# Relative error of the float32 times of the matrices
+ROUNDING: float = 1e-5
+
+
+@dataclass
+class MetroMatrix:
+    """
+    Class: Contains the travel time between every pair of transit nodes and
+           the next transit node of the fastest path between them.
+    """
+    nodes: List[city.NodeID]    # Transit nodes in the order of the matrices
+    times: np.ndarray           # float32 (nodes x nodes), seconds
+    next: np.ndarray            # int32 (nodes x nodes), -1 if no path
+    version: int                # Version of the graph when computed
+    key: str                    # Fingerprint and hash of the times
+
+    def __post_init__(self) -> None:
+        self.index: Dict[city.NodeID, int] = {n: i for i, n
+                                              in enumerate(self.nodes)}
+
+    def valid(self, g: city.CityGraph) -> bool:
+        """
+        Function: Tells if the matrices can still be used with a graph: if
+                  the graph was updated, the times could be wrong.
+        Parameters: g -> City graph
+        Return: True if the graph did not change since the matrices were
+                computed.
+        """
+        return g.graph.get('version', 0) == self.version
+
+    def path(self, g: city.CityGraph, a: city.NodeID,
+             b: city.NodeID) -> city.Path:
+        """
+        Function: Rebuilds the fastest path between two transit nodes from
+                  the next node matrix. Two consecutive transit nodes of the
+                  path are joined by an edge or by a walk on the streets.
+        Parameters: g -> City graph
+                    a -> first node
+                    b -> last node
+        Return: The path, empty if b cannot be reached from a.
+        """
+        i, j = self.index[a], self.index[b]
+        if self.next[i, j] < 0:
+            return []
+        path = [a]
+        # The path has at most one step per transit node (a step of zero
+        # seconds could otherwise go back and forth)
+        for step in range(len(self.nodes)):
+            if i == j:
+                break
+            k = int(self.next[i, j])
+            u, v = self.nodes[i], self.nodes[k]
+            time = float(self.times[i, k])
+            if g.has_edge(u, v) and \
+                    g.edges[u, v]['time'] <= time + ROUNDING * (1 + time):
+                path.append(v)
+            else:
+                path += nx.bidirectional_dijkstra(
+                    g, u, v, weight=transit.walk_weight)[1][1:]
+            i = k
+        return path
+
+    def nbytes(self) -> int:
+        """
+        Function: Gives the memory used by the matrices.
+        Parameters: None
+        Return: The size of the arrays in bytes.
+        """
+        return self.times.nbytes + self.next.nbytes
+
+
+def transit_nodes(g: city.CityGraph) -> List[city.NodeID]:
+    """
+    Function: Gives the transit nodes of a city graph.
+    Parameters: g -> City graph
+    Return: The list of nodes, in the order of the graph.
+    """
+    return [n for n, data in g.nodes(data=True)
+            if data.get('type') in NODE_TYPES]
+
+
+def graph_key(g: city.CityGraph) -> str:
+    """
+    Function: Summarises a graph to detect that stored matrices belong to
+              another graph or to the same one with other times.
+    Parameters: g -> City graph
+    Return: The fingerprint of the nodes and the hash of the times.
+    """
+    return sessions.fingerprint(g) + alt.times_hash(g)
+
+
+def time_weight(u, v, data: Dict) -> Optional[float]:
+    """
+    Function: Weight of the edges of the matrix searches, which do not use
+              the src and dst nodes of a search.
+    Parameters: u, v -> nodes of the edge
+                data -> attributes of the edge
+    Return: The travel time or None if the edge belongs to a search.
+    """
+    if u in ADDITIONAL or v in ADDITIONAL:
+        return None
+    return data['time']
+
+
+def build_matrix(g: city.CityGraph) -> MetroMatrix:
+    """
+    Function: Computes the matrices with a Dijkstra search on the whole city
+              graph from every transit node. The next transit node of a path
+              is carried along the tree of every search, in the order in
+              which the nodes are settled.
+    Parameters: g -> City graph
+    Return: The matrices.
+    """
+    nodes = transit_nodes(g)
+    index = {n: i for i, n in enumerate(nodes)}
+    size = len(nodes)
+    times = np.full((size, size), np.inf, dtype=np.float32)
+    following = np.full((size, size), -1, dtype=np.int32)
+    for i, a in enumerate(nodes):
+        pred, dist = nx.dijkstra_predecessor_and_distance(g, a,
+                                                          weight=time_weight)
+        # First transit node after a on the path to every node (i while
+        # the path has not reached any)
+        first = {a: i}
+        for v, time in dist.items():
+            if v == a:
+                continue
+            hop = first[pred[v][0]]
+            if hop == i:
+                hop = index.get(v, i)
+            first[v] = hop
+            j = index.get(v)
+            if j is not None:
+                times[i, j] = time
+                following[i, j] = hop
+        times[i, i] = 0
+        following[i, i] = i
+    return MetroMatrix(nodes, times, following, g.graph.get('version', 0),
+                       graph_key(g))
+
+
+def save(matrix: MetroMatrix, filename: str) -> None:
+    """
+    Function: Saves the matrices into a numpy file. The nodes are stored as
+              text, with a mark of the ones that are numbers.
+    Parameters: matrix -> the matrices
+                filename -> the .npz file
+    Return: None.
+    """
+    np.savez(filename, nodes=np.array([str(n) for n in matrix.nodes]),
+             numeric=np.array([not isinstance(n, str)
+                               for n in matrix.nodes]),
+             times=matrix.times, next=matrix.next, key=matrix.key)
+
+
+def load(filename: str) -> MetroMatrix:
+    """
+    Function: Reads the matrices saved with save. The version is the one of
+              a graph that was never updated.
+    Parameters: filename -> the .npz file
+    Return: The matrices.
+    """
+    with np.load(filename) as data:
+        nodes = [int(n) if numeric else str(n)
+                 for n, numeric in zip(data['nodes'].tolist(),
+                                       data['numeric'].tolist())]
+        key = str(data['key']) if 'key' in data.files else ''
+        return MetroMatrix(nodes, data['times'], data['next'], 0, key)
+
+
+def get_matrix(g: city.CityGraph, filename: str) -> MetroMatrix:
+    """
+    Function: Reads the matrices from a file or computes them and saves them
+              if the file does not exist or belongs to another graph (or to
+              the same one with other times).
+    Parameters: g -> City graph
+                filename -> the .npz file
+    Return: The matrices.
+    """
+    if os.path.exists(filename):
+        matrix = load(filename)
+        if matrix.key == graph_key(g):
+            matrix.version = g.graph.get('version', 0)
+            return matrix
+    matrix = build_matrix(g)
+    save(matrix, filename)
+    return matrix
+
+
+def metro_trip(g: city.CityGraph, matrix: MetroMatrix,
+               nearest: List[city.NodeID],
+               limit: float, crow: float) -> Tuple[city.Path, float, float]:
+    """
+    Function: Finds the fastest trip that walks to a transit node, follows
+              the matrix and walks from a transit node, with walks shorter
+              than a limit, choosing the best pair of transit nodes at once
+              on the matrix.
+    Parameters: g -> City graph
+                matrix -> the transit matrices
+                nearest -> street nodes of the source and the destiny
+                limit -> longest walk (seconds) at each end
+                crow -> walking time in a straight line between the nodes
+    Return: The path between the street nodes, its travel time (infinite if
+            there is no trip) and a lower bound of the time of the trips
+            that were not seen (with a longer walk).
+    """
+    pred_src, walk_src = transit.walk(g, nearest[0], limit)
+    pred_dst, walk_dst = transit.walk(g, nearest[1], limit)
+    first = [(matrix.index[n], t) for n, t in walk_src.items()
+             if n in matrix.index]
+    last = [(matrix.index[n], t) for n, t in walk_dst.items()
+            if n in matrix.index]
+    best, path = np.inf, []
+    if len(first) > 0 and len(last) > 0:
+        rows = np.array([i for i, t in first])
+        columns = np.array([j for j, t in last])
+        totals = (np.array([t for i, t in first])[:, None] +
+                  matrix.times[np.ix_(rows, columns)] +
+                  np.array([t for j, t in last])[None, :])
+        i, j = np.unravel_index(np.argmin(totals), totals.shape)
+        if np.isfinite(totals[i, j]):
+            best = float(totals[i, j])
+            a, b = matrix.nodes[rows[i]], matrix.nodes[columns[j]]
+            path = (transit.walk_path(pred_src, a)[:-1] +
+                    matrix.path(g, a, b) +
+                    transit.walk_path(pred_dst, b)[-2::-1])
+    # A trip with a longer walk at one end walks at least the nearest
+    # transit node at the other end; walking all the way is at least crow
+    bound = limit + min(min([t for i, t in first], default=limit),
+                        min([t for j, t in last], default=limit))
+    if nearest[1] in walk_src:
+        if walk_src[nearest[1]] <= best:
+            best = walk_src[nearest[1]]
+            path = transit.walk_path(pred_src, nearest[1])
+    else:
+        bound = min(bound, max(limit, crow))
+    return path, best, bound
+
+
+def find_path(ox_g: city.OsmnxGraph, g: city.CityGraph, matrix: MetroMatrix,
+              src: city.Coord, dst: city.Coord) -> Tuple[city.Path, float]:
+    """
+    Function: Finds the fastest path as a walk to a transit node, a trip
+              of the matrix and a walk from a transit node, or as a walk if
+              it is faster. The walks are first searched up to MAX_WALK: if
+              the trip found is not longer than the bound of the trips with
+              longer walks, it is the fastest one. Otherwise they are
+              searched again up to the time of the trip found. If the graph
+              was updated after the matrices were computed, the path is
+              searched with city.find_path.
+    Parameters: ox_g -> Barcelona's streets graph
+                g -> City graph (merge of street and metro graphs)
+                matrix -> the transit matrices
+                src -> Coordinate of the starting point
+                dst -> Coordinate of the final point
+    Return: The path (between the src and dst nodes, as city.find_path) and
+            its travel time.
+    """
+    if not matrix.valid(g):
+        path = city.find_path(ox_g, g, src, dst)
+        return path, city.time(g, path)
+    nearest = city.add_additional_nodes(ox_g, g, src, dst)
+    first = g.nodes[nearest[0]]['location']
+    last = g.nodes[nearest[1]]['location']
+    crow = hs.haversine((first[1], first[0]), (last[1], last[0]),
+                        unit='m') / city.get_speed('Street')
+    path, best, bound = metro_trip(g, matrix, nearest, MAX_WALK, crow)
+    if best > bound:
+        # Walking all the way is an upper bound of the trip
+        if not np.isfinite(best):
+            try:
+                best = nx.bidirectional_dijkstra(
+                    g, nearest[0], nearest[1], weight=transit.walk_weight)[0]
+            except nx.NetworkXNoPath:
+                path = nx.shortest_path(g, "src", "dst", weight="time")
+                return path, city.time(g, path)
+        path, best, bound = metro_trip(g, matrix, nearest, best, crow)
+    # The time of the path itself, as the matrix times are float32
+    path = ['src'] + path + ['dst']
+    return path, city.time(g, path)
+
+
+def validate(ox_g: city.OsmnxGraph, g: city.CityGraph, matrix: MetroMatrix,
+             pairs: List[Tuple[city.Coord, city.Coord]]) -> Dict[str, float]:
+    """
+    Function: Compares the travel times of the matrix paths with the ones of
+              the Dijkstra search on the whole city graph.
+    Parameters: ox_g -> Barcelona's streets graph
+                g -> City graph (merge of street and metro graphs)
+                matrix -> the transit matrices
+                pairs -> list of (origin, destination) coordinates
+    Return: The number of pairs, the part with the same time and the
+            largest difference in seconds.
+    """
+    same, worst = 0, 0.0
+    for src, dst in pairs:
+        path, time = find_path(ox_g, g, matrix, src, dst)
+        dijkstra = city.time(g, city.find_path(ox_g, g, src, dst))
+        # The pair of transit nodes is chosen with the float32 times
+        if time - dijkstra <= ROUNDING * (1 + dijkstra):
+            same += 1
+        worst = max(worst, time - dijkstra)
+    city.delete_additional_nodes(g)
+    return {'pairs': len(pairs), 'same': same / max(len(pairs), 1),
+            'max_difference_s': worst}
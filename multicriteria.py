@@ -0,0 +1,159 @@
+"""
+This module finds routes of the city graph that are not only the fastest:
+routes with step-free accesses only, with the fewest transfers between lines
+or with the least walking. A single multi-label search finds all the Pareto
+optimal routes for (travel time, transfers, walking time) at once, and every
+mode chooses one of them.
+"""
+
+# Library used to initialize classes
+from dataclasses import dataclass
+# Library used to access different data types
+from typing import Callable, Dict, List, Tuple
+# Library used to choose the next label of the search
+import heapq
+# Library used to manipulate graphs
+import networkx as nx
+# Library used to access the city graph functions
+import city
+# Library used to measure the phases of the bot commands
+import metrics
+
+# Walking times in the same bucket (seconds) are considered equal when
+# comparing routes, otherwise almost any route would be Pareto optimal
+WALK_BUCKET: float = 60.0
+# Routes slower than the fastest one by this factor are not searched
+MAX_DETOUR: float = 1.5
+
+
+@dataclass
+class Option:
+    """
+    Class: Contains a Pareto optimal route and its criteria.
+    """
+    path: city.Path
+    time: float             # Travel time in seconds
+    transfers: int          # Number of Link edges
+    walking: float          # Seconds walked on the streets
+
+
+# Mode -> (only step-free accesses, key to choose the option)
+MODES: Dict[str, Tuple[bool, Callable[[Option], tuple]]] = {
+    'fastest': (False, lambda o: (o.time,)),
+    'accessible': (True, lambda o: (o.time,)),
+    'transfers': (False, lambda o: (o.transfers, o.time)),
+    'walking': (False, lambda o: (o.walking, o.time))}
+
+
+def dominates(a: Tuple, b: Tuple) -> bool:
+    """
+    Function: Tells if a route is at least as good as another in every
+              criterion.
+    Parameters: a, b -> (time, transfers, walking) of the routes
+    Return: True if a dominates b.
+    """
+    return a[0] <= b[0] and a[1] <= b[1] and \
+        a[2] // WALK_BUCKET <= b[2] // WALK_BUCKET
+
+
+def pareto_search(g: city.CityGraph, source: city.NodeID,
+                  target: city.NodeID,
+                  accessible: bool = False) -> List[Option]:
+    """
+    Function: Multi-label search: every node keeps the labels (time,
+              transfers, walking) that are not dominated by another label of
+              the node or of the target. Labels are expanded in time order,
+              so the first one that reaches the target is the fastest route
+              and bounds how slow the other routes can be.
+    Parameters: g -> City graph
+                source -> first node of the routes
+                target -> last node of the routes
+                accessible -> if True, accesses that are not step-free
+                              cannot be used
+    Return: The Pareto optimal routes sorted by time.
+    """
+    # Labels: (time, transfers, walking), node and previous label
+    criteria: List[Tuple[float, int, float]] = [(0.0, 0, 0.0)]
+    nodes: List[city.NodeID] = [source]
+    parents: List[int] = [-1]
+    alive: List[bool] = [True]
+    bags: Dict[city.NodeID, List[int]] = {source: [0]}
+    found: List[int] = []
+    limit = float('inf')
+    heap = [(0.0, 0, 0.0, 0)]
+    while len(heap) > 0:
+        time, transfers, walking, label = heapq.heappop(heap)
+        if not alive[label]:
+            continue
+        node = nodes[label]
+        if node == target:
+            if len(found) == 0:
+                limit = time * MAX_DETOUR
+            found.append(label)
+            continue
+        for v, data in g[node].items():
+            if accessible and not g.nodes[v].get('accessible', True):
+                continue
+            kind = data['attributes'].type
+            new = (time + data['time'], transfers + (kind == 'Link'),
+                   walking + (data['time'] if kind == 'Street' else 0.0))
+            if new[0] > limit or \
+                    any(dominates(criteria[i], new) for i in found):
+                continue
+            bag = bags.setdefault(v, [])
+            if any(dominates(criteria[i], new) for i in bag):
+                continue
+            for i in bag:
+                if dominates(new, criteria[i]):
+                    alive[i] = False
+            bag[:] = [i for i in bag if alive[i]]
+            bag.append(len(criteria))
+            heapq.heappush(heap, new + (len(criteria),))
+            criteria.append(new)
+            nodes.append(v)
+            parents.append(label)
+            alive.append(True)
+    options: List[Option] = []
+    for label in found:
+        path: city.Path = []
+        i = label
+        while i >= 0:
+            path.append(nodes[i])
+            i = parents[i]
+        time, transfers, walking = criteria[label]
+        options.append(Option(path[::-1], time, transfers, walking))
+    return options
+
+
+def find_paths(ox_g: city.OsmnxGraph, g: city.CityGraph, src: city.Coord,
+               dst: city.Coord, accessible: bool = False) -> List[Option]:
+    """
+    Function: Finds the Pareto optimal routes from source to destiny.
+    Parameters: ox_g -> Barcelona's streets graph
+                g -> City graph (merge of street and metro graphs)
+                src -> Coordinate of the starting point
+                dst -> Coordinate of the final point
+                accessible -> if True, only step-free accesses are used
+    Return: The Pareto optimal routes sorted by time.
+    """
+    city.add_additional_nodes(ox_g, g, src, dst)
+    with metrics.phase('pareto search'):
+        return pareto_search(g, 'src', 'dst', accessible)
+
+
+def find_path(ox_g: city.OsmnxGraph, g: city.CityGraph, src: city.Coord,
+              dst: city.Coord, mode: str = 'fastest') -> city.Path:
+    """
+    Function: Finds the best path from source to destiny for a mode.
+    Parameters: ox_g -> Barcelona's streets graph
+                g -> City graph (merge of street and metro graphs)
+                src -> Coordinate of the starting point
+                dst -> Coordinate of the final point
+                mode -> one of MODES
+    Return: Returns a Path.
+    """
+    accessible, key = MODES[mode]
+    options = find_paths(ox_g, g, src, dst, accessible)
+    if len(options) == 0:
+        raise nx.NetworkXNoPath("No {} path to the destination".format(mode))
+    return min(options, key=key).path
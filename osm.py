@@ -0,0 +1,316 @@
+"""
+This module builds the street graph of Barcelona from a local OpenStreetMap
+extract, without network access: an .osm XML file (also compressed as .gz
+or .bz2), read element by element so the whole XML is never in memory, or an
+.osm.pbf file, read with pyosmium if it is installed.
+The coordinates of the nodes and the nodes of the walkable ways (the same
+filter as the osmnx walk network) are kept in compact arrays. The nodes
+where the ways end or cross are kept as crossroads and the ways are split
+into edges between them, with their length computed from all the nodes in
+between, as the simplified graphs of osmnx. The result is the graph saved
+in graf.npz.
+Usage: python3 osm.py <extract.osm | extract.osm.pbf> [graf.npz]
+"""
+
+# Library used to read the command line arguments
+import argparse
+# Library used to initialize classes
+from dataclasses import dataclass
+# Library used to access different data types
+from typing import Dict, List, Optional
+# Library used to keep the nodes and ways compactly while reading
+from array import array
+# Library used to read the XML files element by element
+import xml.etree.ElementTree as ET
+# Library used to read the compressed XML files
+import bz2
+import gzip
+# Library used to measure the build time and the peak memory
+import time
+import resource
+# Library used to compute the lengths of the edges
+import numpy as np
+# Library used to manipulate graphs
+import networkx as nx
+# Library used to save the street graph
+import city
+
+# Values of the highway tag of the ways that cannot be walked (the osmnx
+# walk network filter)
+NOT_WALKABLE = ('abandoned', 'bus_guideway', 'construction', 'cycleway',
+                'motor', 'no', 'planned', 'platform', 'proposed', 'raceway',
+                'razed')
+# Mean radius of the Earth (meters), the one used by osmnx
+EARTH: float = 6371008.8
+
+
+def walkable(tags: Dict[str, str]) -> bool:
+    """
+    Function: Tells if a way is in the walk network, as osmnx filters it.
+    Parameters: tags -> tags of the way
+    Return: True if it can be walked.
+    """
+    highway = tags.get('highway')
+    if highway is None or any(word in highway for word in NOT_WALKABLE):
+        return False
+    return tags.get('area') != 'yes' and tags.get('foot') != 'no' and \
+        tags.get('service') != 'private' and \
+        tags.get('access') != 'private'
+
+
+class Collector:
+    """
+    Class: Contains the nodes and the walkable ways read from an extract, in
+           compact arrays.
+    """
+
+    def __init__(self) -> None:
+        self.ids = array('q')       # Identifier of every node
+        self.lat = array('d')       # Latitude of every node
+        self.lon = array('d')       # Longitude of every node
+        self.ways = array('q')      # Identifier of every walkable way
+        self.refs = array('q')      # Nodes of all the ways, one after other
+        self.ends = array('q')      # End of the nodes of every way in refs
+
+    def add_node(self, id: int, lat: float, lon: float) -> None:
+        """
+        Function: Keeps the coordinates of a node.
+        Parameters: id -> identifier of the node
+                    lat, lon -> coordinates of the node
+        Return: None.
+        """
+        self.ids.append(id)
+        self.lat.append(lat)
+        self.lon.append(lon)
+
+    def add_way(self, id: int, refs: List[int],
+                tags: Dict[str, str]) -> None:
+        """
+        Function: Keeps the nodes of a way if it is walkable.
+        Parameters: id -> identifier of the way
+                    refs -> identifiers of its nodes, in order
+                    tags -> tags of the way
+        Return: None.
+        """
+        if len(refs) > 1 and walkable(tags):
+            self.ways.append(id)
+            self.refs.extend(refs)
+            self.ends.append(len(self.refs))
+
+
+def open_xml(filename: str):
+    """
+    Function: Opens an XML extract, compressed or not.
+    Parameters: filename -> the .osm, .osm.gz or .osm.bz2 file
+    Return: The open binary file.
+    """
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+    if filename.endswith('.bz2'):
+        return bz2.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def read_xml(filename: str) -> Collector:
+    """
+    Function: Reads the nodes and walkable ways of an XML extract, removing
+              every element from memory once it is read.
+    Parameters: filename -> the XML extract
+    Return: The collected nodes and ways.
+    """
+    collector = Collector()
+    with open_xml(filename) as f:
+        root = None
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if root is None:
+                root = elem
+            if event != 'end':
+                continue
+            if elem.tag == 'node':
+                collector.add_node(int(elem.get('id')),
+                                   float(elem.get('lat')),
+                                   float(elem.get('lon')))
+            elif elem.tag == 'way':
+                refs = [int(nd.get('ref')) for nd in elem.iter('nd')]
+                tags = {tag.get('k'): tag.get('v')
+                        for tag in elem.iter('tag')}
+                collector.add_way(int(elem.get('id')), refs, tags)
+            elif elem.tag != 'relation':
+                continue
+            # The element was read: it is removed from the tree
+            root.clear()
+    return collector
+
+
+def read_pbf(filename: str) -> Collector:
+    """
+    Function: Reads the nodes and walkable ways of a PBF extract.
+    Parameters: filename -> the .osm.pbf extract
+    Return: The collected nodes and ways.
+    """
+    try:
+        import osmium
+    except ImportError:
+        raise ImportError("Reading .osm.pbf files needs pyosmium "
+                          "(pip3 install osmium), or use an .osm file")
+    collector = Collector()
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n) -> None:
+            collector.add_node(n.id, n.location.lat, n.location.lon)
+
+        def way(self, w) -> None:
+            collector.add_way(w.id, [nd.ref for nd in w.nodes],
+                              {tag.k: tag.v for tag in w.tags})
+
+    Handler().apply_file(filename)
+    return collector
+
+
+def build(collector: Collector) -> city.OsmnxGraph:
+    """
+    Function: Builds the street graph from the collected nodes and ways. The
+              ways with nodes missing from the extract (cut by its border)
+              are left out.
+    Parameters: collector -> the nodes and ways
+    Return: The street graph, with the attributes of the osmnx graphs used
+            by the bot (x and y of the nodes, length of the edges).
+    """
+    ids = np.frombuffer(collector.ids, dtype=np.int64)
+    lat = np.frombuffer(collector.lat, dtype=np.float64)
+    lon = np.frombuffer(collector.lon, dtype=np.float64)
+    if len(ids) > 1 and np.any(ids[1:] < ids[:-1]):
+        order = np.argsort(ids, kind='stable')
+        ids, lat, lon = ids[order], lat[order], lon[order]
+    refs = np.frombuffer(collector.refs, dtype=np.int64)
+    ends = np.frombuffer(collector.ends, dtype=np.int64)
+    starts = np.concatenate([[0], ends[:-1]]).astype(np.int64)
+    ways = np.frombuffer(collector.ways, dtype=np.int64)
+    # Position of every node of the ways in the node arrays
+    nodes = np.minimum(np.searchsorted(ids, refs), max(len(ids) - 1, 0))
+    found = ids[nodes] == refs if len(ids) > 0 else np.zeros(0, bool)
+    way = np.repeat(np.arange(len(ends)), ends - starts)
+    complete = np.ones(len(ends), dtype=bool)
+    complete[way[~found]] = False
+    keep = complete[way]
+    nodes, way = nodes[keep], way[keep]
+    starts = np.flatnonzero(np.concatenate([[True], way[1:] != way[:-1]]))
+    ends = np.concatenate([starts[1:], [len(way)]])
+    # The crossroads: the ends of the ways and the nodes of several ways
+    # (or twice in the same one)
+    kept = np.bincount(nodes, minlength=len(ids)) > 1
+    kept[nodes[starts]] = True
+    kept[nodes[ends - 1]] = True
+    # Length from the beginning of its way at every node of the ways
+    a, b = nodes[:-1], nodes[1:]
+    step = haversine(lat[a], lon[a], lat[b], lon[b])
+    step[way[1:] != way[:-1]] = 0.0
+    along = np.concatenate([[0.0], np.cumsum(step)])
+    # Every edge goes from a crossroad to the next one of the same way
+    crossroads = np.flatnonzero(kept[nodes])
+    same = way[crossroads[1:]] == way[crossroads[:-1]]
+    first, last = crossroads[:-1][same], crossroads[1:][same]
+    u, v = ids[nodes[first]], ids[nodes[last]]
+    length = along[last] - along[first]
+    osmid = ways[way[first]]
+    loop = u == v
+    u, v, length, osmid = u[~loop], v[~loop], length[~loop], osmid[~loop]
+    g = nx.MultiDiGraph(crs='epsg:4326')
+    used = np.unique(np.concatenate([u, v]))
+    where = np.searchsorted(ids, used)
+    g.add_nodes_from((int(n), {'x': float(x), 'y': float(y)})
+                     for n, x, y in zip(used.tolist(), lon[where].tolist(),
+                                        lat[where].tolist()))
+    # The walk network can be walked in both directions
+    for s, t in ((u, v), (v, u)):
+        g.add_edges_from((int(p), int(q), {'osmid': int(w),
+                                           'length': float(d)})
+                         for p, q, w, d in zip(s.tolist(), t.tolist(),
+                                               osmid.tolist(),
+                                               length.tolist()))
+    return g
+
+
+def haversine(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray,
+              lon2: np.ndarray) -> np.ndarray:
+    """
+    Function: Computes the great circle distances between pairs of points.
+    Parameters: lat1, lon1 -> first points (degrees)
+                lat2, lon2 -> second points (degrees)
+    Return: The distances (meters).
+    """
+    lat1, lon1 = np.radians(lat1), np.radians(lon1)
+    lat2, lon2 = np.radians(lat2), np.radians(lon2)
+    h = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+@dataclass
+class OsmReport:
+    """
+    Class: Contains the result of a build from an extract.
+    """
+    nodes: int              # Nodes of the street graph
+    edges: int              # Edges of the street graph (both directions)
+    ways: int               # Walkable ways read
+    seconds: float          # Time of the build
+    peak_mb: float          # Peak resident memory of the process
+
+
+def build_graph(filename: str, output: Optional[str] = None
+                ) -> city.OsmnxGraph:
+    """
+    Function: Builds the street graph of an extract and saves it.
+    Parameters: filename -> the .osm (.gz, .bz2) or .osm.pbf extract
+                output -> file where the graph is saved (None: not saved)
+    Return: The street graph.
+    """
+    if filename.endswith('.pbf'):
+        collector = read_pbf(filename)
+    else:
+        collector = read_xml(filename)
+    ways = len(collector.ways)
+    g = build(collector)
+    g.graph['ways'] = ways
+    if output is not None:
+        city.save_osmnx_graph(g, output)
+    return g
+
+
+def report(filename: str, output: Optional[str] = None) -> OsmReport:
+    """
+    Function: Builds the street graph of an extract and measures it.
+    Parameters: filename -> the extract
+                output -> file where the graph is saved (None: not saved)
+    Return: The report of the build.
+    """
+    start = time.perf_counter()
+    g = build_graph(filename, output)
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return OsmReport(g.number_of_nodes(), g.number_of_edges(),
+                     g.graph['ways'], seconds, peak)
+
+
+def main() -> None:
+    """
+    Function: Builds graf.npz from an extract given in the command line.
+    Parameters: None (command line arguments)
+    Return: None.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('extract', help='.osm, .osm.gz, .osm.bz2 or '
+                        '.osm.pbf file')
+    parser.add_argument('output', nargs='?', default='graf.npz',
+                        help='street graph file')
+    args = parser.parse_args()
+    result = report(args.extract, args.output)
+    print("{} nodes, {} edges from {} walkable ways in {:.2f} s, peak "
+          "memory {:.0f} MB".format(result.nodes, result.edges, result.ways,
+                                    result.seconds, result.peak_mb))
+
+
+if __name__ == '__main__':
+    main()
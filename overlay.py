@@ -0,0 +1,754 @@
+"""
+This module prepares the city graph for much larger areas (the whole
+metropolitan area) with a multi-level overlay, as customizable route
+planning does. The nodes are split into cells by recursive bisection of
+their coordinates, and every cell is split again into the cells of the
+level below, so the cells of all the levels are nested.
+The nodes of a cell joined to other cells are its boundary nodes. For every
+cell, the travel times between all its boundary nodes (a clique) are
+computed inside the cell, on the cliques of the cells of the level below.
+The partition only depends on the shape of the graph, and the cliques
+(the customization) on the travel times, so a change of times (such as new
+speeds in get_speed) only needs a new customization, which only computes
+again the cells whose times changed.
+A search goes through the original edges near the source and the
+destination, and through the cliques and the edges between cells of the
+highest level that does not contain them everywhere else, so it settles
+few nodes of the areas far from both. The cliques of the path are then
+unpacked into the edges of the city graph. The searches run on arrays, as
+the kernels module does, and are compiled with Numba if it is installed.
+"""
+
+# Library used to initialize classes
+from dataclasses import dataclass
+# Library used to access different data types
+from typing import Callable, Dict, List, Optional, Tuple
+# Library used to keep the queue of the searches
+import heapq
+# Library used to store the partition and the cliques
+import numpy as np
+# Library used to manipulate graphs
+import networkx as nx
+# Library used to access the city graph functions
+import city
+# Library used to know if the graph changed
+import alt
+# Library used to search inside the cells
+import kernels
+# Library used to measure the phases of the bot commands
+import metrics
+
+# Largest number of nodes of the cells of the first level
+LEAF: int = 64
+# Every cell contains 2 ** FANOUT_BITS cells of the level below
+FANOUT_BITS: int = 3
+# Nodes added to the city graph by every search
+ADDITIONAL: Tuple[str, str] = ('src', 'dst')
+INF: float = float('inf')
+
+
+@dataclass
+class Cell:
+    """
+    Class: Contains the graph inside a cell used to compute its clique: the
+           nodes (the boundary nodes of its cells of the level below, or all
+           its nodes in the first level) and the edges between them, as
+           compressed sparse rows whose weights are positions in the times
+           of the edges followed by the cliques of the level below.
+    """
+    vertices: np.ndarray        # Sorted positions of the nodes in the graph
+    indptr: np.ndarray          # First edge of every node
+    indices: np.ndarray         # Other node of every edge (local position)
+    wid: np.ndarray             # Position of the time of every edge
+    boundary: np.ndarray        # Local positions of the boundary nodes
+
+
+def bisection(x: np.ndarray, y: np.ndarray, depth: int) -> np.ndarray:
+    """
+    Function: Splits the nodes in two halves by the median of their longer
+              side, and every half again, depth times.
+    Parameters: x, y -> coordinates of the nodes (meters)
+                depth -> number of splits
+    Return: The cell of every node, between 0 and 2 ** depth - 1; the two
+            halves of cell c at a depth are cells 2c and 2c + 1.
+    """
+    groups = [np.arange(len(x))]
+    for d in range(depth):
+        halves = []
+        for group in groups:
+            if len(group) == 0:
+                halves += [group, group]
+                continue
+            gx, gy = x[group], y[group]
+            wide = gx.max() - gx.min() >= gy.max() - gy.min()
+            order = np.argsort(gx if wide else gy, kind='stable')
+            half = len(group) // 2
+            halves += [group[order[:half]], group[order[half:]]]
+        groups = halves
+    cell = np.zeros(len(x), dtype=np.int64)
+    for c, group in enumerate(groups):
+        cell[group] = c
+    return cell
+
+
+class Overlay:
+    """
+    Class: Contains the partition of a city graph in nested cells, the
+           boundary nodes of the cells and their cliques.
+    """
+
+    def __init__(self, g: city.CityGraph, leaf: int = LEAF,
+                 fanout_bits: int = FANOUT_BITS) -> None:
+        self.nodes = [n for n in g.nodes if n not in ADDITIONAL]
+        self.index = {n: i for i, n in enumerate(self.nodes)}
+        n = len(self.nodes)
+        self.pairs = [(u, v) for u, v in g.edges
+                      if u in self.index and v in self.index]
+        eu = np.array([self.index[u] for u, v in self.pairs], dtype=np.int64)
+        ev = np.array([self.index[v] for u, v in self.pairs], dtype=np.int64)
+        self.edges = len(self.pairs)
+        # The original graph, with the edge of every neighbour
+        tails, heads = np.concatenate([eu, ev]), np.concatenate([ev, eu])
+        order = np.argsort(tails, kind='stable')
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=n), out=self.indptr[1:])
+        self.indices = heads[order]
+        self.eid = np.concatenate([np.arange(self.edges)] * 2)[order]
+        # Partition: the nodes are projected to meters around their mean
+        location = np.array([g.nodes[v]['location'] for v in self.nodes],
+                            dtype=float).reshape(n, 2)
+        lat0 = np.radians(location[:, 1].mean()) if n > 0 else 0.0
+        x = location[:, 0] * np.cos(lat0) * 111320
+        y = location[:, 1] * 110540
+        depth = int(np.ceil(np.log2(n / leaf))) if n > leaf else 0
+        # The highest level keeps 2 ** fanout_bits cells or more
+        self.levels = max(1, depth // fanout_bits)
+        leaves = bisection(x, y, depth)
+        # cell[l] is the cell of every node at level l (l >= 1)
+        self.cell: List[np.ndarray] = [np.arange(n)] + \
+            [leaves >> (fanout_bits * (level - 1))
+             for level in range(1, self.levels + 1)]
+        self.count = [n] + [(2 ** depth - 1 >> fanout_bits * (level - 1)) + 1
+                            for level in range(1, self.levels + 1)]
+        # Boundary nodes of every cell, sorted by cell: the ones of cell c
+        # at level l are bnodes[l][boff[l][c]:boff[l][c + 1]]
+        self.bnodes: List[np.ndarray] = [np.arange(n)]
+        self.boff: List[np.ndarray] = [np.arange(n + 1)]
+        self.rank: List[np.ndarray] = [np.zeros(n, dtype=np.int64)]
+        # Offsets of the cliques of every level (a k x k matrix per cell)
+        self.coff: List[np.ndarray] = [np.zeros(1, dtype=np.int64)]
+        self.cells: List[List[Cell]] = [[]]
+        for level in range(1, self.levels + 1):
+            cell = self.cell[level]
+            cut = cell[eu] != cell[ev]
+            nodes = np.unique(np.concatenate([eu[cut], ev[cut]]))
+            nodes = nodes[np.lexsort((nodes, cell[nodes]))]
+            offsets = np.zeros(self.count[level] + 1, dtype=np.int64)
+            np.cumsum(np.bincount(cell[nodes], minlength=self.count[level]),
+                      out=offsets[1:])
+            rank = np.full(n, -1, dtype=np.int64)
+            rank[nodes] = np.arange(len(nodes)) - offsets[cell[nodes]]
+            self.bnodes.append(nodes)
+            self.boff.append(offsets)
+            self.rank.append(rank)
+            sizes = np.diff(offsets) ** 2
+            self.coff.append(np.zeros(len(sizes) + 1, dtype=np.int64))
+            np.cumsum(sizes, out=self.coff[level][1:])
+            self.cells.append(self.local_graphs(level, eu, ev))
+        # The levels side by side, as the search kernel reads them: row l of
+        # boff_all and coff_all has the offsets of the cells of level l
+        bstart = np.cumsum([0] + [len(b) for b in self.bnodes])
+        cstart = np.cumsum([0] + [int(c[-1]) for c in self.coff])
+        width = max(self.count[1:]) + 1
+        self.boff_all = np.zeros((self.levels + 1, width), dtype=np.int64)
+        self.coff_all = np.zeros((self.levels + 1, width), dtype=np.int64)
+        for level in range(1, self.levels + 1):
+            size = len(self.boff[level])
+            self.boff_all[level, :size] = self.boff[level] + bstart[level]
+            self.coff_all[level, :size] = self.coff[level] + cstart[level]
+        self.bnodes_all = np.concatenate(self.bnodes)
+        self.cell_all = np.array(self.cell)
+        self.rank_all = np.array(self.rank)
+        self.weights = np.zeros(self.edges)
+        self.cliques: List[np.ndarray] = []
+        self.local: List[List[np.ndarray]] = []
+        self.recomputed = 0         # Cells computed by the last customization
+        self.clique = np.zeros(0)
+        self.lists: Optional[tuple] = None
+        # Work arrays of the searches of every backend, kept between them
+        self.pool: Dict[str, List[tuple]] = {}
+        self.version = -1
+        self.signature = alt.signature(g)
+        self.customize(g)
+
+    def local_graphs(self, level: int, eu: np.ndarray,
+                     ev: np.ndarray) -> List[Cell]:
+        """
+        Function: Builds the graph inside every cell of a level: the
+                  original edges in the first level, and the edges between
+                  its cells and the cliques of its cells in the others.
+        Parameters: level -> the level
+                    eu, ev -> positions of the ends of the original edges
+        Return: The graph of every cell.
+        """
+        cell = self.cell[level]
+        below = self.cell[level - 1]
+        if level == 1:
+            vertices = np.arange(len(self.nodes))
+            inside = cell[eu] == cell[ev]
+            tails, heads = eu[inside], ev[inside]
+            wids = np.flatnonzero(inside)
+        else:
+            vertices = self.bnodes[level - 1]
+            inside = (cell[eu] == cell[ev]) & (below[eu] != below[ev])
+            tails, heads = [eu[inside]], [ev[inside]]
+            wids = [np.flatnonzero(inside)]
+            # Clique of every cell of the level below: all its pairs
+            offsets = self.boff[level - 1]
+            for c in range(self.count[level - 1]):
+                k = offsets[c + 1] - offsets[c]
+                if k < 2:
+                    continue
+                members = self.bnodes[level - 1][offsets[c]:offsets[c + 1]]
+                i, j = np.nonzero(~np.eye(k, dtype=bool))
+                # Only one direction, both are added below
+                keep = i < j
+                tails.append(members[i[keep]])
+                heads.append(members[j[keep]])
+                start = self.edges + int(self.coff[level - 1][c])
+                wids.append(start + i[keep] * k + j[keep])
+            tails, heads = np.concatenate(tails), np.concatenate(heads)
+            wids = np.concatenate(wids)
+        # Both directions of every edge
+        tails, heads = np.concatenate([tails, heads]), \
+            np.concatenate([heads, tails])
+        wids = np.concatenate([wids, wids])
+        order = np.lexsort((tails, cell[tails]))
+        tails, heads, wids = tails[order], heads[order], wids[order]
+        vertices = vertices[np.lexsort((vertices, cell[vertices]))]
+        first = np.searchsorted(cell[vertices], np.arange(self.count[level]
+                                                          + 1))
+        bounds = np.searchsorted(cell[tails], np.arange(self.count[level]
+                                                        + 1))
+        cells = []
+        for c in range(self.count[level]):
+            members = vertices[first[c]:first[c + 1]]
+            t = np.searchsorted(members, tails[bounds[c]:bounds[c + 1]])
+            h = np.searchsorted(members, heads[bounds[c]:bounds[c + 1]])
+            indptr = np.zeros(len(members) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(t, minlength=len(members)),
+                      out=indptr[1:])
+            boundary = self.bnodes[level][self.boff[level][c]:
+                                          self.boff[level][c + 1]]
+            cells.append(Cell(members, indptr, h, wids[bounds[c]:
+                                                       bounds[c + 1]],
+                              np.searchsorted(members, boundary)))
+        return cells
+
+    def valid(self, g: city.CityGraph) -> bool:
+        """
+        Function: Tells if the overlay still represents a graph.
+        Parameters: g -> City graph
+        Return: True if neither its edges nor their times changed.
+        """
+        return g.graph.get('version', 0) == self.version and \
+            alt.signature(g) == self.signature
+
+    def customize(self, g: city.CityGraph) -> None:
+        """
+        Function: Computes the cliques of the cells from the travel times of
+                  the graph, from the first level up. The partition is kept,
+                  so only the times can have changed: after the first time,
+                  only the cells with an edge or a clique of the level below
+                  whose time changed are computed again.
+        Parameters: g -> City graph
+        Return: None.
+        """
+        adj = g.adj
+        weights = np.array([adj[u][v]['time'] for u, v in self.pairs],
+                           dtype=np.float64)
+        first = len(self.local) == 0
+        changed = np.ones(self.edges, dtype=bool) if first else \
+            weights != self.weights
+        self.weights = weights
+        current = kernels.backend()
+        if first:
+            # Time of every edge of every cell, kept to unpack the paths
+            self.local = [[]] + [[np.zeros(0)] * self.count[level]
+                                 for level in range(1, self.levels + 1)]
+            self.cliques = [np.zeros(0)] + \
+                [np.full(int(self.coff[level][-1]), INF)
+                 for level in range(1, self.levels + 1)]
+        self.recomputed = 0
+        below = np.zeros(0, dtype=bool)
+        for level in range(1, self.levels + 1):
+            source = self.times(level)
+            changes = np.concatenate([changed, below])
+            cliques = self.cliques[level]
+            previous = cliques.copy()
+            for c, cell in enumerate(self.cells[level]):
+                if not first and not changes[cell.wid].any():
+                    continue
+                self.recomputed += 1
+                self.local[level][c] = source[cell.wid]
+                k = len(cell.boundary)
+                if k == 0:
+                    continue
+                start = self.coff[level][c]
+                n = len(cell.vertices)
+                arrays = cell_arrays(cell, self.local[level][c], current)
+                if current == 'numba':
+                    kernel('clique')(*arrays, cell.wid, self.edges,
+                                     cell.boundary, np.empty(n),
+                                     np.zeros(n, dtype=np.bool_),
+                                     np.empty(n, dtype=np.int64),
+                                     cliques[start:start + k * k])
+                else:
+                    out = [INF] * (k * k)
+                    kernel('clique')(*arrays, cell.wid.tolist(), self.edges,
+                                     cell.boundary.tolist(), [INF] * n,
+                                     [False] * n, [-1] * n, out)
+                    cliques[start:start + k * k] = out
+            below = cliques != previous
+        self.clique = np.concatenate(self.cliques)
+        self.lists = None
+        self.version = g.graph.get('version', 0)
+
+    def times(self, level: int) -> np.ndarray:
+        """
+        Function: Gives the times read by the graphs of the cells of a level.
+        Parameters: level -> the level
+        Return: The times of the edges, followed by the cliques of the level
+                below (from the second level).
+        """
+        if level == 1:
+            return self.weights
+        return np.concatenate([self.weights, self.cliques[level - 1]])
+
+    def arrays(self, backend: str) -> tuple:
+        """
+        Function: Gives the arrays read by the search kernel, in the form
+                  used by a backend: NumPy arrays for Numba and lists for
+                  Python.
+        Parameters: backend -> the backend
+        Return: The graph, the cells and the cliques.
+        """
+        arrays = (self.indptr, self.indices, self.eid, self.weights,
+                  self.cell_all, self.rank_all, self.bnodes_all,
+                  self.boff_all, self.coff_all, self.clique)
+        if backend == 'numba':
+            return arrays
+        if self.lists is None:
+            self.lists = tuple(a.tolist() for a in arrays)
+        return self.lists
+
+    def search(self, sources: Dict, targets: Dict) -> Tuple[float, List]:
+        """
+        Function: Finds the shortest path from some sources to some targets
+                  through the overlay, with a bidirectional search.
+        Parameters: sources -> node -> time at the node
+                    targets -> node -> time from the node to the end
+        Return: The time of the path (with the starting and ending times) and
+                its nodes in the city graph, from a source to a target.
+        """
+        current = kernels.backend()
+        work = self.work(current)
+        dist_f, dist_b, parent_f, parent_b, via_f, via_b, seen_f, seen_b = work
+        s = [self.index[v] for v in sources]
+        t = [self.index[v] for v in targets]
+        # Cells of the ends of the search at every level
+        ends = self.cell_all[:, s + t]
+        starts = [float(x) for x in sources.values()]
+        finish = [float(x) for x in targets.values()]
+        if current == 'numba':
+            s, t = np.array(s, dtype=np.int64), np.array(t, dtype=np.int64)
+            starts, finish = np.array(starts), np.array(finish)
+        else:
+            ends = ends.tolist()
+        best, meet, count_f, count_b = kernel('search')(
+            *self.arrays(current), ends, s, starts, t, finish, *work)
+        try:
+            if meet < 0:
+                raise nx.NetworkXNoPath("No path to the destination")
+            path = self.walk(int(meet), parent_f, via_f)[::-1] + \
+                self.walk(int(meet), parent_b, via_b)[1:]
+        finally:
+            # Only the nodes reached are cleaned for the next search
+            for dist, parent, seen, count in (
+                    (dist_f, parent_f, seen_f, count_f),
+                    (dist_b, parent_b, seen_b, count_b)):
+                if current == 'numba':
+                    dist[seen[:count]] = INF
+                    parent[seen[:count]] = -1
+                else:
+                    for i in range(count):
+                        dist[seen[i]], parent[seen[i]] = INF, -1
+            self.pool[current].append(work)
+        return float(best), [self.nodes[p] for p in path]
+
+    def work(self, current: str) -> tuple:
+        """
+        Function: Gives the work arrays of a search, reusing the ones of a
+                  finished search: the searches only reach a few nodes, and
+                  filling arrays as large as the graph would take longer.
+        Parameters: current -> the backend
+        Return: The distance, parent, level followed and reached nodes of
+                both sides.
+        """
+        pool = self.pool.setdefault(current, [])
+        try:
+            return pool.pop()
+        except IndexError:
+            n = len(self.nodes)
+            dist_f, parent_f = kernels.work(n, current)
+            dist_b, parent_b = kernels.work(n, current)
+            return (dist_f, dist_b, parent_f, parent_b,
+                    *(kernels.work(n, current)[1] for i in range(4)))
+
+    def walk(self, node: int, parent, via) -> List[int]:
+        """
+        Function: Follows the parents of a side of a search from a node to
+                  its end, unpacking the cliques.
+        Parameters: node -> position of the node
+                    parent, via -> parent of every node and level of the
+                                   clique followed to it (0: an edge)
+        Return: The positions of the nodes of the path, from the node.
+        """
+        path = [node]
+        while parent[node] >= 0:
+            previous, level = int(parent[node]), int(via[node])
+            if level == 0:
+                path.append(previous)
+            else:
+                c = int(self.cell_all[level, node])
+                path += self.unpack(level, c, node, previous)[1:]
+            node = previous
+        return path
+
+    def unpack(self, level: int, c: int, a: int, b: int) -> List[int]:
+        """
+        Function: Gives the nodes of the city graph of a clique edge.
+        Parameters: level -> level of the clique
+                    c -> cell of the clique
+                    a, b -> positions of the nodes joined by the edge
+        Return: The positions of the nodes of the path from a to b.
+        """
+        cell = self.cells[level][c]
+        weights = self.local[level][c]
+        start, end = np.searchsorted(cell.vertices, [a, b]).tolist()
+        k = len(cell.boundary)
+        i, j = np.searchsorted(cell.vertices[cell.boundary], [a, b]).tolist()
+        limit = self.cliques[level][self.coff[level][c] + i * k + j]
+        # Some margin for the rounding of the sums of other paths
+        limit += 1e-9 * (1 + limit)
+        current = kernels.backend()
+        n = len(cell.vertices)
+        dist, parent = kernels.work(n, current)
+        edge = kernels.work(n, current)[1]
+        kernel('cell')(*cell_arrays(cell, weights, current), start, end,
+                       limit, dist, parent, edge)
+        # The edges of the cell followed, from b back to a
+        followed = []
+        x = end
+        while x != start:
+            followed.append(int(edge[x]))
+            x = int(parent[x])
+        path = [a]
+        for e in reversed(followed):
+            wid = int(cell.wid[e])
+            v = int(cell.vertices[cell.indices[e]])
+            if wid < self.edges:
+                path.append(v)
+            else:
+                below = int(np.searchsorted(self.coff[level - 1],
+                                            wid - self.edges,
+                                            side='right')) - 1
+                path += self.unpack(level - 1, below, path[-1], v)[1:]
+        return path
+
+
+def cell_arrays(cell: Cell, weights: np.ndarray, current: str) -> tuple:
+    """
+    Function: Gives the graph of a cell in the form used by a backend.
+    Parameters: cell -> the cell
+                weights -> time of every edge of the cell
+                current -> the backend
+    Return: The indptr, indices and weights.
+    """
+    if current == 'numba':
+        return cell.indptr, cell.indices, weights
+    return cell.indptr.tolist(), cell.indices.tolist(), weights.tolist()
+
+
+def _search(indptr, indices, eid, weights, cell, rank, bnodes, boff, coff,
+            clique, ends, sources, starts, targets, finish, dist_f, dist_b,
+            parent_f, parent_b, via_f, via_b, seen_f, seen_b):
+    """
+    Function: Bidirectional Dijkstra search through the overlay. From every
+              node, it follows the clique of its cell and the edges leaving
+              the cell at the highest level whose cell contains no end of
+              the search (the original edges if there is none).
+    Parameters: indptr, indices, eid, weights -> the graph, with the edge of
+                                                 every neighbour
+                cell, rank -> cell and position in its boundary nodes of
+                              every node at every level
+                bnodes, boff -> boundary nodes of the cells of every level
+                coff, clique -> cliques of the cells of every level
+                ends -> cells of the ends of the search at every level
+                sources, starts -> positions of the sources and their times
+                targets, finish -> positions of the targets and their times
+                dist_f, dist_b, parent_f, parent_b -> work arrays, infinite
+                                                      and -1
+                via_f, via_b -> work arrays, level followed to every node
+                seen_f, seen_b -> work arrays where the nodes reached are
+                                  written
+    Return: The time of the shortest path, the node where both searches
+            meet (-1 if there is no path) and the number of nodes reached by
+            every side.
+    """
+    levels = len(cell) - 1
+    heap_f = [(0.0, 0)]
+    heap_f.pop()
+    heap_b = [(0.0, 0)]
+    heap_b.pop()
+    count_f, count_b = 0, 0
+    for i in range(len(sources)):
+        s = int(sources[i])
+        if starts[i] < dist_f[s]:
+            if dist_f[s] == INF:
+                seen_f[count_f] = s
+                count_f += 1
+            dist_f[s] = starts[i]
+            heapq.heappush(heap_f, (float(starts[i]), s))
+    best, meet = INF, -1
+    for i in range(len(targets)):
+        t = int(targets[i])
+        if finish[i] < dist_b[t]:
+            if dist_b[t] == INF:
+                seen_b[count_b] = t
+                count_b += 1
+            dist_b[t] = finish[i]
+            heapq.heappush(heap_b, (float(finish[i]), t))
+            if dist_f[t] + finish[i] < best:
+                best, meet = dist_f[t] + finish[i], t
+    while len(heap_f) > 0 and len(heap_b) > 0:
+        if heap_f[0][0] + heap_b[0][0] >= best:
+            break
+        forward = heap_f[0][0] <= heap_b[0][0]
+        heap = heap_f if forward else heap_b
+        dist = dist_f if forward else dist_b
+        other = dist_b if forward else dist_f
+        parent = parent_f if forward else parent_b
+        via = via_f if forward else via_b
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        # Highest level whose cell of u contains no end
+        level = 0
+        while level < levels:
+            inside = False
+            for j in range(len(ends[level + 1])):
+                if ends[level + 1][j] == cell[level + 1][u]:
+                    inside = True
+            if inside:
+                break
+            level += 1
+        first, k, row = 0, 0, 0
+        # A node reached through the clique of its cell does not follow it
+        # again, as its times are already the shortest ones
+        if level > 0 and via[u] != level:
+            c = cell[level][u]
+            first = boff[level][c]
+            k = boff[level][c + 1] - first
+            row = coff[level][c] + rank[level][u] * k
+        degree = indptr[u + 1] - indptr[u]
+        for j in range(k + degree):
+            if j < k:
+                v = int(bnodes[first + j])
+                nd = d + clique[row + j]
+                step = level
+            else:
+                e = indptr[u] + j - k
+                v = int(indices[e])
+                # The edges inside the cell are in its clique
+                if level > 0 and cell[level][v] == cell[level][u]:
+                    continue
+                nd = d + weights[eid[e]]
+                step = 0
+            if nd < dist[v]:
+                if dist[v] == INF:
+                    if forward:
+                        seen_f[count_f] = v
+                        count_f += 1
+                    else:
+                        seen_b[count_b] = v
+                        count_b += 1
+                dist[v] = nd
+                parent[v] = u
+                via[v] = step
+                heapq.heappush(heap, (nd, v))
+                if nd + other[v] < best:
+                    best, meet = nd + other[v], v
+    return best, meet, count_f, count_b
+
+
+def _cell(indptr, indices, weights, start, end, limit, dist, parent, edge):
+    """
+    Function: Dijkstra search inside a cell from a node to another one.
+    Parameters: indptr, indices, weights -> the graph of the cell
+                start, end -> local positions of the nodes
+                limit -> time of the path (the clique), nodes farther than
+                         it are not reached
+                dist, parent, edge -> work arrays, infinite and -1
+    Return: None (parent and edge have the node and the edge followed to
+            every node of the path).
+    """
+    heap = [(0.0, start)]
+    dist[start] = 0.0
+    while len(heap) > 0:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        if u == end:
+            break
+        for e in range(indptr[u], indptr[u + 1]):
+            v = int(indices[e])
+            nd = d + weights[e]
+            if nd < dist[v] and nd <= limit:
+                dist[v] = nd
+                parent[v] = u
+                edge[v] = e
+                heapq.heappush(heap, (nd, v))
+
+
+def _clique(indptr, indices, weights, wid, edges, boundary, dist, through,
+            position, out):
+    """
+    Function: Computes the clique of a cell: a Dijkstra search inside the
+              cell from every boundary node, that stops when it has settled
+              the boundary nodes after it (the times of the ones before it
+              are known, as the graph is undirected). A node reached through
+              the clique of a cell of the level below does not follow that
+              clique again, as its times are already the shortest ones.
+    Parameters: indptr, indices, weights -> the graph of the cell
+                wid, edges -> position of the time of every edge, the ones
+                              from edges on are cliques
+                boundary -> local positions of the boundary nodes
+                dist, through, position -> work arrays, one item per node of
+                                           the cell
+                out -> k x k times between the boundary nodes, by rows
+    Return: None (out is filled).
+    """
+    k = len(boundary)
+    for v in range(len(position)):
+        position[v] = -1
+    for j in range(k):
+        position[boundary[j]] = j
+    for i in range(k):
+        for v in range(len(dist)):
+            dist[v] = INF
+            through[v] = False
+        s = int(boundary[i])
+        dist[s] = 0.0
+        heap = [(0.0, s)]
+        left = k - i
+        while len(heap) > 0:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if position[u] >= i:
+                left -= 1
+                if left == 0:
+                    break
+            for e in range(indptr[u], indptr[u + 1]):
+                clique = wid[e] >= edges
+                if clique and through[u]:
+                    continue
+                v = int(indices[e])
+                nd = d + weights[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    through[v] = clique
+                    heapq.heappush(heap, (nd, v))
+        for j in range(i, k):
+            out[i * k + j] = dist[boundary[j]]
+            out[j * k + i] = dist[boundary[j]]
+
+
+# Kernels of every backend, compiled the first time they are asked for
+_kernels: Dict[str, Dict[str, Callable]] = {
+    'python': {'search': _search, 'cell': _cell, 'clique': _clique}}
+
+
+def kernel(name: str) -> Callable:
+    """
+    Function: Gives a kernel of the current backend of the kernels module,
+              compiling it if needed (and caching it on disk).
+    Parameters: name -> 'search', 'cell' or 'clique'
+    Return: The kernel.
+    """
+    current = kernels.backend()
+    if current not in _kernels:
+        import numba
+        _kernels[current] = {'search': numba.njit(cache=True)(_search),
+                             'cell': numba.njit(cache=True)(_cell),
+                             'clique': numba.njit(cache=True)(_clique)}
+    return _kernels[current][name]
+
+
+def find_path(ox_g: city.OsmnxGraph, g: city.CityGraph, overlay: Overlay,
+              src: city.Coord, dst: city.Coord) -> city.Path:
+    """
+    Function: Finds the shortest path from source to destiny through the
+              overlay, with the same result as city.find_path. The src and
+              dst nodes are also added to the city graph, as
+              city.find_path does.
+    Parameters: ox_g -> Barcelona's streets graph
+                g -> City graph
+                overlay -> the overlay of g (valid)
+                src -> Coordinate of the starting point
+                dst -> Coordinate of the final point
+    Return: The path of the city graph.
+    """
+    nearest_nodes = city.add_additional_nodes(ox_g, g, src, dst)
+    sources = {nearest_nodes[0]: g.edges['src', nearest_nodes[0]]['time']}
+    targets = {nearest_nodes[1]: g.edges['dst', nearest_nodes[1]]['time']}
+    with metrics.phase('shortest path'):
+        time, nodes = overlay.search(sources, targets)
+    return ['src'] + nodes + ['dst']
+
+
+def refresh(overlay: Optional[Overlay], g: city.CityGraph) -> Overlay:
+    """
+    Function: Keeps an overlay up to date: a new partition if the edges of
+              the graph changed, or only a new customization if their times
+              changed.
+    Parameters: overlay -> the overlay (or None)
+                g -> City graph
+    Return: The overlay of g.
+    """
+    if overlay is None or alt.signature(g) != overlay.signature:
+        return Overlay(g)
+    if not overlay.valid(g):
+        try:
+            overlay.customize(g)
+        except KeyError:
+            # Some edges were replaced by as many other ones
+            return Overlay(g)
+    return overlay
+
+
+def summary(overlay: Overlay) -> Dict[str, float]:
+    """
+    Function: Describes the levels of an overlay.
+    Parameters: overlay -> the overlay
+    Return: The number of cells, boundary nodes and clique times of every
+            level.
+    """
+    result: Dict[str, float] = {'nodes': len(overlay.nodes),
+                                'levels': overlay.levels}
+    for level in range(1, overlay.levels + 1):
+        result['cells_{}'.format(level)] = overlay.count[level]
+        result['boundary_{}'.format(level)] = len(overlay.bnodes[level])
+        result['clique_{}'.format(level)] = int(overlay.coff[level][-1])
+    return result
@@ -0,0 +1,138 @@
+"""
+This module measures the startup time of the bot.
+It records how long every library takes to be imported and how long every
+loading phase (street load, metro build, city build, restaurant load) takes, so
+that the startup time budget can be checked with `bot.py --profile-startup`.
+"""
+
+# Library used to replace the import function while profiling
+import builtins
+# Library used to measure elapsed time
+import time
+# Library used to know which modules are already imported
+import sys
+# Library used to define the phase context manager
+from contextlib import contextmanager
+# Library used to access different data types
+from typing import Iterator, List, Tuple
+
+Timing = Tuple[str, int, str, float]  # (kind, depth, name, seconds)
+
+_timings: List[Timing] = []
+_depth: int = 0
+_started: float = time.perf_counter()
+_original_import = builtins.__import__
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """
+    Function: Replacement of the builtin import that records the time of the
+              first import of every top level package.
+    Parameters: same as the builtin __import__
+    Return: The imported module.
+    """
+    global _depth
+    root = name.partition('.')[0]
+    if level != 0 or root in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    start = time.perf_counter()
+    _depth += 1
+    try:
+        module = _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _depth -= 1
+    # Only successful imports are recorded (failed optional imports are not)
+    _timings.append(('import', _depth, root, time.perf_counter() - start))
+    return module
+
+
+def start() -> None:
+    """
+    Function: Starts recording the import times.
+    Parameters: None
+    Return: None.
+    """
+    global _started
+    _started = time.perf_counter()
+    builtins.__import__ = _timed_import
+
+
+def stop() -> None:
+    """
+    Function: Stops recording the import times.
+    Parameters: None
+    Return: None.
+    """
+    builtins.__import__ = _original_import
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Function: Measures the time spent inside a with block.
+    Parameters: name -> name of the phase
+    Return: None.
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings.append(('phase', 0, name,
+                         time.perf_counter() - start_time))
+
+
+def timings() -> List[Timing]:
+    """
+    Function: Gives the recorded timings in the order they finished.
+    Parameters: None
+    Return: List of (kind, depth, name, seconds) tuples.
+    """
+    return list(_timings)
+
+
+def total() -> float:
+    """
+    Function: Gives the wall time since start() was called.
+    Parameters: None
+    Return: The elapsed time in seconds.
+    """
+    return time.perf_counter() - _started
+
+
+def report(budget: float = 0.0) -> str:
+    """
+    Function: Creates a readable report of the recorded timings.
+              Imports are indented by their nesting level (nested imports are
+              included in the time of the import that caused them) and the
+              total is the wall time since start() was called.
+    Parameters: budget -> startup time budget in seconds (0 for no budget)
+    Return: The report as a string.
+    """
+    lines = ["Imports:"]
+    imports = [t for t in _timings if t[0] == 'import']
+    # Nested imports finish before their parent, so they are reordered to
+    # be printed below it
+    stack: List[List[str]] = [[]]
+    for kind, depth, name, secs in imports:
+        while len(stack) <= depth + 1:
+            stack.append([])
+        line = "  " * (depth + 1) + "{:<30} {:8.3f} s".format(name, secs)
+        stack[depth].append("\n".join([line] + stack[depth + 1]))
+        stack[depth + 1] = []
+    lines += stack[0]
+    lines.append("Phases:")
+    for kind, depth, name, secs in _timings:
+        if kind == 'phase':
+            lines.append("  {:<30} {:8.3f} s".format(name, secs))
+    elapsed = total()
+    lines.append("Total: {:.3f} s".format(elapsed))
+    if budget > 0:
+        status = "OK" if elapsed <= budget else "OVER BUDGET"
+        lines.append("Budget: {:.3f} s ({})".format(budget, status))
+    return "\n".join(lines)
+
+
+# Starts measuring as soon as the bot imports this module, so that all the
+# imports of the bot are measured
+if '--profile-startup' in sys.argv:
+    start()
@@ -0,0 +1,268 @@
+"""
+This module ranks the restaurants that match a query. The text of every
+field is normalized (lower case, without accents or punctuation) and split
+in words, and an inverted index keeps, for every word, the BM25 score of
+every restaurant that contains it. The fields have different weights (the
+name counts more than the type, the type more than the neighbourhood and so
+on) and the coordinates and phone numbers are not indexed. Words of the
+query that are not in the index are replaced by the words that start with
+them and by the words at one or two typos from them, found with a SymSpell
+dictionary of deletes of the beginnings of the words (as in autocomplete).
+"""
+
+# Library used to access different data types
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+# Library used to find the words that start with a prefix
+import bisect
+# Library used to choose the best restaurants
+import heapq
+# Library used to compute the scores
+import math
+# Library used to split the text in words
+import re
+# Library used to avoid accent problems
+from unidecode import unidecode
+# Library used to keep the indexes of the last lists searched
+import caches
+
+# Weight of every indexed field of a restaurant
+FIELDS: Dict[str, float] = {'name': 3.0, 'restaurant_type': 2.0,
+                            'neighbourhood': 1.5, 'district': 1.2,
+                            'street_name': 1.0, 'institution_name': 0.5}
+# BM25 parameters: saturation of the repeated words and length
+# normalization
+K1: float = 1.2
+B: float = 0.75
+# Weight of the words found by prefix or with typos instead of the word
+PREFIX_WEIGHT: float = 0.7
+FUZZY_WEIGHT: float = 0.5
+# Characters between the words
+SEPARATORS = re.compile(r'\W+')
+# Typos allowed at most in a word of the query (see typos)
+MAX_TYPOS: int = 2
+# Beginnings of the words longer than this are not kept in the dictionary of
+# deletes: the first MAX_PREFIX - MAX_TYPOS letters of the query word find
+# them, and the whole word is compared only with the words found
+MAX_PREFIX: int = 8
+# Shortest beginnings kept: the ones of the shortest words with typos, at
+# one typo
+MIN_PREFIX: int = 3
+
+
+def normalize(text) -> str:
+    """
+    Function: Normalizes a text: lower case, without accents and with single
+              spaces instead of punctuation.
+    Parameters: text -> the text (missing values are empty)
+    Return: The normalized text.
+    """
+    if not isinstance(text, str):
+        return ''
+    text = text.lower()
+    if not text.isascii():
+        text = unidecode(text)
+    return SEPARATORS.sub(' ', text).strip()
+
+
+def typos(word: str) -> int:
+    """
+    Function: Gives the number of typos allowed in a word of the query.
+    Parameters: word -> the word
+    Return: 0 up to 3 letters, 1 up to 5 letters and 2 for longer ones.
+    """
+    if len(word) <= 3:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def deletes(word: str, count: int = 1) -> Set[str]:
+    """
+    Function: Gives the texts obtained removing one letter of a word, or up
+              to count letters.
+    Parameters: word -> the word
+                count -> largest number of letters removed
+    Return: The set of texts.
+    """
+    found = {word[:i] + word[i + 1:] for i in range(len(word))}
+    if count > 1:
+        for text in list(found):
+            found |= deletes(text, count - 1)
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int, prefix: bool = False) -> int:
+    """
+    Function: Computes the number of insertions, deletions, substitutions and
+              swaps of two adjacent letters needed to change a into b (or into
+              the beginning of b), stopping as soon as it is over a limit.
+    Parameters: a, b -> the words
+                limit -> largest distance of interest
+                prefix -> whether a only has to match the beginning of b
+    Return: The distance, or limit + 1 if it is larger than the limit.
+    """
+    if not prefix and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            row[j] = min(previous[j] + 1, row[j - 1] + 1,
+                         previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and \
+                    a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], previous2[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        previous2, previous = previous, row
+    distance = min(previous) if prefix else previous[-1]
+    return min(distance, limit + 1)
+
+
+class Index:
+    """
+    Class: Contains the inverted index of a list of restaurants: the sorted
+           words and, for every word, the restaurants that contain it and
+           their BM25 scores.
+    """
+
+    def __init__(self, restaurants: Sequence) -> None:
+        self.size = len(restaurants)
+        # Words of every field of every restaurant
+        fields = {field: [normalize(getattr(r, field)).split()
+                          for r in restaurants] for field in FIELDS}
+        averages = {field: max(sum(map(len, words)) / max(self.size, 1), 1.0)
+                    for field, words in fields.items()}
+        # Weighted frequency of every word in every restaurant, with the
+        # length of every field normalized
+        frequencies: Dict[str, Dict[int, float]] = {}
+        for field, weight in FIELDS.items():
+            for doc, words in enumerate(fields[field]):
+                norm = 1 - B + B * len(words) / averages[field]
+                for word in words:
+                    docs = frequencies.setdefault(word, {})
+                    docs[doc] = docs.get(doc, 0.0) + weight / norm
+        self.words: List[str] = sorted(frequencies)
+        # Beginning of a word with letters removed -> beginnings of words,
+        # built the first time a word of a query is not in the index
+        self.fuzzy: Optional[Dict[str, Set[str]]] = None
+        self.postings: Dict[str, Tuple[Tuple[int, float], ...]] = {}
+        for word, docs in frequencies.items():
+            idf = math.log(1 + (self.size - len(docs) + 0.5) /
+                           (len(docs) + 0.5))
+            self.postings[word] = tuple(
+                (doc, idf * tf * (K1 + 1) / (tf + K1))
+                for doc, tf in docs.items())
+
+    def expand(self, word: str) -> List[Tuple[str, float]]:
+        """
+        Function: Gives the words of the index that stand for a word of the
+                  query: the word itself if it is in the index, otherwise the
+                  words that start with it and the ones with few typos (also
+                  in the beginning of longer words).
+        Parameters: word -> a normalized word of the query
+        Return: The words of the index and their weights.
+        """
+        if word in self.postings:
+            return [(word, 1.0)]
+        found: Dict[str, float] = {}
+        start = bisect.bisect_left(self.words, word)
+        for other in self.words[start:]:
+            if not other.startswith(word):
+                break
+            found[other] = PREFIX_WEIGHT
+        limit = typos(word)
+        if limit > 0:
+            # The beginning of a word at few typos from the query starts at
+            # few typos from the beginning of the query
+            beginning = word[:MAX_PREFIX - MAX_TYPOS]
+            dictionary = self.dictionary()
+            checked: Set[str] = set(found)
+            for text in deletes(beginning, limit) | {beginning}:
+                for prefix in dictionary.get(text, ()):
+                    if edit_distance(beginning, prefix, limit) > limit:
+                        continue
+                    start = bisect.bisect_left(self.words, prefix)
+                    for i in range(start, len(self.words)):
+                        other = self.words[i]
+                        if not other.startswith(prefix):
+                            break
+                        if other in checked:
+                            continue
+                        checked.add(other)
+                        edits = edit_distance(word, other, limit,
+                                              prefix=True)
+                        if edits <= limit:
+                            found[other] = FUZZY_WEIGHT / edits
+        return sorted(found.items())
+
+    def dictionary(self) -> Dict[str, Set[str]]:
+        """
+        Function: Gives the dictionary of deletes of the beginnings of the
+                  words (up to MAX_TYPOS letters removed), built the first
+                  time it is needed.
+        Parameters: None
+        Return: The dictionary.
+        """
+        if self.fuzzy is None:
+            fuzzy: Dict[str, Set[str]] = {}
+            prefixes: Set[str] = set()
+            for word in self.words:
+                for length in range(MIN_PREFIX,
+                                    min(len(word), MAX_PREFIX) + 1):
+                    prefixes.add(word[:length])
+            for prefix in prefixes:
+                for text in deletes(prefix, MAX_TYPOS) | {prefix}:
+                    fuzzy.setdefault(text, set()).add(prefix)
+            self.fuzzy = fuzzy
+        return self.fuzzy
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """
+        Function: Computes the score of every restaurant that matches a
+                  query, adding the scores of all its words.
+        Parameters: query -> the query
+        Return: The score of every matching restaurant.
+        """
+        scores: Dict[int, float] = {}
+        for word in dict.fromkeys(normalize(query).split()):
+            best: Dict[int, float] = {}
+            for other, weight in self.expand(word):
+                for doc, score in self.postings[other]:
+                    if weight * score > best.get(doc, 0.0):
+                        best[doc] = weight * score
+            for doc, score in best.items():
+                scores[doc] = scores.get(doc, 0.0) + score
+        return scores
+
+    def search(self, query: str, k: Optional[int] = None) -> List[int]:
+        """
+        Function: Finds the best restaurants for a query.
+        Parameters: query -> the query
+                    k -> number of restaurants (None: all that match)
+        Return: The positions of the restaurants, best first (and in the
+                order of the list if they have the same score).
+        """
+        scores = self.scores(query)
+        key = (lambda item: (-item[1], item[0]))
+        if k is None:
+            ranked = sorted(scores.items(), key=key)
+        else:
+            ranked = heapq.nsmallest(k, scores.items(), key=key)
+        return [doc for doc, score in ranked]
+
+
+# Indexes of the last lists searched
+INDEXES: int = 4
+_indexes: 'caches.ListCache[Index]' = caches.ListCache(Index, INDEXES)
+
+
+def index_of(restaurants: Sequence) -> Index:
+    """
+    Function: Gives the index of a list of restaurants, built the first time
+              the list is searched.
+    Parameters: restaurants -> the list
+    Return: The index.
+    """
+    return _indexes.get(restaurants)
@@ -0,0 +1,55 @@
+"""
+This module contains the Restaurant class and its identifier. It does not
+import any other library, so the frontends of the routing service (see
+client.py) can build the restaurants it sends without importing the
+restaurants module (pandas, NumPy and the search indexes).
+"""
+
+# Library used to initialize classes
+from dataclasses import dataclass
+# Library used to access different data types
+from typing import List
+# Library used to give the identifiers of the restaurants
+import hashlib
+
+
+@dataclass
+class Restaurant:
+    """
+    Class: Contains the attirbutes of a restaurant.
+    """
+    name: str                # Restaurant's name
+    institution_name: str    # Institution where it's located
+    street_name: str         # Street name where it's located
+    neighbourhood: str       # Neighborhood where it's located
+    district: str            # Disctrict where it's located
+    restaurant_type: str     # Service offered by the restaurant
+    x_coord: float           # Restaurant's coordenate x
+    y_coord: float           # Restaurant's coordenate y
+    telf: str                # Restaurant's phone number
+    street_num: str          # Restaurant's street number
+
+
+Restaurants = List[Restaurant]
+
+
+def name_key(name: str) -> int:
+    """
+    Function: Gives a 64 bit hash of a restaurant name, the same on every
+              run.
+    Parameters: name -> the name
+    Return: The hash.
+    """
+    digest = hashlib.blake2b(str(name).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def restaurant_id(r: Restaurant) -> int:
+    """
+    Function: Gives the identifier of a restaurant, which is the same in
+              every reload (and for the copies made by the searches) because
+              the name is unique for every restaurant.
+    Parameters: r -> the restaurant
+    Return: The identifier.
+    """
+    return name_key(r.name)
@@ -4,76 +4,95 @@ The main function of this module is to read the restaurants'
 data of the restaurants.csv, store it in a list and look for
 restaurants that fullfil certain requests.
 """
-import easyinput as ei
 # Library used to initialize classes
 from dataclasses import dataclass
 # Library used to access different data types
-from typing import Optional, TextIO, List, Tuple, Dict
+from typing import Optional, TextIO, List, Tuple, Dict, Iterator, Set
+from typing import Callable
 # Library used to read csv docs
 import pandas as pd
-# Library used to filter data
-from fuzzywuzzy import fuzz
-# Library used to avoid accent problems while function find
-from unidecode import unidecode
-
-
-@dataclass
-class Restaurant:
+# Library used to keep the masks of the text filters
+import numpy as np
+# Library used to split the queries
+import re
+# Library used to reload the restaurants while the bot is serving
+import threading
+import time
+import os
+# Library used to measure the reloads
+import metrics
+# Library used to rank the restaurants found
+import ranking
+# Library used to complete the names and types while they are typed
+import autocomplete
+# Library used to find the restaurants near a location
+import spatial
+# Library used to build the restaurants and give their identifiers
+from records import Restaurant, Restaurants, name_key, restaurant_id
+
+
+# Columns of the restaurant file read into every field of a Restaurant
+COLUMNS: Dict[str, str] = {
+    'name': 'name',
+    'institution_name': 'institution_name',
+    'street_name': 'addresses_road_name',
+    'neighbourhood': 'addresses_neighborhood_name',
+    'district': 'addresses_district_name',
+    'restaurant_type': 'secondary_filters_name',
+    'x_coord': 'geo_epgs_4326_x',
+    'y_coord': 'geo_epgs_4326_y',
+    'telf': 'values_value',
+    'street_num': 'addresses_start_street_number'}
+# Types of the columns, the same for every chunk of the file
+DTYPES: Dict[str, type] = {column: str for column in COLUMNS.values()}
+DTYPES.update({COLUMNS['x_coord']: float, COLUMNS['y_coord']: float})
+# Value of the missing texts, which pandas reads as NaN
+TEXTS: Dict[str, str] = {column: '' for column, kind in DTYPES.items()
+                         if kind is str}
+# Rows read at once
+CHUNK: int = 50000
+
+
+def read_chunks(filename: str = 'restaurants.csv',
+                chunksize: Optional[int] = CHUNK) -> Iterator[pd.DataFrame]:
     """
-    Class: Contains the attirbutes of a restaurant.
+    Function: Reads the restaurant file in chunks of rows, removing the
+              duplicated names (the name is unique for every restaurant) as
+              they appear. Only a hash of every name seen is kept, so the
+              memory used does not depend on the size of the file. The
+              missing texts (for example the phone numbers) are empty.
+    Parameters: filename -> the csv file
+                chunksize -> rows of every chunk (None: the whole file)
+    Return: The chunks with the columns of COLUMNS.
     """
-    name: str                # Restaurant's name
-    institution_name: str    # Institution where it's located
-    street_name: str         # Street name where it's located
-    neighbourhood: str       # Neighborhood where it's located
-    district: str            # Disctrict where it's located
-    restaurant_type: str     # Service offered by the restaurant
-    x_coord: float           # Restaurant's coordenate x
-    y_coord: float           # Restaurant's coordenate y
-    telf: str                # Restaurant's phone number
-    street_num: str          # Restaurant's street number
-
-
-Restaurants = List[Restaurant]
-
-
-def read() -> Restaurants:
+    seen: Set[int] = set()
+    frames = pd.read_csv(filename, usecols=list(COLUMNS.values()),
+                         dtype=DTYPES, chunksize=chunksize)
+    if chunksize is None:
+        frames = [frames]
+    for df in frames:
+        keys = df[COLUMNS['name']].map(name_key)
+        # Keeps the first row of every name, in this chunk and before
+        keep = ~(keys.isin(seen) | keys.duplicated())
+        seen.update(keys[keep])
+        yield df[keep].fillna(TEXTS)
+
+
+def read(filename: str = 'restaurants.csv',
+         chunksize: Optional[int] = CHUNK) -> Restaurants:
     """
-    Function: Downloads and reads the restaurant file.
-    Parameters: None
+    Function: Reads the restaurant file.
+    Parameters: filename -> the csv file
+                chunksize -> rows read at once (None: the whole file)
     Return: A list of the restaurants from the csv.
     """
-    f = open('restaurants.csv', 'r')
-    name: str = 'name'
-    institution_name: str = 'institution_name'
-    street_name: str = 'addresses_road_name'
-    neighbourhood: str = 'addresses_neighborhood_name'
-    district: str = 'addresses_district_name'
-    restaurant_type: str = 'secondary_filters_name'
-    x_coord: str = 'geo_epgs_4326_x'
-    y_coord: str = 'geo_epgs_4326_y'
-    telf: str = 'values_value'
-    street_num: str = 'addresses_start_street_number'
-
-    # Defines dataframe with the data of the csv
-    df = pd.read_csv(f, usecols=[name, institution_name, street_name,
-                     neighbourhood, district, restaurant_type, x_coord,
-                     y_coord, telf, street_num])
-    # Returns dataframe with duplicated rows removed, using the name
-    # to find duplicates as it is unique for every restaurant
-    df = df.drop_duplicates(subset=['name'])
     restaurants = []
-    # Creates a restaurant with the information read in the dataframe
+    # Creates a restaurant with the information read in every chunk
     # and appends it into a list of restaurants
-    for row in df.itertuples():
-        rest = Restaurant(row.name, row.institution_name,
-                          row.addresses_road_name,
-                          row.addresses_neighborhood_name,
-                          row.addresses_district_name,
-                          row.secondary_filters_name, row.geo_epgs_4326_x,
-                          row.geo_epgs_4326_y, row.values_value,
-                          row.addresses_start_street_number)
-        restaurants.append(rest)
+    for df in read_chunks(filename, chunksize):
+        for row in zip(*[df[column].tolist()
+                         for column in COLUMNS.values()]):
+            restaurants.append(Restaurant(*row))
     return restaurants
 
 
@@ -82,81 +101,165 @@ def read() -> Restaurants:
 ##################
 
 
-def find_rest(query: str, restaurants: Restaurants) -> Restaurants:
+def find_rest(query: str, restaurants: Restaurants,
+              k: Optional[int] = None) -> Restaurants:
     """
-    Function: Finds the restaurants that fullfil the request.
+    Function: Finds the restaurants that fullfil the request, best first.
+              They are ranked with BM25 over their weighted fields (see the
+              ranking module), so the names count more than the types and
+              the types more than the addresses, and the words with typos
+              are also found.
     Parameters: query -> requests to find a restaurant
                 restaurants -> list of restaurants where the
                                query is applied
+                k -> number of restaurants wanted (None: all that match)
     Return: A list of the restaurants that fullfil the request.
     """
-    matching_restaurants: Restaurants = []
-    # list100 contains the list of restaurants that fullfil the request with
-    # an accuracy of a 100%
-    list100 = rest_list(matching_restaurants, restaurants, query, 100)
-    # list80 contains the list of restaurants that fullfil the request
-    # with an accuracy of 80%
-    list80 = rest_list(list100, restaurants, query, 80)
-    # If the list80 is not full (12 elements) list60 appends to list80
-    # the restaurants that fullfil the request with at least an accuracy of 60%
-    if len(matching_restaurants) < 12:
-        list60 = rest_list(list80, restaurants, query, 60)
-        return list60
-    return list80
-
-
-def rest_list(list_rest: list, restaurants: Restaurants, query: str,
-              x: int) -> Restaurants:
-    """
-    Function: Finds the restaurants that fullfil the request.
-    Parameters: list_rest -> list of restaurants where the restaurants that
-                fullfil the request with an accuracy of at least x are going to
-                be appended
-                restaurants -> list of restaurants where to apply the query
-                query -> requests to find a restaurant
-                x -> value of accuracy needed
-    Return: A list of the restaurants that fullfil the request.
+    index = ranking.index_of(restaurants)
+    return [restaurants[i] for i in index.search(query, k)]
+
+
+###########
+# RELOADS #
+###########
+
+
+@dataclass
+class Snapshot:
     """
-    for restaurant in restaurants:
-        # Treats rest as a list in order to get each of the attributes easier
-        rest = [str(restaurant.name), str(restaurant.institution_name),
-                str(restaurant.street_name), str(restaurant.neighbourhood),
-                str(restaurant.district), str(restaurant.restaurant_type),
-                str(restaurant.x_coord), str(restaurant.y_coord),
-                str(restaurant.telf), str(restaurant.street_num)]
-        for i in range(len(rest)):
-            # Filters the accents in the query and attribute
-            quer = unidecode(query.lower())
-            attr = unidecode(rest[i].lower())
-            # Returns the value of accuracy of the query and the attribute
-            value = fuzz.partial_ratio(quer, attr)
-            # Reconverts rest into a Restaurant in order to return a list of
-            # Restaurants
-            r = Restaurant(rest[0], rest[1], rest[2], rest[3], rest[4],
-                           rest[5], float(rest[6]), float(rest[7]), rest[8],
-                           rest[9])
-            # Treats two different cases: value of accuracy needed = 100 or
-            # lower
-            if x != 100:
-                # If it is not equal to 100, only appends the restaurants that
-                # exceeded the value needed but not the ones with accuracy =
-                # 100 because they are already in the list, and they would be
-                # repeated if added. Treats both 60% and 80% cases, that is why
-                # x+20 is a condition.
-                if value >= x and value < x+20:
-                    list_rest.append(r)
-                    break
-            else:
-                # If it is equal to 100, only appends the restaurants that have
-                # an accuracy of a 100
-                if value >= x:
-                    list_rest.append(r)
-                    break
-    return list_rest
+    Class: Contains a version of the restaurant list and the position of
+           every restaurant identifier in it.
+    """
+    version: int            # Increased by every reload
+    restaurants: Restaurants
+    ids: Dict[int, int]     # Restaurant identifier -> position
+    modified: float         # Modification time of the file read
+    seconds: float          # Time taken to read it
+
+
+# Used in most of the functions below. It is read the first time it is
+# needed, so that importing this module does not read the csv, and replaced
+# at once by every reload
+_snapshot: Optional[Snapshot] = None
+# The snapshot before the last reload, so that the results of a search done
+# just before a reload can still be found
+_previous: Optional[Snapshot] = None
+_reload_lock = threading.Lock()
+# Functions called with every new snapshot before it replaces the current one
+_listeners: List[Callable[[Snapshot], None]] = []
+
+
+def reload(filename: str = 'restaurants.csv') -> Snapshot:
+    """
+    Function: Reads the restaurant file into a new snapshot, calls the
+              functions registered with on_reload and replaces the current
+              snapshot. The searches running meanwhile use the old one.
+    Parameters: filename -> the csv file
+    Return: The new snapshot.
+    """
+    global _snapshot, _previous
+    with _reload_lock:
+        start = time.perf_counter()
+        modified = os.stat(filename).st_mtime
+        every = read(filename)
+        version = _snapshot.version + 1 if _snapshot is not None else 1
+        snapshot = Snapshot(version, every,
+                            {restaurant_id(r): i for i, r in
+                             enumerate(every)},
+                            modified, 0.0)
+        # Builds the search indexes before the snapshot is used
+        ranking.index_of(every).dictionary()
+        autocomplete.completer_of(every)
+        spatial.index_of(every)
+        for listener in _listeners:
+            listener(snapshot)
+        snapshot.seconds = time.perf_counter() - start
+        _previous, _snapshot = _snapshot, snapshot
+    metrics.set_gauge('restaurants_version', snapshot.version,
+                      help='Version of the restaurant list.')
+    metrics.set_gauge('restaurants_count', len(every),
+                      help='Number of restaurants.')
+    metrics.set_gauge('restaurants_reload_seconds', snapshot.seconds,
+                      help='Time of the last reload of the restaurants.')
+    return snapshot
+
+
+def on_reload(listener: Callable[[Snapshot], None]) -> None:
+    """
+    Function: Registers a function called with every new snapshot, before it
+              is used, to build the structures derived from it.
+    Parameters: listener -> the function
+    Return: None.
+    """
+    _listeners.append(listener)
 
 
-# Used in most of the functions below
-restaurant_list = read()
+def snapshot() -> Snapshot:
+    """
+    Function: Gives the current snapshot, reading the restaurant file the
+              first time it is called.
+    Parameters: None
+    Return: The snapshot.
+    """
+    if _snapshot is None:
+        reload()
+    return _snapshot
+
+
+def get_list() -> Restaurants:
+    """
+    Function: Gives the list of all the restaurants, reading the restaurant
+              file the first time it is called.
+    Parameters: None
+    Return: The list of the restaurants from the csv.
+    """
+    return snapshot().restaurants
+
+
+def by_id(id: int) -> Optional[Restaurant]:
+    """
+    Function: Finds a restaurant by its identifier, in the current snapshot
+              or in the one before the last reload.
+    Parameters: id -> the identifier
+    Return: The restaurant or None if it is not in any of them.
+    """
+    for version in (snapshot(), _previous):
+        if version is not None and id in version.ids:
+            return version.restaurants[version.ids[id]]
+    return None
+
+
+class Reloader(threading.Thread):
+    """
+    Class: Contains a thread that reads the restaurant file again every time
+           it changes.
+    """
+
+    def __init__(self, filename: str = 'restaurants.csv',
+                 interval: float = 30.0) -> None:
+        super().__init__(name='restaurant reloader', daemon=True)
+        self.filename = filename
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        """
+        Function: Checks the modification time of the file every interval.
+        """
+        while not self.stopped.wait(self.interval):
+            try:
+                if os.stat(self.filename).st_mtime != snapshot().modified:
+                    reload(self.filename)
+            except Exception:
+                # A file being written or with errors is tried again later
+                metrics.inc('restaurants_reload_errors',
+                            help='Reloads of the restaurants that failed.')
+
+    def stop(self) -> None:
+        """
+        Function: Stops the thread.
+        """
+        self.stopped.set()
 
 
 ########################
@@ -167,23 +270,17 @@ restaurant_list = read()
 def create_multiple(query: list) -> Restaurants:
     """
     Function: Implements the logic operand 'and' to all the lists resultant
-              the search of each query.
+              the search of each query, ranked by the whole query (so the
+              name chosen from the inline completion comes first).
     Parameters: query -> requests to find a restaurant
     Return: A list of the intersected restaurants.
     """
-    list1 = find_rest(query[0], restaurant_list)
+    every = get_list()
+    found = {r.name for r in find_rest(query[0], every)}
     for i in range(1, len(query)):
-        list2: List = []
-        sel_list = find_rest(query[i], restaurant_list)
-        for rest1 in list1:
-            for rest2 in sel_list:
-                # Compares the restaurants' names from both lists
-                if rest1.name == rest2.name:
-                    list2.append(rest1)
-        # Saves the resultat list to list1 in order to work with the
-        # intersected restaurants for every iteration of the loop
-        list1 = drop_dupplicates(list2)
-    return list1
+        # Keeps the names found by every query
+        found &= {r.name for r in find_rest(query[i], every)}
+    return [r for r in find_rest(' '.join(query), every) if r.name in found]
 
 
 ################
@@ -285,8 +382,8 @@ def create_and(query: list, l1: Restaurants, l2: Restaurants) -> Restaurants:
     # lists already created, this condition makes sure the lists are only
     # created in the first case
     if len(l1) == 0 and len(l2) == 0:
-        l1 = find_rest(query[0], restaurant_list)
-        l2 = find_rest(query[1], restaurant_list)
+        l1 = find_rest(query[0], get_list())
+        l2 = find_rest(query[1], get_list())
     for rest1 in l1:
         for rest2 in l2:
             # Compares the restaurants' names from both lists
@@ -309,8 +406,8 @@ def create_or(query: list, l1: Restaurants, l2: Restaurants) -> Restaurants:
     # two lists already created, this condition makes sure the lists are
     # only created in the first case
     if len(l1) == 0 and len(l2) == 0:
-        l1 = find_rest(query[0], restaurant_list)
-        l2 = find_rest(query[1], restaurant_list)
+        l1 = find_rest(query[0], get_list())
+        l2 = find_rest(query[1], get_list())
     # As two lists have been merged, removes the restaurants that have been
     # dupplicated
     for rest2 in l2:
@@ -338,12 +435,71 @@ def create_not(query: list, l1: Restaurants) -> Restaurants:
     # already created, this condition makes sure the list is only created
     # in the first case
     if len(l1) == 0:
-        l1 = find_rest(query[0], restaurant_list)
-    # Creates a list of all the restaurants from the cvs
-    l2 = find_rest('Barcelona', restaurant_list)
+        l1 = find_rest(query[0], get_list())
+    # Copies the list of all the restaurants from the cvs
+    l2 = list(get_list())
     for rest1 in l1:
         for rest2 in l2:
             # Compares the restaurants' names from both lists
             if rest1.name == rest2.name:
                 l2.remove(rest1)
     return l2
+
+
+###############
+# NEAR SEARCH #
+###############
+
+
+def near(location: Tuple[float, float], meters: Optional[float] = None,
+         query: str = '', k: int = spatial.K
+         ) -> List[Tuple[Restaurant, float]]:
+    """
+    Function: Finds the nearest restaurants to a location, optionally within
+              a distance and matching a text (for example sushi within 800
+              meters).
+    Parameters: location -> (longitude, latitude) of the user, as the bot
+                            keeps it
+                meters -> largest distance (None: no limit)
+                query -> words the restaurants must match ('' for all)
+                k -> number of restaurants
+    Return: The restaurants and their distances (meters), nearest first.
+    """
+    every = get_list()
+    index = spatial.index_of(every)
+    allowed = None
+    if len(query.strip()) > 0:
+        allowed = np.zeros(len(every), dtype=bool)
+        allowed[list(ranking.index_of(every).scores(query))] = True
+    lon, lat = location
+    if meters is None:
+        found, distances = index.nearest(lat, lon, k, allowed)
+    else:
+        found, distances = index.radius(lat, lon, meters, allowed)
+    return [(every[i], float(d)) for i, d in zip(found[:k], distances[:k])]
+
+
+##########
+# SEARCH #
+##########
+
+
+def search(query: List[str]) -> Restaurants:
+    """
+    Function: Looks for the restaurants that satisfy a request of the /find
+              command, treating each different search as a particular case.
+    Parameters: query -> words of the request
+    Return: A list of the selected restaurants.
+    """
+    # Case1: multiple word search
+    if len(query) != 1:
+        return create_multiple(query)
+    # Splits the string by every non-word character found
+    pattern = r'\W+'
+    splited = re.split(pattern, query[0])
+    word1 = splited[0]
+    # Case2: logic search
+    if word1 == 'and' or word1 == 'or' or word1 == 'not':
+        return logic_search(splited, word1)
+    # Case3: diffuse search
+    return find_rest(query[0], get_list())
@@ -0,0 +1,620 @@
+"""
+This module exposes the routing and search core of the bot (the city graph
+and the restaurants) as a local service, so that several light bot
+frontends can share it instead of every process keeping the graphs in
+memory.
+The service speaks JSON over HTTP, on a TCP port or on a Unix socket. Every
+request is a batch of operations (find, complete, near, travel, routes,
+render, lookup and modes for the frontends, and update for the closures
+and slower lines) answered in the same order.
+The graphs are loaded once and then the process forks into several workers
+that accept connections on the same socket and share the loaded data (copy
+on write). The frontends call it with the Client of client.py, which does
+not import the routing modules.
+Usage: python3 service.py [--address 127.0.0.1:8765 | unix:/path/to.sock]
+                          [--workers N] [--kernels numba|python]
+"""
+
+# Library used to read the command line arguments
+import argparse
+# Library used to serialize the requests and the answers
+import json
+import base64
+import dataclasses
+# Library used to serve HTTP
+from http.server import BaseHTTPRequestHandler
+import socketserver
+# Library used to start and stop the workers
+import os
+import signal
+# Library used to write the images of the paths
+import tempfile
+# Library used to know the departure time of the journeys
+import datetime
+# Library used to access different data types
+from typing import Callable, Dict, List, Optional, Tuple
+# Library used to measure the startup phases
+import profiling
+# Library used to measure the operations of the service
+import metrics
+# Library used to access the city graph functions
+import city
+# Library used to access the metro graph functions
+import metro
+# Library used to access the restaurant functions
+import restaurants
+# Library used to complete the restaurants being typed
+import autocomplete
+# Library used to find the restaurants near a location
+import spatial
+# Library used to add the public transport feeds
+import gtfs
+# Library used to follow the timetables of the feeds
+import transit
+# Library used to share the city graph with its updates
+import updates
+# Library used to compute the landmarks of the searches
+import alt
+# Library used to search the fastest paths on the contracted graph
+import contract
+# Library used to search the fastest paths of the large graphs
+import overlay
+# Library used to choose and compile the search kernels
+import kernels
+# Library used to find the routes of the other modes
+import multicriteria
+# Library used to find the public transport feeds
+import glob
+# Library used to write the NumPy numbers of the answers
+from client import plain
+
+# Address used when none is given
+ADDRESS: str = '127.0.0.1:8765'
+# Graphs with more nodes (the metropolitan area) are searched through an
+# overlay, the smaller ones on the contracted graph, where it is slower
+OVERLAY_NODES: int = 100000
+
+
+class Router:
+    """
+    Class: Contains the routing and search core: the graphs, the landmarks
+           (used only without a contracted graph or an overlay), the
+           contracted graph or the overlay and the timetable, used by the
+           bot commands or by the service.
+    """
+
+    def __init__(self, ox_g: city.OsmnxGraph, g: city.CityGraph,
+                 landmarks: Optional[alt.Landmarks] = None,
+                 timetable: Optional[transit.Timetable] = None,
+                 contraction: Optional[contract.Contraction] = None,
+                 feeds: Optional[List[str]] = None,
+                 overlay: Optional[overlay.Overlay] = None) -> None:
+        self.ox_g = ox_g
+        self.g = g
+        self.landmarks = landmarks
+        self.timetable = timetable
+        self.contraction = contraction
+        self.overlay = overlay
+        # GTFS files of the timetable, read again every day
+        self.feeds = feeds
+        self.day = datetime.date.today()
+        updates.on_update(self.updated)
+
+    def updated(self, g: city.CityGraph, description: str) -> None:
+        """
+        Function: Contracts the city graph again or customizes its overlay
+                  right after an update (registered with updates.on_update),
+                  so that the next search does not wait for it.
+        Parameters: g -> the updated graph
+                    description -> what was updated
+        Return: None.
+        """
+        if g is self.g:
+            self.contracted()
+            self.overlaid()
+
+    def update(self, state: Dict) -> bool:
+        """
+        Function: Writes a new state of the network into the update file and
+                  applies it. The other workers of the service (and a bot
+                  that loads the graphs) apply it when their updates.Watcher
+                  sees the file.
+        Parameters: state -> the state of the network (see updates.FILENAME)
+        Return: True if the graph changed.
+        """
+        updates.write_state(state)
+        return updates.apply_state(self.g, state)
+
+    def today(self, day: datetime.date) -> Optional[transit.Timetable]:
+        """
+        Function: Gives the timetable of a day, reading it again from the
+                  feeds if it is of another day (with the lock held).
+        Parameters: day -> the day
+        Return: The timetable or None if the router does not use one.
+        """
+        if self.timetable is not None and self.feeds and day != self.day:
+            with metrics.phase('timetable build'):
+                self.timetable = transit.build_timetable(self.feeds, day)
+            self.day = day
+        return self.timetable
+
+    def contracted(self) -> Optional[contract.Contraction]:
+        """
+        Function: Gives the contracted graph, contracting the city graph
+                  again if it was updated (with the lock held).
+        Parameters: None
+        Return: The contraction or None if the router does not use one.
+        """
+        if self.contraction is not None and \
+                not self.contraction.valid(self.g):
+            with metrics.phase('contraction'):
+                self.contraction = contract.contract(self.g)
+        return self.contraction
+
+    def overlaid(self) -> Optional[overlay.Overlay]:
+        """
+        Function: Gives the overlay, customizing it again if the times of the
+                  city graph were updated, or partitioning the graph again
+                  if its edges were (with the lock held).
+        Parameters: None
+        Return: The overlay or None if the router does not use one.
+        """
+        if self.overlay is not None and not self.overlay.valid(self.g):
+            with metrics.phase('customization'):
+                self.overlay = overlay.refresh(self.overlay, self.g)
+        return self.overlay
+
+    def snap_restaurants(self, snapshot: restaurants.Snapshot) -> None:
+        """
+        Function: Snaps all the restaurants of a new restaurant list, so that
+                  the commands do not snap them (registered with
+                  restaurants.on_reload).
+        Parameters: snapshot -> the new restaurant list
+        Return: None.
+        """
+        city.set_snap_table(self.ox_g, [(float(r.y_coord), float(r.x_coord))
+                                        for r in snapshot.restaurants])
+
+    def lookup(self, ids: List[int]
+               ) -> List[Optional[restaurants.Restaurant]]:
+        """
+        Function: Gives the restaurants of some identifiers.
+        Parameters: ids -> identifiers of the restaurants
+        Return: The restaurants, None for the ones removed by a reload.
+        """
+        return [restaurants.by_id(id) for id in ids]
+
+    def modes(self) -> List[str]:
+        """
+        Function: Gives the modes of travel.
+        Parameters: None
+        Return: The names of multicriteria.MODES.
+        """
+        return list(multicriteria.MODES)
+
+    def find(self, query: List[str],
+             k: Optional[int] = None) -> restaurants.Restaurants:
+        """
+        Function: Looks for the restaurants that satisfy a request, counting
+                  all of them as search candidates.
+        Parameters: query -> words of the request
+                    k -> number of restaurants (None: all of them)
+        Return: A list of the selected restaurants, the k first ones.
+        """
+        found = restaurants.search(query)
+        metrics.record('search_candidates', len(found))
+        return found if k is None else found[:k]
+
+    def complete(self, query: str,
+                 k: int = autocomplete.K) -> restaurants.Restaurants:
+        """
+        Function: Completes the name or type of a restaurant being typed.
+        Parameters: query -> the text typed
+                    k -> number of restaurants
+        Return: A list of the restaurants that start with the text.
+        """
+        every = restaurants.get_list()
+        return [every[i] for i in
+                autocomplete.completer_of(every).complete(query, k)]
+
+    def near(self, location: city.Coord, meters: Optional[float] = None,
+             query: str = '', k: int = spatial.K
+             ) -> List[Tuple[restaurants.Restaurant, float]]:
+        """
+        Function: Finds the nearest restaurants to a location.
+        Parameters: location -> the location
+                    meters -> largest distance (None: no limit)
+                    query -> words the restaurants must match
+                    k -> number of restaurants
+        Return: The restaurants and their distances, nearest first.
+        """
+        return restaurants.near(location, meters, query, k)
+
+    def travel(self, src: city.Coord, dst: city.Coord,
+               mode: str = 'fastest') -> Tuple[city.Path, float]:
+        """
+        Function: Finds the path of a mode and its travel time leaving now,
+                  waiting for the trips of today's timetable on the rides
+                  of the feeds.
+        Parameters: src -> Coordinate of the starting point
+                    dst -> Coordinate of the final point
+                    mode -> one of multicriteria.MODES
+        Return: The path (between the src and dst nodes) and the travel
+                time in seconds.
+        """
+        with updates.lock:
+            try:
+                if mode == 'fastest' and self.overlay is not None:
+                    path = overlay.find_path(self.ox_g, self.g,
+                                             self.overlaid(), src, dst)
+                elif mode == 'fastest' and self.contraction is not None:
+                    # Dijkstra on the contracted graph is faster than the
+                    # landmarks, whose bounds cover every node of the graph
+                    path = contract.find_path(self.ox_g, self.g,
+                                              self.contracted(), src, dst)
+                elif mode == 'fastest':
+                    path = city.find_path(self.ox_g, self.g, src, dst,
+                                          self.landmarks)
+                else:
+                    path = multicriteria.find_path(self.ox_g, self.g, src,
+                                                   dst, mode)
+                now = datetime.datetime.now()
+                timetable = self.today(now.date())
+                if timetable is not None and len(timetable.trip) > 0:
+                    departure = now.hour * 3600 + now.minute * 60 + \
+                        now.second
+                    with metrics.phase('timetable'):
+                        time = transit.path_time(timetable, self.g, path,
+                                                 departure)
+                        if time is None:
+                            # No trip left today for a ride of the path:
+                            # the earliest arrival is given instead
+                            time = transit.earliest_arrival(
+                                timetable, self.g, self.ox_g, src, dst,
+                                departure).duration()
+                else:
+                    with metrics.phase('time sum'):
+                        time = city.time(self.g, path)
+            finally:
+                city.delete_additional_nodes(self.g)
+        return path, time
+
+    def routes(self, src: city.Coord, dst: city.Coord,
+               k: int = 3) -> List[Tuple[float, List[str]]]:
+        """
+        Function: Finds different routes and the transports they use.
+        Parameters: src -> Coordinate of the starting point
+                    dst -> Coordinate of the final point
+                    k -> largest number of routes
+        Return: The travel time and the transports (Metro and the feeds,
+                none if walking) of every route.
+        """
+        with updates.lock:
+            try:
+                found = city.find_routes(self.ox_g, self.g, src, dst, k)
+                result: List[Tuple[float, List[str]]] = []
+                for route in found:
+                    types = {self.g.edges[route.path[j-1], route.path[j]][
+                        "attributes"].type for j in range(1,
+                                                          len(route.path))}
+                    types = sorted(types - {"Street", "Access", "Link"})
+                    if "Railway" in types:
+                        types[types.index("Railway")] = "Metro"
+                    result.append((route.time, types))
+            finally:
+                city.delete_additional_nodes(self.g)
+        return result
+
+    def render(self, path: city.Path, src: city.Coord,
+               dst: city.Coord) -> bytes:
+        """
+        Function: Plots a path over the map of Barcelona.
+        Parameters: path -> the path found by travel
+                    src -> Coordinate of the starting point
+                    dst -> Coordinate of the final point
+        Return: The PNG image.
+        """
+        handle, filename = tempfile.mkstemp(suffix='.png')
+        os.close(handle)
+        try:
+            with updates.lock:
+                try:
+                    city.add_additional_nodes(self.ox_g, self.g, src, dst)
+                    city.plot_path(path, self.g, filename)
+                finally:
+                    city.delete_additional_nodes(self.g)
+            with open(filename, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(filename)
+
+
+def load() -> Tuple[Router, List[gtfs.FeedReport]]:
+    """
+    Function: Loads the graphs, the feeds of the gtfs folder and today's
+              timetable from the current folder, and contracts the city
+              graph (or builds its overlay if it is larger than
+              OVERLAY_NODES). The landmarks are not computed: the fastest
+              paths are searched on the contracted graph or the overlay,
+              where they are slower.
+    Parameters: None
+    Return: The router and the report of every feed.
+    """
+    # Downloads bcn graph
+    with profiling.phase('street load'):
+        bcn_graph = city.load_osmnx_graph('graf.npz')
+    # Downloads metro graph
+    with profiling.phase('metro build'):
+        metro_graph = metro.get_metro_graph(cache=True)
+    # Creates a graph with bcn graph and metro graph.
+    with profiling.phase('city build'):
+        g = city.build_city_graph(bcn_graph, metro_graph)
+    # Adds the public transport feeds (GTFS zip files) of the gtfs folder
+    with profiling.phase('gtfs build'):
+        reports = gtfs.add_feeds(g, bcn_graph,
+                                 sorted(glob.glob('gtfs/*.zip')))
+    # Reads today's timetable of the feeds, used to compute travel times
+    # that follow the schedules
+    with profiling.phase('timetable build'):
+        feeds = sorted(glob.glob('gtfs/*.zip'))
+        timetable = transit.build_timetable(feeds, datetime.date.today())
+    # Compiles the search kernels, or loads them from the disk cache
+    with profiling.phase('kernels'):
+        kernels.warm()
+    # Contracts the chains of street nodes, where the fastest paths are
+    # searched (contracted again after every update of the graph). The large
+    # graphs are partitioned instead, and customized again after the updates
+    contraction, cells = None, None
+    if g.number_of_nodes() > OVERLAY_NODES:
+        with profiling.phase('overlay'):
+            cells = overlay.Overlay(g)
+    else:
+        with profiling.phase('contraction'):
+            contraction = contract.contract(g)
+    return Router(bcn_graph, g, None, timetable, contraction, feeds,
+                  cells), reports
+
+
+def handle(router: Router, request: Dict) -> Dict:
+    """
+    Function: Runs an operation of a batch.
+    Parameters: router -> the routing and search core
+                request -> the operation (op) and its arguments
+    Return: The result or the error of the operation.
+    """
+    op = request.get('op')
+    try:
+        with metrics.request('service_' + str(op)):
+            if op == 'find':
+                found = router.find(request['query'], request.get('k'))
+                return {'result': [restaurants.restaurant_id(r)
+                                   for r in found]}
+            if op == 'complete':
+                found = router.complete(request['query'],
+                                        request.get('k') or autocomplete.K)
+                return {'result': [restaurants.restaurant_id(r)
+                                   for r in found]}
+            if op == 'near':
+                found = router.near(request['location'],
+                                    request.get('meters'),
+                                    request.get('query', ''),
+                                    request.get('k') or spatial.K)
+                return {'result': [[restaurants.restaurant_id(r), meters]
+                                   for r, meters in found]}
+            if op == 'lookup':
+                return {'result': [None if r is None else
+                                   list(dataclasses.astuple(r))
+                                   for r in router.lookup(request['ids'])]}
+            if op == 'modes':
+                return {'result': router.modes()}
+            if op == 'update':
+                return {'result': router.update(request['state'])}
+            if op == 'travel':
+                path, time = router.travel(request['src'], request['dst'],
+                                           request.get('mode', 'fastest'))
+                return {'result': {'path': path, 'time': time}}
+            if op == 'routes':
+                return {'result': router.routes(request['src'],
+                                                request['dst'],
+                                                request.get('k', 3))}
+            if op == 'render':
+                image = router.render(request['path'], request['src'],
+                                      request['dst'])
+                return {'result': base64.b64encode(image).decode()}
+            raise ValueError("Unknown operation: " + str(op))
+    except Exception as error:
+        return {'error': type(error).__name__, 'message': str(error)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Class: Contains the answers to the HTTP requests of the service: POST
+           /batch runs a list of operations and GET /health tells that the
+           worker is alive.
+    """
+    # Keeps the connections open between requests and sends the small
+    # answers at once
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def reply(self, status: int, answer) -> None:
+        """
+        Function: Sends a JSON answer.
+        Parameters: status -> HTTP status code
+                    answer -> the answer
+        Return: None.
+        """
+        body = json.dumps(answer, default=plain).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        # The clients forget the restaurants they keep when it changes
+        self.send_header('X-Restaurants-Version',
+                         str(restaurants.snapshot().version))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        """
+        Function: Answers the health checks.
+        """
+        if self.path == '/health':
+            self.reply(200, {'pid': os.getpid(),
+                             'version': updates.version(self.server.router.g),
+                             'restaurants': restaurants.snapshot().version})
+        else:
+            self.reply(404, {'error': 'NotFound', 'message': self.path})
+
+    def do_POST(self) -> None:
+        """
+        Function: Runs a batch of operations.
+        """
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            batch = json.loads(self.rfile.read(length))
+        except ValueError as error:
+            self.reply(400, {'error': 'BadRequest', 'message': str(error)})
+            return
+        if self.path != '/batch' or not isinstance(batch, list):
+            self.reply(404, {'error': 'NotFound', 'message': self.path})
+            return
+        self.reply(200, [handle(self.server.router, r) for r in batch])
+
+    def log_message(self, format, *args) -> None:
+        # The operations are measured by the metrics module instead
+        pass
+
+
+class UnixHandler(Handler):
+    """
+    Class: Contains the answers of the service on a Unix socket, which has
+           no Nagle algorithm to disable.
+    """
+    disable_nagle_algorithm = False
+
+
+class TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    Class: Contains a service that listens on a TCP port.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class UnixServer(socketserver.ThreadingMixIn,
+                 socketserver.UnixStreamServer):
+    """
+    Class: Contains a service that listens on a Unix socket.
+    """
+    daemon_threads = True
+
+
+def make_server(router: Router, address: str) -> socketserver.BaseServer:
+    """
+    Function: Creates the server of the service, listening on an address.
+    Parameters: router -> the routing and search core
+                address -> host:port or unix:/path/to.sock
+    Return: The server.
+    """
+    if address.startswith('unix:'):
+        filename = address[len('unix:'):]
+        if os.path.exists(filename):
+            os.remove(filename)
+        server = UnixServer(filename, UnixHandler)
+    else:
+        host, port = address.rsplit(':', 1)
+        server = TCPServer((host, int(port)), Handler)
+    server.router = router
+    return server
+
+
+def stop(signum, frame) -> None:
+    """
+    Function: Stops the main process of the service when it is terminated.
+    Parameters: signum, frame -> the signal received
+    Return: None.
+    """
+    raise KeyboardInterrupt
+
+
+def serve(router: Router, address: str, workers: int = 1,
+          on_start: Optional[Callable[[], None]] = None) -> None:
+    """
+    Function: Serves the router until the process is stopped. With more than
+              one worker, the process forks after loading the data and every
+              worker accepts connections on the same socket.
+    Parameters: router -> the routing and search core
+                address -> host:port or unix:/path/to.sock
+                workers -> number of worker processes
+                on_start -> function called in every worker when it starts
+                            (the threads are not copied by fork)
+    Return: None.
+    """
+    server = make_server(router, address)
+    if workers <= 1 or not hasattr(os, 'fork'):
+        if on_start is not None:
+            on_start()
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+        return
+    # Stopping the main process stops the workers
+    signal.signal(signal.SIGTERM, stop)
+    children: List[int] = []
+    for i in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            if on_start is not None:
+                on_start()
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        server.server_close()
+
+
+def main() -> None:
+    """
+    Function: Loads the data of the current folder and serves it.
+    Parameters: None (command line arguments)
+    Return: None.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--address', default=ADDRESS,
+                        help='host:port or unix:/path/to.sock')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--kernels', choices=kernels.BACKENDS, default=None,
+                        help='backend of the search kernels (default: '
+                        'numba if it is installed)')
+    args = parser.parse_args()
+    kernels.select(args.kernels)
+    router, reports = load()
+    # The restaurants are read and snapped before forking so that the
+    # workers share them. Every worker reloads them when the file changes,
+    # and follows the update file of the graph
+    restaurants.on_reload(router.snap_restaurants)
+    router.snap_restaurants(restaurants.snapshot())
+    print("Serving on {} with {} workers".format(args.address, args.workers))
+
+    def start() -> None:
+        restaurants.Reloader().start()
+        updates.Watcher(router.g).start()
+    serve(router, args.address, args.workers, start)
+
+
+if __name__ == '__main__':
+    main()
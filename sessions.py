@@ -0,0 +1,382 @@
+"""
+This module keeps the state of every user of the bot (location, restaurants
+of the last search and last path) in a store that can be kept in memory or
+on disk, so that it survives a restart and its size is bounded.
+The state is stored compactly: the restaurants as their identifiers, which
+do not change when the restaurant list is reloaded, and the paths as the
+differences between the positions of consecutive nodes in the city graph,
+written as variable length integers.
+Sessions not used for a while (TTL) are evicted.
+"""
+
+# Postpones the evaluation of annotations, so that the city graph module
+# used in them does not have to be imported
+from __future__ import annotations
+# Library used to initialize classes
+from dataclasses import dataclass, field, asdict
+# Library used to access different data types
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+# Library used to keep the sessions in least recently used order
+from collections import OrderedDict
+# Library used to store the sessions on disk
+import sqlite3
+# Library used to serialize the sessions
+import json
+import base64
+# Library used to compute the fingerprint of the city graph
+import hashlib
+# Library used to know when a session was used
+import time
+# Library used to share the stores among the threads of the bot
+import threading
+# Library used to give the identifiers of the restaurants
+import records
+
+# The city graph is only used for the types, so the bots that use a routing
+# service do not import the routing modules
+if TYPE_CHECKING:
+    import city
+
+# Sessions not used for this time (seconds) are evicted
+TTL: float = 7 * 24 * 3600
+# Largest number of sessions kept in memory
+MAX_SESSIONS: int = 10000
+# Nodes added to the city graph by every search
+ADDITIONAL: Tuple[str, str] = ('src', 'dst')
+# Identifier kept for a restaurant removed by a reload, so the numbers of the
+# other ones do not change (no name hashes to it in practice)
+REMOVED: int = 0
+
+
+@dataclass
+class Session:
+    """
+    Class: Contains the compact state of a user.
+    """
+    received_loc: bool = False
+    done_find: bool = False
+    location: Optional[List[float]] = None
+    selection: List[int] = field(default_factory=list)  # Restaurant ids
+    path: bytes = b''               # Encoded path (see encode_path)
+    version: int = 0                # Version of the graph of the path
+    graph: str = ''                 # Fingerprint of the graph of the path
+    updated: float = 0.0            # Last time it was used
+
+    def to_bytes(self) -> bytes:
+        """
+        Function: Serializes the session.
+        Parameters: None
+        Return: The session as JSON bytes.
+        """
+        data = asdict(self)
+        data['path'] = base64.b64encode(self.path).decode()
+        return json.dumps(data, separators=(',', ':')).encode()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'Session':
+        """
+        Function: Reads a session serialized with to_bytes.
+        Parameters: data -> JSON bytes
+        Return: The session.
+        """
+        fields = json.loads(data)
+        fields['path'] = base64.b64decode(fields['path'])
+        return Session(**fields)
+
+
+def write_varint(out: bytearray, number: int) -> None:
+    """
+    Function: Writes a signed integer with zigzag and variable length
+              encoding (7 bits per byte), so small numbers use one byte.
+    Parameters: out -> where the bytes are written
+                number -> the integer
+    Return: None.
+    """
+    number = number * 2 if number >= 0 else -number * 2 - 1
+    while number >= 0x80:
+        out.append((number & 0x7F) | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+def read_varints(data: bytes) -> List[int]:
+    """
+    Function: Reads the integers written with write_varint.
+    Parameters: data -> the bytes
+    Return: The list of integers.
+    """
+    numbers: List[int] = []
+    number, shift = 0, 0
+    for byte in data:
+        number |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            numbers.append(number // 2 if number % 2 == 0
+                           else -(number + 1) // 2)
+            number, shift = 0, 0
+    return numbers
+
+
+def node_index(g: city.CityGraph) -> Tuple[List, Dict]:
+    """
+    Function: Gives the position of every node of the city graph, computed
+              once for every version of the graph.
+    Parameters: g -> City graph
+    Return: The list of nodes and the position of every node.
+    """
+    version = g.graph.get('version', 0)
+    cached = g.graph.get('node_index')
+    if cached is None or cached[0] != version:
+        nodes = [n for n in g.nodes if n not in ADDITIONAL]
+        edges = sum(1 for u, v in g.edges
+                    if u not in ADDITIONAL and v not in ADDITIONAL)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update('{} {}'.format(len(nodes), edges).encode())
+        for n in nodes:
+            digest.update(repr(n).encode() + b'\0')
+        cached = (version, nodes, {n: i for i, n in enumerate(nodes)},
+                  digest.hexdigest())
+        g.graph['node_index'] = cached
+    return cached[1], cached[2]
+
+
+def fingerprint(g: city.CityGraph) -> str:
+    """
+    Function: Gives a fingerprint of the order of the nodes of the city graph
+              and of its number of nodes and edges, which is the same on
+              every run for the same graph (the version is not: it starts at
+              0 on every start of the bot).
+    Parameters: g -> City graph
+    Return: The fingerprint (hexadecimal).
+    """
+    node_index(g)
+    return g.graph['node_index'][3]
+
+
+def encode_path(g: city.CityGraph, path: city.Path) -> bytes:
+    """
+    Function: Encodes a path as the differences between the positions of its
+              consecutive nodes. The src and dst nodes of the searches are
+              written as a first number with two flags.
+    Parameters: g -> City graph
+                path -> the path
+    Return: The encoded path.
+    """
+    nodes, index = node_index(g)
+    inner = list(path)
+    flags = 0
+    if len(inner) > 0 and inner[0] == ADDITIONAL[0]:
+        flags |= 1
+        inner = inner[1:]
+    if len(inner) > 0 and inner[-1] == ADDITIONAL[1]:
+        flags |= 2
+        inner = inner[:-1]
+    out = bytearray()
+    write_varint(out, flags)
+    previous = 0
+    for node in inner:
+        write_varint(out, index[node] - previous)
+        previous = index[node]
+    return bytes(out)
+
+
+def decode_path(g: city.CityGraph, data: bytes) -> city.Path:
+    """
+    Function: Decodes a path encoded with encode_path.
+    Parameters: g -> City graph (the same version used to encode it)
+                data -> the encoded path
+    Return: The path.
+    """
+    if len(data) == 0:
+        return []
+    nodes, index = node_index(g)
+    numbers = read_varints(data)
+    path: city.Path = [ADDITIONAL[0]] if numbers[0] & 1 else []
+    position = 0
+    for delta in numbers[1:]:
+        position += delta
+        path.append(nodes[position])
+    if numbers[0] & 2:
+        path.append(ADDITIONAL[1])
+    return path
+
+
+def pack(user_data: Dict, g: Optional[city.CityGraph]) -> Session:
+    """
+    Function: Converts the user data of the bot into a compact session.
+    Parameters: user_data -> dictionary used by the bot commands
+                g -> City graph of the paths (None if the bot uses a
+                     routing service: the paths are not kept)
+    Return: The session.
+    """
+    session = Session(user_data.get('received_loc', False),
+                      user_data.get('done_find', False),
+                      user_data.get('location'))
+    session.selection = [REMOVED if r is None else
+                         records.restaurant_id(r) for r in
+                         user_data.get('selection_list', [])]
+    if 'path' in user_data and g is not None:
+        try:
+            session.path = encode_path(g, user_data['path'])
+        except KeyError:
+            # A node of the path was removed by an update of the graph
+            session.path = b''
+        session.version = g.graph.get('version', 0)
+        session.graph = fingerprint(g)
+    session.updated = time.time()
+    return session
+
+
+def unpack(session: Session, g: Optional[city.CityGraph],
+           lookup: Optional[Callable[[List[int]], List[
+               Optional[records.Restaurant]]]] = None) -> Dict:
+    """
+    Function: Converts a session into the user data used by the bot commands.
+              A path of another graph (or of an older version of it, if the
+              bot was not restarted meanwhile) is dropped and the
+              restaurants removed by a reload of the restaurant list are
+              kept as None (the others keep their numbers).
+    Parameters: session -> the session
+                g -> City graph of the paths (or None)
+                lookup -> gives the restaurants of some identifiers, for
+                          example Router.lookup (restaurants.by_id if None)
+    Return: The user data.
+    """
+    if lookup is None:
+        # Imported only here, as the frontends of a routing service give
+        # the lookup of the service
+        import restaurants
+        selection = [restaurants.by_id(id) for id in session.selection]
+    else:
+        selection = lookup(session.selection)
+    user_data = {'received_loc': session.received_loc,
+                 'done_find': session.done_find,
+                 'selection_list': selection}
+    if session.location is not None:
+        user_data['location'] = session.location
+    if len(session.path) > 0 and g is not None and \
+            session.version == g.graph.get('version', 0) and \
+            session.graph == fingerprint(g):
+        user_data['path'] = decode_path(g, session.path)
+    return user_data
+
+
+class MemoryStore:
+    """
+    Class: Contains the sessions in memory, evicting the least recently used
+           ones when there are too many and the ones older than the TTL.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS,
+                 ttl: float = TTL) -> None:
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.sessions: 'OrderedDict[int, bytes]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user: int) -> Optional[Session]:
+        """
+        Function: Gives the session of a user.
+        Parameters: user -> chat identifier
+        Return: The session or None if there is none or it expired.
+        """
+        with self.lock:
+            data = self.sessions.get(user)
+            if data is None:
+                return None
+            session = Session.from_bytes(data)
+            if time.time() - session.updated > self.ttl:
+                del self.sessions[user]
+                return None
+            self.sessions.move_to_end(user)
+            return session
+
+    def put(self, user: int, session: Session) -> None:
+        """
+        Function: Stores the session of a user.
+        Parameters: user -> chat identifier
+                    session -> the session
+        Return: None.
+        """
+        with self.lock:
+            self.sessions[user] = session.to_bytes()
+            self.sessions.move_to_end(user)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def evict(self) -> int:
+        """
+        Function: Removes the expired sessions.
+        Parameters: None
+        Return: The number of sessions removed.
+        """
+        limit = time.time() - self.ttl
+        with self.lock:
+            old = [user for user, data in self.sessions.items()
+                   if Session.from_bytes(data).updated < limit]
+            for user in old:
+                del self.sessions[user]
+        return len(old)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+
+class SQLiteStore:
+    """
+    Class: Contains the sessions in a SQLite file, so that they survive a
+           restart of the bot.
+    """
+
+    def __init__(self, filename: str, ttl: float = TTL) -> None:
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS sessions (user INTEGER "
+                        "PRIMARY KEY, data BLOB, updated REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON "
+                        "sessions (updated)")
+        self.db.commit()
+
+    def get(self, user: int) -> Optional[Session]:
+        """
+        Function: Gives the session of a user.
+        Parameters: user -> chat identifier
+        Return: The session or None if there is none or it expired.
+        """
+        with self.lock:
+            row = self.db.execute("SELECT data, updated FROM sessions WHERE "
+                                  "user = ?", (user,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return Session.from_bytes(row[0])
+
+    def put(self, user: int, session: Session) -> None:
+        """
+        Function: Stores the session of a user.
+        Parameters: user -> chat identifier
+                    session -> the session
+        Return: None.
+        """
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO sessions VALUES "
+                            "(?, ?, ?)", (user, session.to_bytes(),
+                                          session.updated))
+            self.db.commit()
+
+    def evict(self) -> int:
+        """
+        Function: Removes the expired sessions.
+        Parameters: None
+        Return: The number of sessions removed.
+        """
+        with self.lock:
+            removed = self.db.execute("DELETE FROM sessions WHERE updated "
+                                      "< ?", (time.time() - self.ttl,))
+            self.db.commit()
+            return removed.rowcount
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM sessions"
+                                   ).fetchone()[0]
@@ -0,0 +1,185 @@
+"""
+This module finds the restaurants near a location without going through the
+whole list. The coordinates are projected to meters around the mean
+latitude and the restaurants are sorted by the square cell of a grid that
+contains them, so the restaurants of a row of cells are contiguous and a
+rectangle of cells is read with one slice per row. The radius and nearest
+queries read the cells around the location and compute the exact
+(haversine) distance of those restaurants only; the text filters are masks
+of the restaurants allowed.
+"""
+
+# Library used to access different data types
+from typing import Optional, Sequence, Tuple
+# Library used to keep the coordinates and the cells
+import numpy as np
+# Library used to keep the indexes of the last lists searched
+import caches
+
+# Side of the cells of the grid (meters)
+CELL: float = 250.0
+# Mean radius of the Earth (meters), the one used by haversine
+EARTH: float = 6371008.8
+# Restaurants given by default by the nearest queries
+K: int = 12
+
+
+def haversine(lat: float, lon: float, lats: np.ndarray,
+              lons: np.ndarray) -> np.ndarray:
+    """
+    Function: Computes the great circle distance from a point to many.
+    Parameters: lat, lon -> coordinates of the point (degrees)
+                lats, lons -> coordinates of the other points (degrees)
+    Return: The distances (meters).
+    """
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + \
+        np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """
+    Class: Contains the coordinates of a list of restaurants and the grid of
+           cells that sorts them.
+    """
+
+    def __init__(self, restaurants: Sequence, cell: float = CELL) -> None:
+        self.size = len(restaurants)
+        self.cell = cell
+        # x_coord is the latitude and y_coord the longitude
+        self.lat = np.array([r.x_coord for r in restaurants], dtype=float)
+        self.lon = np.array([r.y_coord for r in restaurants], dtype=float)
+        valid = np.isfinite(self.lat) & np.isfinite(self.lon)
+        self.lat0 = float(self.lat[valid].mean()) if valid.any() else 0.0
+        self.lon0 = float(self.lon[valid].mean()) if valid.any() else 0.0
+        # Meters of a degree of longitude and of latitude
+        self.kx = EARTH * np.cos(np.radians(self.lat0)) * np.pi / 180
+        self.ky = EARTH * np.pi / 180
+        x, y = self.project(self.lat[valid], self.lon[valid])
+        self.x0 = float(x.min()) if len(x) > 0 else 0.0
+        self.y0 = float(y.min()) if len(y) > 0 else 0.0
+        cx = ((x - self.x0) // cell).astype(np.int64)
+        cy = ((y - self.y0) // cell).astype(np.int64)
+        self.width = int(cx.max()) + 1 if len(cx) > 0 else 1
+        self.height = int(cy.max()) + 1 if len(cy) > 0 else 1
+        cells = cy * self.width + cx
+        # Restaurants sorted by cell, the ones of cell c are
+        # order[offsets[c]:offsets[c + 1]]
+        positions = np.flatnonzero(valid)
+        sort = np.argsort(cells, kind='stable')
+        self.order = positions[sort]
+        self.offsets = np.zeros(self.width * self.height + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.width * self.height),
+                  out=self.offsets[1:])
+
+    def project(self, lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Function: Projects coordinates to meters around the mean location.
+        Parameters: lat, lon -> coordinates (degrees)
+        Return: The x and y coordinates (meters).
+        """
+        return ((np.asarray(lon) - self.lon0) * self.kx,
+                (np.asarray(lat) - self.lat0) * self.ky)
+
+    def rectangle(self, x_min: float, y_min: float, x_max: float,
+                  y_max: float) -> np.ndarray:
+        """
+        Function: Gives the restaurants of the cells that touch a rectangle.
+        Parameters: x_min, y_min, x_max, y_max -> the rectangle (meters)
+        Return: The positions of the restaurants.
+        """
+        cx0 = max(int((x_min - self.x0) // self.cell), 0)
+        cx1 = min(int((x_max - self.x0) // self.cell), self.width - 1)
+        cy0 = max(int((y_min - self.y0) // self.cell), 0)
+        cy1 = min(int((y_max - self.y0) // self.cell), self.height - 1)
+        if cx0 > cx1 or cy0 > cy1:
+            return self.order[:0]
+        rows = [self.order[self.offsets[cy * self.width + cx0]:
+                           self.offsets[cy * self.width + cx1 + 1]]
+                for cy in range(cy0, cy1 + 1)]
+        return np.concatenate(rows)
+
+    def bbox(self, south: float, west: float, north: float, east: float,
+             allowed: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Function: Finds the restaurants inside a bounding box.
+        Parameters: south, west, north, east -> limits of the box (degrees)
+                    allowed -> mask of the restaurants allowed (or None)
+        Return: The sorted positions of the restaurants.
+        """
+        (x_min, x_max), (y_min, y_max) = self.project([south, north],
+                                                      [west, east])
+        found = self.rectangle(x_min, y_min, x_max, y_max)
+        inside = (self.lat[found] >= south) & (self.lat[found] <= north) & \
+            (self.lon[found] >= west) & (self.lon[found] <= east)
+        if allowed is not None:
+            inside &= allowed[found]
+        return np.sort(found[inside])
+
+    def radius(self, lat: float, lon: float, meters: float,
+               allowed: Optional[np.ndarray] = None
+               ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Function: Finds the restaurants at a distance from a location.
+        Parameters: lat, lon -> the location (degrees)
+                    meters -> largest distance
+                    allowed -> mask of the restaurants allowed (or None)
+        Return: The positions of the restaurants and their distances, the
+                nearest first.
+        """
+        x, y = self.project(lat, lon)
+        # The projection is exact at the mean latitude and differs less
+        # than 1% within a degree of it, so the rectangle has a margin
+        margin = meters * 1.01 + 1
+        found = self.rectangle(x - margin, y - margin, x + margin,
+                               y + margin)
+        if allowed is not None:
+            found = found[allowed[found]]
+        distances = haversine(lat, lon, self.lat[found], self.lon[found])
+        inside = distances <= meters
+        found, distances = found[inside], distances[inside]
+        sort = np.lexsort((found, distances))
+        return found[sort], distances[sort]
+
+    def nearest(self, lat: float, lon: float, k: int = K,
+                allowed: Optional[np.ndarray] = None
+                ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Function: Finds the nearest restaurants to a location, doubling the
+                  radius of the search until there are enough of them.
+        Parameters: lat, lon -> the location (degrees)
+                    k -> number of restaurants
+                    allowed -> mask of the restaurants allowed (or None)
+        Return: The positions of the restaurants and their distances, the
+                nearest first.
+        """
+        x, y = self.project(lat, lon)
+        # Distance from the location to the farthest corner of the grid
+        far = np.hypot(max(abs(x - self.x0),
+                           abs(self.x0 + self.width * self.cell - x)),
+                       max(abs(y - self.y0),
+                           abs(self.y0 + self.height * self.cell - y)))
+        meters = self.cell
+        while True:
+            found, distances = self.radius(lat, lon, meters, allowed)
+            if len(found) >= k or meters > 2 * far:
+                return found[:k], distances[:k]
+            meters *= 2
+
+
+# Indexes of the last lists searched
+INDEXES: int = 4
+_indexes: 'caches.ListCache[SpatialIndex]' = \
+    caches.ListCache(SpatialIndex, INDEXES)
+
+
+def index_of(restaurants: Sequence) -> SpatialIndex:
+    """
+    Function: Gives the spatial index of a list of restaurants, built the
+              first time the list is searched.
+    Parameters: restaurants -> the list
+    Return: The index.
+    """
+    return _indexes.get(restaurants)
@@ -0,0 +1,442 @@
+"""
+This module finds journeys by public transport that follow the timetables of
+the GTFS feeds, instead of using an average speed for every edge.
+The timetable of a day is stored as a list of connections (a vehicle going
+from a stop to the next one at a given time) sorted by departure time, and
+the earliest arrival is found with the Connection Scan Algorithm, with
+walking legs from the origin and to the destination along the streets of the
+city graph.
+"""
+
+# Library used to initialize classes
+from dataclasses import dataclass, field
+# Library used to access different data types
+from typing import Dict, List, Optional, Tuple
+# Library used to find the first connection after the departure time
+import bisect
+# Library used to read the feeds
+import datetime
+import zipfile
+# Library used to manipulate graphs
+import networkx as nx
+# Library used to calculate distances between two points
+import haversine as hs
+# Libraries used to read the feeds and to walk on the city graph
+import city
+import gtfs
+
+INFINITY: int = 2**31 - 1
+# Longest walk (seconds) from the origin or to the destination
+MAX_WALK: float = 15 * 60
+# Stops closer than this distance (meters) can be changed on foot
+TRANSFER_DISTANCE: float = 300.0
+# Walking distance over straight line distance between two stops
+DETOUR: float = 1.3
+# Seconds of a day: the trips of the day before with times past 24:00 run
+# after midnight
+DAY: int = 24 * 3600
+
+
+@dataclass
+class Timetable:
+    """
+    Class: Contains the connections of a day sorted by departure time, in
+           parallel lists, and the footpaths between stops.
+    """
+    stops: List[str] = field(default_factory=list)   # City graph node
+    stop_numbers: Dict[str, int] = field(default_factory=dict)
+    stop_locations: List[Tuple[float, float]] = field(default_factory=list)
+    routes: List[str] = field(default_factory=list)  # Route name of a trip
+    departure_stop: List[int] = field(default_factory=list)
+    arrival_stop: List[int] = field(default_factory=list)
+    departure_time: List[int] = field(default_factory=list)
+    arrival_time: List[int] = field(default_factory=list)
+    trip: List[int] = field(default_factory=list)
+    # Stops that can be reached on foot from every stop, with the time
+    footpaths: List[List[Tuple[int, float]]] = field(default_factory=list)
+    # (departure time, connection) of the connections leaving every stop
+    departures: List[List[Tuple[int, int]]] = field(default_factory=list)
+    # Next connection of the trip of every connection (-1 at the end)
+    next_connection: List[int] = field(default_factory=list)
+
+    def stop(self, node: str, location: Tuple[float, float]) -> int:
+        """
+        Function: Gives the number of a stop, adding it if it is new.
+        Parameters: node -> city graph node of the stop
+                    location -> (lon, lat) of the stop
+        Return: The number of the stop.
+        """
+        if node not in self.stop_numbers:
+            self.stop_numbers[node] = len(self.stops)
+            self.stops.append(node)
+            self.stop_locations.append(location)
+            self.footpaths.append([])
+            self.departures.append([])
+        return self.stop_numbers[node]
+
+
+@dataclass
+class Leg:
+    """
+    Class: Contains a part of a journey, on foot or on a vehicle.
+    """
+    kind: str               # 'walk' or 'ride'
+    nodes: List             # City graph nodes of the leg
+    departure: float        # Seconds after midnight
+    arrival: float          # Seconds after midnight
+    route: str = ''         # Route name of a ride
+
+
+@dataclass
+class Journey:
+    """
+    Class: Contains the earliest arrival journey between two points.
+    """
+    departure: float        # Seconds after midnight
+    arrival: float          # Seconds after midnight
+    legs: List[Leg]
+
+    def duration(self) -> float:
+        """
+        Function: Gives the travel time of the journey.
+        Parameters: None
+        Return: The travel time in seconds.
+        """
+        return self.arrival - self.departure
+
+
+def build_timetable(filenames: List[str],
+                    date: Optional[datetime.date] = None) -> Timetable:
+    """
+    Function: Reads the trips of a day of the GTFS feeds into a timetable,
+              with the part after midnight of the trips of the day before
+              (their times past 24:00, moved back a day).
+    Parameters: filenames -> list of GTFS zip files
+                date -> day of the trips (all the trips if not given)
+    Return: The timetable of the day.
+    """
+    tt = Timetable()
+    connections: List[Tuple[int, int, int, int, int]] = []
+    for filename in filenames:
+        feed = gtfs.Feed(gtfs.feed_name(filename))
+        with zipfile.ZipFile(filename) as zf:
+            stops = gtfs.read_stops(zf, feed)
+            routes = gtfs.read_routes(zf, feed)
+            late: Dict[str, int] = {}
+            if date is None:
+                trips = gtfs.read_trip_routes(zf, routes)
+            else:
+                trips = gtfs.read_trip_routes(
+                    zf, routes, gtfs.active_services(zf, date))
+                late = gtfs.read_trip_routes(
+                    zf, routes, gtfs.active_services(
+                        zf, date - datetime.timedelta(days=1)))
+            for trip_id, route, stop_times in gtfs.iter_trips(
+                    zf, stops, {**late, **trips}):
+                shifts = ([0] if trip_id in trips else []) + \
+                    ([DAY] if trip_id in late else [])
+                for shift in shifts:
+                    # Only the connections of the day of the timetable
+                    kept = [i for i in range(1, len(stop_times))
+                            if stop_times[i-1][2] >= shift]
+                    if len(kept) == 0:
+                        continue
+                    trip = len(tt.routes)
+                    tt.routes.append(feed.routes[route].name)
+                    numbers = [tt.stop(feed.node(s), (feed.stop_x[s],
+                                                      feed.stop_y[s]))
+                               for s, arrival, departure in stop_times]
+                    for i in kept:
+                        connections.append((stop_times[i-1][2] - shift,
+                                            stop_times[i][1] - shift,
+                                            numbers[i-1], numbers[i], trip))
+            gtfs.read_transfers(zf, feed, stops)
+        for (a, b), seconds in feed.transfers.items():
+            node_a, node_b = feed.node(a), feed.node(b)
+            if node_a in tt.stop_numbers and node_b in tt.stop_numbers:
+                if seconds is None:
+                    dist = hs.haversine((feed.stop_y[a], feed.stop_x[a]),
+                                        (feed.stop_y[b], feed.stop_x[b]),
+                                        unit='m')
+                    seconds = DETOUR * dist / city.get_speed('Street')
+                add_footpath(tt, tt.stop_numbers[node_a],
+                             tt.stop_numbers[node_b], seconds)
+    add_nearby_footpaths(tt)
+    connections.sort()
+    last: Dict[int, int] = {}
+    for dep_time, arr_time, dep_stop, arr_stop, trip in connections:
+        c = len(tt.trip)
+        tt.departure_time.append(dep_time)
+        tt.arrival_time.append(arr_time)
+        tt.departure_stop.append(dep_stop)
+        tt.arrival_stop.append(arr_stop)
+        tt.trip.append(trip)
+        tt.departures[dep_stop].append((dep_time, c))
+        tt.next_connection.append(-1)
+        if trip in last:
+            tt.next_connection[last[trip]] = c
+        last[trip] = c
+    return tt
+
+
+def add_footpath(tt: Timetable, a: int, b: int, seconds: float) -> None:
+    """
+    Function: Adds a footpath in both directions, keeping the shortest one.
+    Parameters: tt -> the timetable
+                a, b -> numbers of the stops
+                seconds -> walking time
+    Return: None.
+    """
+    for u, v in ((a, b), (b, a)):
+        paths = tt.footpaths[u]
+        for i in range(len(paths)):
+            if paths[i][0] == v:
+                paths[i] = (v, min(paths[i][1], seconds))
+                break
+        else:
+            paths.append((v, seconds))
+
+
+def add_nearby_footpaths(tt: Timetable) -> None:
+    """
+    Function: Adds footpaths between the stops closer than
+              TRANSFER_DISTANCE, looking only at the stops of the nearby
+              cells of a grid.
+    Parameters: tt -> the timetable
+    Return: None.
+    """
+    # Size of a cell in degrees (a bit larger than the transfer distance)
+    size = TRANSFER_DISTANCE / 80000
+    cells: Dict[Tuple[int, int], List[int]] = {}
+    for stop, (x, y) in enumerate(tt.stop_locations):
+        cells.setdefault((int(x // size), int(y // size)), []).append(stop)
+    for (cx, cy), group in cells.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for b in cells.get((cx + dx, cy + dy), []):
+                    for a in group:
+                        if a < b:
+                            xa, ya = tt.stop_locations[a]
+                            xb, yb = tt.stop_locations[b]
+                            dist = hs.haversine((ya, xa), (yb, xb), unit='m')
+                            if dist <= TRANSFER_DISTANCE:
+                                add_footpath(tt, a, b, DETOUR * dist /
+                                             city.get_speed('Street'))
+
+
+def walk_weight(u, v, data: Dict) -> Optional[float]:
+    """
+    Function: Weight of the edges that can be walked (streets), used to
+              restrict the walking legs to the streets.
+    Parameters: u, v -> nodes of the edge
+                data -> attributes of the edge
+    Return: The walking time or None if the edge is not a street.
+    """
+    if data['attributes'].type == 'Street':
+        return data['time']
+    return None
+
+
+def walk(g: city.CityGraph, node, limit: float) -> Tuple[Dict, Dict]:
+    """
+    Function: Finds the walking time from a node to all the nodes that can be
+              reached on foot in a given time.
+    Parameters: g -> City graph
+                node -> starting node
+                limit -> longest walking time (seconds)
+    Return: The predecessors and the walking time of every reached node.
+    """
+    return nx.dijkstra_predecessor_and_distance(g, node, cutoff=limit,
+                                                weight=walk_weight)
+
+
+def walk_path(pred: Dict, node) -> List:
+    """
+    Function: Rebuilds a walking path from the predecessors of a search.
+    Parameters: pred -> predecessors of the walking search
+                node -> last node of the path
+    Return: The list of nodes from the start of the search to node.
+    """
+    path = [node]
+    while len(pred[path[-1]]) > 0:
+        path.append(pred[path[-1]][0])
+    return path[::-1]
+
+
+def scan(tt: Timetable, sources: Dict[int, float], targets: Dict[int, float],
+         departure: float, direct: float = INFINITY) -> Tuple:
+    """
+    Function: Connection Scan Algorithm. Scans the connections in departure
+              order from the departure time and stops as soon as no
+              connection can improve the arrival at the destination.
+    Parameters: tt -> the timetable
+                sources -> arrival time at every stop reached from the origin
+                targets -> walking time from every stop to the destination
+                departure -> departure time (seconds after midnight)
+                direct -> arrival time walking all the way
+    Return: The best arrival time at the destination, the stop where the
+            last walk starts (None if walking is the best), the arrival
+            time at every stop and, for every
+            stop, how it was reached: ('ride', boarding connection,
+            connection), ('walk', stop, departure) or None (from the origin).
+    """
+    arrival = [INFINITY] * len(tt.stops)
+    how: List = [None] * len(tt.stops)
+    for stop, time in sources.items():
+        arrival[stop] = time
+    boarded: Dict[int, int] = {}
+    best, best_stop = direct, None
+    for stop, time in targets.items():
+        if arrival[stop] + time < best:
+            best, best_stop = arrival[stop] + time, stop
+    dep_stops, arr_stops = tt.departure_stop, tt.arrival_stop
+    dep_times, arr_times, trips = tt.departure_time, tt.arrival_time, tt.trip
+    start = bisect.bisect_left(dep_times, departure)
+    for c in range(start, len(dep_times)):
+        if dep_times[c] >= best:
+            break
+        trip = trips[c]
+        if trip not in boarded:
+            if arrival[dep_stops[c]] > dep_times[c]:
+                continue
+            boarded[trip] = c
+        stop = arr_stops[c]
+        if arr_times[c] < arrival[stop]:
+            arrival[stop] = arr_times[c]
+            how[stop] = ('ride', boarded[trip], c)
+            reached = [(stop, arr_times[c])]
+            for other, seconds in tt.footpaths[stop]:
+                if arr_times[c] + seconds < arrival[other]:
+                    arrival[other] = arr_times[c] + seconds
+                    how[other] = ('walk', stop, arr_times[c])
+                    reached.append((other, arrival[other]))
+            for s, time in reached:
+                if s in targets and time + targets[s] < best:
+                    best, best_stop = time + targets[s], s
+    return best, best_stop, arrival, how
+
+
+def is_ride(tt: Timetable, g: city.CityGraph, u, v) -> bool:
+    """
+    Function: Tells if an edge of the city graph is a ride of a feed.
+    Parameters: tt -> the timetable
+                g -> City graph
+                u, v -> nodes of the edge
+    Return: True if both nodes are stops and the edge is not a walk.
+    """
+    return u in tt.stop_numbers and v in tt.stop_numbers and \
+        g.edges[u, v]['attributes'].type not in ('Street', 'Link', 'Access')
+
+
+def path_time(tt: Timetable, g: city.CityGraph, path: city.Path,
+              departure: float) -> Optional[float]:
+    """
+    Function: Follows a path of the city graph leaving at a given time. Every
+              ride of a feed waits at its stop for the first trip of the
+              timetable that goes to the next stop of the path and stays on
+              it while the trip follows the path. The other edges (streets,
+              transfers and the metro, which has no timetable) take their
+              usual time.
+    Parameters: tt -> the timetable
+                g -> City graph (with the stops of the feeds)
+                path -> the path
+                departure -> departure time (seconds after midnight)
+    Return: The travel time in seconds or None if a ride of the path has no
+            trip left in the day.
+    """
+    clock = departure
+    i = 0
+    while i < len(path) - 1:
+        u, v = path[i], path[i + 1]
+        if not is_ride(tt, g, u, v):
+            clock += g.edges[u, v]['time']
+            i += 1
+            continue
+        stop, following = tt.stop_numbers[u], tt.stop_numbers[v]
+        leaving = tt.departures[stop]
+        c = -1
+        for k in range(bisect.bisect_left(leaving, (clock, -1)),
+                       len(leaving)):
+            if tt.arrival_stop[leaving[k][1]] == following:
+                c = leaving[k][1]
+                break
+        if c < 0:
+            return None
+        i += 1
+        # Stays on the trip while its next stop is the next one of the path
+        while i < len(path) - 1 and is_ride(tt, g, path[i], path[i + 1]):
+            n = tt.next_connection[c]
+            if n < 0 or tt.arrival_stop[n] != tt.stop_numbers[path[i + 1]]:
+                break
+            c = n
+            i += 1
+        clock = tt.arrival_time[c]
+    return clock - departure
+
+
+def earliest_arrival(tt: Timetable, g: city.CityGraph,
+                     ox_g: city.OsmnxGraph, src: city.Coord,
+                     dst: city.Coord, departure: float) -> Journey:
+    """
+    Function: Finds the journey that arrives first at the destination,
+              walking to a stop, riding vehicles that follow the timetable,
+              changing on foot between stops and walking to the destination,
+              or walking all the way if it is faster.
+    Parameters: tt -> the timetable
+                g -> City graph (with the stops of the feeds)
+                ox_g -> Barcelona's streets graph
+                src -> Coordinate of the starting point
+                dst -> Coordinate of the final point
+                departure -> departure time (seconds after midnight)
+    Return: The journey.
+    """
+    nodes, dist = city.snap(ox_g, [src, dst])
+    speed = city.get_speed('Street')
+    start_walk = departure + dist[0] / speed
+    end_walk = dist[1] / speed
+    pred_src, walk_src = walk(g, nodes[0], MAX_WALK)
+    pred_dst, walk_dst = walk(g, nodes[1], MAX_WALK)
+    sources = {tt.stop_numbers[n]: start_walk + t
+               for n, t in walk_src.items() if n in tt.stop_numbers}
+    targets = {tt.stop_numbers[n]: t + end_walk
+               for n, t in walk_dst.items() if n in tt.stop_numbers}
+    direct = INFINITY
+    if nodes[1] in walk_src:
+        direct = start_walk + walk_src[nodes[1]] + end_walk
+    best, best_stop, arrival, how = scan(tt, sources, targets, departure,
+                                         direct)
+    if best >= INFINITY:
+        # Too far to walk and no vehicle arrives: the walking time of the
+        # whole path is given
+        path = nx.shortest_path(g, nodes[0], nodes[1], weight=walk_weight)
+        total = start_walk + city.time(g, path) + end_walk
+        return Journey(departure, total,
+                       [Leg('walk', path, departure, total)])
+    if best_stop is None:
+        path = walk_path(pred_src, nodes[1])
+        return Journey(departure, best, [Leg('walk', path, departure, best)])
+    # Rebuilds the legs backwards from the last stop
+    legs: List[Leg] = [Leg('walk', walk_path(pred_dst,
+                                             tt.stops[best_stop])[::-1],
+                           best - targets[best_stop], best)]
+    stop = best_stop
+    while how[stop] is not None:
+        if how[stop][0] == 'walk':
+            previous = how[stop][1]
+            legs.append(Leg('walk', [tt.stops[previous], tt.stops[stop]],
+                            how[stop][2], arrival[stop]))
+            stop = previous
+        else:
+            first, last = how[stop][1], how[stop][2]
+            trip = tt.trip[last]
+            nodes_ride = [tt.stops[tt.departure_stop[first]]]
+            for c in range(first, last + 1):
+                if tt.trip[c] == trip:
+                    nodes_ride.append(tt.stops[tt.arrival_stop[c]])
+            legs.append(Leg('ride', nodes_ride, tt.departure_time[first],
+                            tt.arrival_time[last], tt.routes[trip]))
+            stop = tt.departure_stop[first]
+    first_stop = tt.stops[stop]
+    legs.append(Leg('walk', walk_path(pred_src, first_stop), departure,
+                    sources[stop]))
+    return Journey(departure, best, legs[::-1])
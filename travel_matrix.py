@@ -0,0 +1,213 @@
+"""
+This module computes travel time matrices between many origins and many
+destinations of the city graph, for reports such as the average travel time
+from every neighbourhood to every restaurant of a type.
+Every point is snapped to its nearest street node and a single Dijkstra
+search is done from every distinct node of the smaller side (the city graph
+is undirected, so the times are the same in both directions), with the
+Dijkstra kernel of the kernels module on the graph as arrays. The searches
+are split among a pool of processes and the matrix can be written as a
+NumPy (.npy or .npz) or Parquet file.
+Usage: python3 travel_matrix.py <restaurant type> <output file>
+                                [--workers N] [--max-time seconds]
+"""
+
+# Library used to read the command line arguments
+import argparse
+# Library used to run the searches in parallel
+from concurrent.futures import ProcessPoolExecutor
+import os
+# Library used to access different data types
+from typing import Dict, List, Optional, Sequence, Tuple
+# Library used to store the matrices
+import numpy as np
+# Library used to write the matrices as Parquet files
+import pandas as pd
+# Library used to access the city graph functions
+import city
+# Library used to search the graph as arrays
+import kernels
+
+# Nodes of the searches sent to a process at once
+CHUNK: int = 16
+
+# Graph of the processes of the pool, given once when they start
+_graph: Optional[kernels.CSR] = None
+
+
+def _start_worker(csr: kernels.CSR) -> None:
+    """
+    Function: Keeps the city graph in a process of the pool.
+    Parameters: csr -> City graph as arrays
+    Return: None.
+    """
+    global _graph
+    _graph = csr
+
+
+def _search(sources: List[city.NodeID], targets: List[city.NodeID],
+            max_time: Optional[float]) -> np.ndarray:
+    """
+    Function: Travel times from some nodes to all the targets, with one
+              Dijkstra search per source.
+    Parameters: sources -> nodes where the searches start
+                targets -> nodes whose times are kept
+                max_time -> searches stop after this time (None: no limit)
+    Return: A (sources x targets) array of times, infinite if a target was
+            not reached.
+    """
+    rows = np.full((len(sources), len(targets)), np.inf)
+    for i, source in enumerate(sources):
+        times = kernels.distances(_graph, {source: 0.0}, max_time)
+        rows[i] = [times.get(t, np.inf) for t in targets]
+    return rows
+
+
+def travel_matrix(ox_g: city.OsmnxGraph, g: city.CityGraph,
+                  origins: Sequence[city.Coord],
+                  destinations: Sequence[city.Coord],
+                  workers: Optional[int] = None,
+                  max_time: Optional[float] = None) -> np.ndarray:
+    """
+    Function: Computes the travel time from every origin to every
+              destination, including the walks from the points to their
+              nearest street nodes.
+    Parameters: ox_g -> Barcelona's streets graph
+                g -> City graph (merge of street and metro graphs)
+                origins -> (longitude, latitude) of the origins
+                destinations -> (longitude, latitude) of the destinations
+                workers -> number of processes (1: no pool, None: one per
+                           CPU)
+                max_time -> longest travel time searched (None: no limit)
+    Return: A float32 (origins x destinations) array of seconds, infinite
+            if the destination cannot be reached (or is farther than
+            max_time).
+    """
+    speed = city.get_speed("Street")
+    from_nodes, from_dist = city.snap(ox_g, list(origins))
+    to_nodes, to_dist = city.snap(ox_g, list(destinations))
+    # The searches start from the side with fewer distinct nodes
+    transpose = len(set(to_nodes)) < len(set(from_nodes))
+    if transpose:
+        from_nodes, to_nodes = to_nodes, from_nodes
+        from_dist, to_dist = to_dist, from_dist
+    sources = list(dict.fromkeys(from_nodes))
+    targets = list(dict.fromkeys(to_nodes))
+    chunks = [sources[i:i + CHUNK] for i in range(0, len(sources), CHUNK)]
+    workers = workers or os.cpu_count() or 1
+    csr = kernels.build(g)
+    if workers == 1 or len(chunks) <= 1:
+        _start_worker(csr)
+        rows = [_search(chunk, targets, max_time) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_start_worker,
+                                 initargs=(csr,)) as pool:
+            rows = list(pool.map(_search, chunks,
+                                 [targets] * len(chunks),
+                                 [max_time] * len(chunks)))
+    nodes = np.vstack(rows) if len(rows) > 0 else \
+        np.empty((0, len(targets)))
+    source_index = {n: i for i, n in enumerate(sources)}
+    target_index = {n: i for i, n in enumerate(targets)}
+    matrix = nodes[np.ix_([source_index[n] for n in from_nodes],
+                          [target_index[n] for n in to_nodes])]
+    matrix = (matrix + np.array(from_dist)[:, None] / speed +
+              np.array(to_dist)[None, :] / speed)
+    if max_time is not None:
+        matrix[matrix > max_time] = np.inf
+    if transpose:
+        matrix = matrix.T
+    return matrix.astype(np.float32)
+
+
+def to_sparse(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray,
+                                           np.ndarray]:
+    """
+    Function: Keeps only the reachable pairs of a matrix.
+    Parameters: matrix -> travel time matrix
+    Return: The origin indices, the destination indices and the times.
+    """
+    rows, columns = np.nonzero(np.isfinite(matrix))
+    return rows, columns, matrix[rows, columns]
+
+
+def save(matrix: np.ndarray, filename: str, sparse: bool = False) -> None:
+    """
+    Function: Writes a matrix into a file, chosen by its extension: .npy
+              (dense), .npz (dense or sparse, compressed) or .parquet (one
+              row per reachable pair).
+    Parameters: matrix -> travel time matrix
+                filename -> the file
+                sparse -> in .npz files, keep only the reachable pairs
+    Return: None.
+    """
+    if filename.endswith('.npy'):
+        np.save(filename, matrix)
+    elif filename.endswith('.npz'):
+        if sparse:
+            rows, columns, times = to_sparse(matrix)
+            np.savez_compressed(filename, origin=rows, destination=columns,
+                                seconds=times, shape=np.array(matrix.shape))
+        else:
+            np.savez_compressed(filename, seconds=matrix)
+    elif filename.endswith('.parquet'):
+        rows, columns, times = to_sparse(matrix)
+        pd.DataFrame({'origin': rows, 'destination': columns,
+                      'seconds': times}).to_parquet(filename, index=False)
+    else:
+        raise ValueError("Unknown matrix file type: " + filename)
+
+
+def neighbourhoods(restaurants: List) -> Dict[str, city.Coord]:
+    """
+    Function: Computes a point of every neighbourhood as the centre of its
+              restaurants.
+    Parameters: restaurants -> list of restaurants
+    Return: The (longitude, latitude) of every neighbourhood.
+    """
+    points: Dict[str, List[city.Coord]] = {}
+    for r in restaurants:
+        # x_coord is the latitude and y_coord the longitude
+        points.setdefault(str(r.neighbourhood), []).append(
+            (float(r.y_coord), float(r.x_coord)))
+    return {name: tuple(np.mean(coords, axis=0))
+            for name, coords in sorted(points.items())}
+
+
+def main() -> None:
+    """
+    Function: Writes the travel time matrix from every neighbourhood to every
+              restaurant of a type and prints the average time of every
+              neighbourhood.
+    Parameters: None (command line arguments)
+    Return: None.
+    """
+    import metro
+    import restaurants
+    from unidecode import unidecode
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('type', help='restaurant type (e.g. Pizzeria)')
+    parser.add_argument('out', help='.npy, .npz or .parquet file')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-time', type=float, default=None)
+    args = parser.parse_args()
+    street = city.load_osmnx_graph('graf.npz')
+    g = city.build_city_graph(street, metro.get_metro_graph())
+    every = restaurants.get_list()
+    wanted = unidecode(args.type.lower())
+    chosen = [r for r in every
+              if wanted in unidecode(str(r.restaurant_type).lower())]
+    origins = neighbourhoods(every)
+    matrix = travel_matrix(street, g, list(origins.values()),
+                           [(float(r.y_coord), float(r.x_coord))
+                            for r in chosen],
+                           args.workers, args.max_time)
+    save(matrix, args.out)
+    for name, row in zip(origins, matrix):
+        reachable = row[np.isfinite(row)]
+        if len(reachable) > 0:
+            print("{}: {:.1f} min".format(name, reachable.mean() / 60))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,483 @@
+"""
+This module updates the city graph in place when the network changes (a
+station closed for works, a line segment out of service, slower trains or a
+refreshed street graph), without building it again. The removed edges are
+kept in the graph, so that they can be restored later, every update
+increases the version of the graph and the structures derived from the
+graph are told about it. The updates and the searches of the bot share a
+lock, so the graph can be updated while the bot is serving: the closures
+and the slower lines are written in an update file, which a thread of the
+bot (and of every worker of the routing service) follows.
+"""
+
+# Library used to initialize classes
+from dataclasses import dataclass, field
+# Library used to access different data types
+from typing import Callable, Dict, List, Optional, Set, Tuple
+# Library used to update the graph while the bot is serving
+import threading
+# Libraries used to read and write the update file
+import json
+import os
+# Library used to manipulate graphs
+import networkx as nx
+# Library used to access the city graph functions
+import city
+# Library used to count the updates that failed
+import metrics
+
+# Held while the graph is updated or searched
+lock = threading.RLock()
+# File with the state of the network followed while serving (see Watcher):
+# {"stations": [node, ...], "segments": [[u, v], ...], "accesses": [node,
+# ...], "scale": {"Railway": 1.5, ...}}
+FILENAME: str = 'updates.json'
+
+# Functions called after every update with the graph and a description of
+# the update, used to invalidate or patch the derived structures
+Listener = Callable[[city.CityGraph, str], None]
+_listeners: List[Listener] = []
+
+
+@dataclass
+class OsmDiff:
+    """
+    Class: Contains the changes between two versions of the street graph.
+    """
+    # Node -> (longitude, latitude)
+    added_nodes: Dict[int, city.Coord] = field(default_factory=dict)
+    removed_nodes: List[int] = field(default_factory=list)
+    # (u, v, length in meters)
+    added_edges: List[Tuple[int, int, float]] = field(default_factory=list)
+    removed_edges: List[Tuple[int, int]] = field(default_factory=list)
+    # (u, v, new length in meters) of the edges in both versions
+    changed_edges: List[Tuple[int, int, float]] = \
+        field(default_factory=list)
+
+
+def on_update(listener: Listener) -> None:
+    """
+    Function: Registers a function called after every update.
+    Parameters: listener -> function called with the graph and a description
+    Return: None.
+    """
+    _listeners.append(listener)
+
+
+def version(g: city.CityGraph) -> int:
+    """
+    Function: Gives the version of the graph, increased by every update.
+    Parameters: g -> City graph
+    Return: The number of updates done to the graph.
+    """
+    return g.graph.get('version', 0)
+
+
+def _updated(g: city.CityGraph, description: str) -> None:
+    """
+    Function: Increases the version of the graph and calls the listeners.
+    Parameters: g -> City graph
+                description -> what was updated
+    Return: None.
+    """
+    g.graph['version'] = version(g) + 1
+    for listener in _listeners:
+        listener(g, description)
+
+
+def _disable(g: city.CityGraph, key: Tuple, edges: List[Tuple]) -> int:
+    """
+    Function: Removes some edges of the graph and keeps them to restore them.
+    Parameters: g -> City graph
+                key -> what is disabled, for example ('station', 12)
+                edges -> edges to remove
+    Return: The number of edges removed.
+    """
+    disabled = g.graph.setdefault('disabled', {})
+    stored = disabled.setdefault(key, [])
+    for u, v in edges:
+        if g.has_edge(u, v):
+            stored.append((u, v, dict(g.edges[u, v])))
+            g.remove_edge(u, v)
+    if len(stored) == 0:
+        del disabled[key]
+    return len(stored)
+
+
+def _enable(g: city.CityGraph, key: Tuple) -> int:
+    """
+    Function: Restores the edges removed by _disable.
+    Parameters: g -> City graph
+                key -> what was disabled
+    Return: The number of edges restored.
+    """
+    stored = g.graph.get('disabled', {}).pop(key, [])
+    for u, v, data in stored:
+        if u in g and v in g:
+            g.add_edge(u, v, **data)
+    return len(stored)
+
+
+def _closed_edges(g: city.CityGraph, key: Tuple) -> List[Tuple]:
+    """
+    Function: Gives the edges removed when something is closed.
+    Parameters: g -> City graph
+                key -> what is closed, for example ('station', 12)
+    Return: The edges: the accesses, transfers and streets of a station,
+            all the edges of an access or the edge of a segment.
+    """
+    if key[0] == 'segment':
+        return [(key[1], key[2])]
+    if key[1] not in g:
+        return []
+    if key[0] == 'station':
+        return [(key[1], v) for v in g[key[1]]
+                if g.edges[key[1], v]['attributes'].type in
+                ('Access', 'Link', 'Street')]
+    return [(key[1], v) for v in g[key[1]]]
+
+
+def disabled(g: city.CityGraph) -> List[Tuple]:
+    """
+    Function: Gives what is disabled in the graph.
+    Parameters: g -> City graph
+    Return: The list of keys, for example [('station', 12), ...].
+    """
+    return list(g.graph.get('disabled', {}))
+
+
+def disable_station(g: city.CityGraph, station: int) -> int:
+    """
+    Function: Closes a metro station (or a stop of a feed): its accesses,
+              transfers and streets are removed, but the vehicles still go
+              through it.
+    Parameters: g -> City graph
+                station -> node of the station
+    Return: The number of edges removed.
+    """
+    with lock:
+        removed = _disable(g, ('station', station),
+                           _closed_edges(g, ('station', station)))
+        _updated(g, 'station')
+    return removed
+
+
+def enable_station(g: city.CityGraph, station: int) -> int:
+    """
+    Function: Opens again a closed metro station.
+    Parameters: g -> City graph
+                station -> node of the station
+    Return: The number of edges restored.
+    """
+    with lock:
+        restored = _enable(g, ('station', station))
+        _updated(g, 'station')
+    return restored
+
+
+def disable_segment(g: city.CityGraph, u, v) -> int:
+    """
+    Function: Removes the edge between two consecutive stations of a line.
+    Parameters: g -> City graph
+                u, v -> nodes of the stations
+    Return: The number of edges removed.
+    """
+    with lock:
+        removed = _disable(g, ('segment', u, v), [(u, v)])
+        _updated(g, 'segment')
+    return removed
+
+
+def enable_segment(g: city.CityGraph, u, v) -> int:
+    """
+    Function: Restores the edge between two consecutive stations of a line.
+    Parameters: g -> City graph
+                u, v -> nodes of the stations
+    Return: The number of edges restored.
+    """
+    with lock:
+        restored = _enable(g, ('segment', u, v))
+        _updated(g, 'segment')
+    return restored
+
+
+def disable_access(g: city.CityGraph, access: int) -> int:
+    """
+    Function: Closes an access of a station.
+    Parameters: g -> City graph
+                access -> node of the access
+    Return: The number of edges removed.
+    """
+    with lock:
+        removed = _disable(g, ('access', access),
+                           _closed_edges(g, ('access', access)))
+        _updated(g, 'access')
+    return removed
+
+
+def enable_access(g: city.CityGraph, access: int) -> int:
+    """
+    Function: Opens again a closed access.
+    Parameters: g -> City graph
+                access -> node of the access
+    Return: The number of edges restored.
+    """
+    with lock:
+        restored = _enable(g, ('access', access))
+        _updated(g, 'access')
+    return restored
+
+
+def find_stations(g: city.CityGraph, metro_graph: nx.Graph,
+                  name: str) -> List[int]:
+    """
+    Function: Finds the nodes of a station by its name (one per line).
+    Parameters: g -> City graph
+                metro_graph -> Metro graph, where the names are stored
+                name -> name of the station
+    Return: The list of station nodes of the city graph.
+    """
+    return [n for n, data in metro_graph.nodes(data=True)
+            if data['type'] == 'station' and data.get('name') == name
+            and n in g]
+
+
+def set_times(g: city.CityGraph,
+              times: Dict[Tuple, float]) -> Dict[Tuple, float]:
+    """
+    Function: Changes the travel time of some edges, for example when a line
+              runs slower.
+    Parameters: g -> City graph
+                times -> (u, v) -> new time in seconds
+    Return: The previous time of the changed edges, to restore them.
+    """
+    previous: Dict[Tuple, float] = {}
+    with lock:
+        for (u, v), time in times.items():
+            if g.has_edge(u, v):
+                previous[(u, v)] = g.edges[u, v]['time']
+                g.edges[u, v]['time'] = time
+        _updated(g, 'times')
+    return previous
+
+
+def scale_times(g: city.CityGraph, type: str,
+                factor: float) -> Dict[Tuple, float]:
+    """
+    Function: Multiplies the travel time of all the edges of a type.
+    Parameters: g -> City graph
+                type -> type of the edges (Railway, Street, Bus...)
+                factor -> multiplier of the times
+    Return: The previous time of the changed edges, to restore them.
+    """
+    with lock:
+        times = {(u, v): data['time'] * factor
+                 for u, v, data in g.edges(data=True)
+                 if data['attributes'].type == type}
+        return set_times(g, times)
+
+
+def apply_state(g: city.CityGraph, state: Dict) -> bool:
+    """
+    Function: Makes the graph follow a state of the network (see FILENAME):
+              the stations, segments and accesses of the state are closed
+              and the ones closed before that are not in it are opened
+              again, and the times of the edges of every type of the state
+              are its factor times the ones they had before being scaled.
+    Parameters: g -> City graph
+                state -> the state of the network
+    Return: True if the graph changed.
+    """
+    wanted: Set[Tuple] = {('station', n) for n in state.get('stations', [])}
+    wanted |= {('segment', u, v) for u, v in state.get('segments', [])}
+    wanted |= {('access', n) for n in state.get('accesses', [])}
+    factors: Dict[str, float] = state.get('scale', {})
+    with lock:
+        changed = False
+        for key in disabled(g):
+            if key not in wanted:
+                _enable(g, key)
+                changed = True
+        for key in wanted - set(disabled(g)):
+            if _disable(g, key, _closed_edges(g, key)) > 0:
+                changed = True
+        # Type -> (factor, time of every edge before scaling). The closed
+        # edges are scaled too, so they have the right time when opened
+        scaled = g.graph.setdefault('scaled', {})
+        edges = {frozenset((u, v)): data for u, v, data in g.edges(data=True)}
+        for stored in g.graph.get('disabled', {}).values():
+            edges.update((frozenset((u, v)), data) for u, v, data in stored)
+        for type in set(scaled) | set(factors):
+            factor = factors.get(type, 1.0)
+            if scaled.get(type, (1.0, {}))[0] == factor:
+                continue
+            for edge, time in scaled.pop(type, (1.0, {}))[1].items():
+                if edge in edges:
+                    edges[edge]['time'] = time
+            if factor != 1.0:
+                previous = {edge: data['time']
+                            for edge, data in edges.items()
+                            if data['attributes'].type == type}
+                for edge, time in previous.items():
+                    edges[edge]['time'] = time * factor
+                scaled[type] = (factor, previous)
+            changed = True
+        if changed:
+            _updated(g, 'state')
+    return changed
+
+
+def read_state(filename: str = FILENAME) -> Dict:
+    """
+    Function: Reads the update file.
+    Parameters: filename -> the update file
+    Return: The state of the network (nothing closed if there is no file).
+    """
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def write_state(state: Dict, filename: str = FILENAME) -> None:
+    """
+    Function: Writes the update file at once, so that the threads that
+              follow it never read half of it.
+    Parameters: state -> the state of the network
+                filename -> the update file
+    Return: None.
+    """
+    temporary = filename + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(state, f)
+    os.replace(temporary, filename)
+
+
+class Watcher(threading.Thread):
+    """
+    Class: Contains a thread that makes the graph follow the update file
+           every time it changes.
+    """
+
+    def __init__(self, g: city.CityGraph, filename: str = FILENAME,
+                 interval: float = 5.0) -> None:
+        super().__init__(name='graph updater', daemon=True)
+        self.g = g
+        self.filename = filename
+        self.interval = interval
+        self.modified: Optional[float] = None
+        self.stopped = threading.Event()
+
+    def check(self) -> None:
+        """
+        Function: Applies the update file if it changed since the last check
+                  (a removed file opens everything again).
+        """
+        try:
+            modified = os.stat(self.filename).st_mtime \
+                if os.path.exists(self.filename) else None
+            if modified != self.modified:
+                apply_state(self.g, read_state(self.filename))
+                self.modified = modified
+        except Exception:
+            # A file being written or with errors is tried again later
+            metrics.inc('graph_update_errors',
+                        help='Updates of the graph that failed.')
+
+    def run(self) -> None:
+        """
+        Function: Checks the update file every interval.
+        """
+        self.check()
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def stop(self) -> None:
+        """
+        Function: Stops the thread.
+        """
+        self.stopped.set()
+
+
+def apply_osm_diff(g: city.CityGraph, ox_g: city.OsmnxGraph,
+                   diff: OsmDiff) -> None:
+    """
+    Function: Applies the changes of the street graph to the street graph
+              and to the city graph. The metro accesses and stops joined to
+              a removed street node are joined to their new nearest node and
+              the snapped coordinates are patched.
+    Parameters: g -> City graph
+                ox_g -> Barcelona's streets graph
+                diff -> changes of the street graph
+    Return: None.
+    """
+    with lock:
+        for node, (x, y) in diff.added_nodes.items():
+            ox_g.add_node(node, x=x, y=y)
+            g.add_node(node, type="Street", location=[x, y])
+        for u, v, length in diff.added_edges:
+            ox_g.add_edge(u, v, length=length)
+            info = city.Edge("Street", "#FAF660", length)
+            g.add_edge(u, v, attributes=info,
+                       time=length / city.get_speed("Street"))
+        for u, v, length in diff.changed_edges:
+            if ox_g.has_edge(u, v):
+                ox_g[u][v][0]['length'] = length
+            if g.has_edge(u, v) and \
+                    g.edges[u, v]['attributes'].type == "Street":
+                g.edges[u, v]['attributes'] = city.Edge(
+                    "Street", g.edges[u, v]['attributes'].colour, length)
+                g.edges[u, v]['time'] = length / city.get_speed("Street")
+        for u, v in diff.removed_edges:
+            while ox_g.has_edge(u, v):
+                ox_g.remove_edge(u, v)
+            # The city graph is undirected: the edge stays if the street
+            # can still be walked in the other direction
+            if not ox_g.has_edge(v, u) and g.has_edge(u, v):
+                g.remove_edge(u, v)
+        orphans = set()
+        for node in diff.removed_nodes:
+            if node in g:
+                orphans.update(v for v in g[node]
+                               if g.nodes[v].get('type') != "Street")
+                g.remove_node(node)
+            if node in ox_g:
+                ox_g.remove_node(node)
+        city.patch_snap_cache(ox_g, diff.removed_nodes,
+                              list(diff.added_nodes))
+        orphans = [n for n in orphans if n in g]
+        if len(orphans) > 0:
+            nearest, dist = city.snap(ox_g, [g.nodes[n]['location']
+                                             for n in orphans])
+            for i in range(len(orphans)):
+                g.add_edge(orphans[i], nearest[i],
+                           attributes=city.Edge("Street", "#F3A83B",
+                                                dist[i]),
+                           time=dist[i] / city.get_speed("Street"))
+        _updated(g, 'osm')
+
+
+def osm_diff(old: city.OsmnxGraph, new: city.OsmnxGraph) -> OsmDiff:
+    """
+    Function: Computes the changes between two versions of the street graph.
+    Parameters: old -> street graph used by the city graph
+                new -> refreshed street graph
+    Return: The changes to apply with apply_osm_diff.
+    """
+    diff = OsmDiff()
+    for node, data in new.nodes(data=True):
+        if node not in old:
+            diff.added_nodes[node] = (data['x'], data['y'])
+    diff.removed_nodes = [n for n in old.nodes if n not in new]
+    for u, v, data in new.edges(data=True):
+        if not old.has_edge(u, v):
+            diff.added_edges.append((u, v, data['length']))
+    # The city graph uses the length of the first of the parallel edges
+    for u, v in new.edges():
+        if old.has_edge(u, v) and \
+                new[u][v][0]['length'] != old[u][v][0]['length']:
+            diff.changed_edges.append((u, v, new[u][v][0]['length']))
+    diff.removed_edges = [(u, v) for u, v in old.edges()
+                          if not new.has_edge(u, v)
+                          and u in new and v in new]
+    return diff